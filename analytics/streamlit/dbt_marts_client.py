@@ -1,9 +1,21 @@
 
 import os
+import re
+import threading
+import uuid
 import pandas as pd
 
-TARGET = os.getenv("TARGET_WAREHOUSE", "redshift").lower()
+from result_cache import cache_key, get_cache
+from warehouse_pool import ConnectionPool, POOL_SIZE
+
+TARGET = os.getenv("TARGET_WAREHOUSE", "redshift").lower()   # or "auto" -> marts_router picks per query
 DBT_MART_SCHEMA = os.getenv("DBT_MART_SCHEMA", "dev_viper_mart")
+BATCH_SIZE = int(os.getenv("MARTS_FETCH_BATCH_SIZE", "50000"))
+# large Redshift results: UNLOAD to Parquet on S3 and read it back as Arrow (both must be set)
+REDSHIFT_UNLOAD_S3_PREFIX = os.getenv("REDSHIFT_UNLOAD_S3_PREFIX")   # e.g. s3://bucket/tmp/marts_unload
+REDSHIFT_UNLOAD_IAM_ROLE = os.getenv("REDSHIFT_UNLOAD_IAM_ROLE")
+# the benchmark turns this off so repeated runs measure the warehouse, not its result cache
+WAREHOUSE_RESULT_CACHE = os.getenv("MARTS_WAREHOUSE_RESULT_CACHE", "1") == "1"
 
 def _rs_conn():
     import psycopg2
@@ -29,22 +41,298 @@ def _sf_conn():
         client_session_keep_alive=False,
     )
 
-def run_query(sql: str) -> pd.DataFrame:
-    if TARGET == "redshift":
-        with _rs_conn() as conn:
-            return pd.read_sql(sql, conn)
-    elif TARGET == "snowflake":
-        conn = _sf_conn()
+def _spark_conn():
+    # Spark Thrift Server (same endpoint as the dbt spark target)
+    from pyhive import hive
+    return hive.connect(
+        host=os.getenv("SPARK_THRIFT_HOST", "localhost"),
+        port=int(os.getenv("SPARK_THRIFT_PORT", "10001")),
+        username=os.getenv("SPARK_THRIFT_USER", "hadoop"),
+        database=os.getenv("SPARK_SCHEMA", "nyc_taxi_db"),
+    )
+
+def _duckdb_conn():
+    # local stand-in for offline runs: the database dbt-duckdb builds the marts into
+    import duckdb
+    return duckdb.connect(os.getenv("DUCKDB_PATH", "nyc_taxi.duckdb"), read_only=True)
+
+_CONNECT = {"redshift": _rs_conn, "snowflake": _sf_conn, "spark": _spark_conn, "duckdb": _duckdb_conn}
+_TRANSACTIONAL = {"redshift": True, "snowflake": True, "spark": False, "duckdb": False}
+_NO_RESULT_CACHE_SQL = {
+    "redshift": "SET enable_result_cache_for_session TO off",
+    "snowflake": "ALTER SESSION SET USE_CACHED_RESULT = FALSE",
+}
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def _connect(target: str):
+    conn = _CONNECT[target]()
+    if not WAREHOUSE_RESULT_CACHE and target in _NO_RESULT_CACHE_SQL:
+        cur = conn.cursor()
+        try:
+            cur.execute(_NO_RESULT_CACHE_SQL[target])
+        finally:
+            cur.close()
+        conn.commit()
+    return conn
+
+def _pool(target: str) -> ConnectionPool:
+    # module-level, so pools outlive Streamlit reruns (modules stay imported per process)
+    if target not in _CONNECT:
+        raise ValueError(f"Unsupported TARGET_WAREHOUSE={target!r}")
+    with _POOLS_LOCK:
+        if target not in _POOLS:
+            _POOLS[target] = ConnectionPool(
+                lambda: _connect(target), max_size=POOL_SIZE, transactional=_TRANSACTIONAL[target]
+            )
+        return _POOLS[target]
+
+# ----------------------------------------------
+# Snowflake: Arrow result batches (needs snowflake-connector-python[pandas])
+# ----------------------------------------------
+def _sf_arrow_unavailable(e: Exception) -> bool:
+    # no pandas/pyarrow extra, or a non-Arrow (non-SELECT) result; anything else is a real error
+    from snowflake.connector.errorcode import ER_NO_PYARROW
+    from snowflake.connector.errors import NotSupportedError, ProgrammingError
+    if isinstance(e, NotSupportedError):
+        return True
+    return isinstance(e, ProgrammingError) and e.errno == ER_NO_PYARROW
+
+def _sf_fetch_df(conn, sql: str) -> pd.DataFrame:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
         try:
-            cur = conn.cursor()
+            return cur.fetch_pandas_all()
+        except Exception as e:
+            if not _sf_arrow_unavailable(e):
+                raise
+            # no pandas/pyarrow extra, or a non-SELECT result: fall back to row tuples. The
+            # failed Arrow fetch may have consumed the result, so run the query again.
             cur.execute(sql)
             cols = [d[0] for d in cur.description]
-            rows = cur.fetchall()
-            return pd.DataFrame(rows, columns=cols)
-        finally:
-            try: cur.close()
-            except Exception: pass
-            conn.close()
+            return pd.DataFrame(cur.fetchall(), columns=cols)
+    finally:
+        try: cur.close()
+        except Exception: pass
+
+def _sf_fetch_arrow(conn, sql: str):
+    import pyarrow as pa
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        table = cur.fetch_arrow_all()
+        if table is None:   # empty result
+            return pa.table({d[0]: pa.array([], pa.null()) for d in cur.description})
+        return table
+    finally:
+        try: cur.close()
+        except Exception: pass
+
+def _sf_iter(conn, sql: str, batch_size: int):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        # Snowflake sizes the Arrow chunks itself; batch_size only applies to the fallback
+        try:
+            batches = cur.fetch_pandas_batches()
+        except Exception as e:
+            if not _sf_arrow_unavailable(e):
+                raise
+            batches = None
+        if batches is not None:
+            yield from batches
+            return
+        # as in _sf_fetch_df: run the query again before fetching row tuples
+        cur.execute(sql)
+        cols = [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield pd.DataFrame(rows, columns=cols)
+    finally:
+        try: cur.close()
+        except Exception: pass
+
+# ----------------------------------------------
+# Plain DB-API cursors (Redshift small results, Spark Thrift)
+# ----------------------------------------------
+def _cursor_fetch_df(conn, sql: str) -> pd.DataFrame:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        cols = [d[0] for d in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=cols)
+    finally:
+        cur.close()
+
+def _cursor_iter(conn, sql: str, batch_size: int):
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+        cols = [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield pd.DataFrame(rows, columns=cols)
+    finally:
+        cur.close()
+
+# ----------------------------------------------
+# DuckDB: native Arrow results
+# ----------------------------------------------
+def _duckdb_fetch_df(conn, sql: str) -> pd.DataFrame:
+    return conn.execute(sql).fetch_df()
+
+def _duckdb_iter(conn, sql: str, batch_size: int):
+    reader = conn.execute(sql).fetch_record_batch(batch_size)
+    for batch in reader:
+        yield batch.to_pandas()
+
+# ----------------------------------------------
+# Redshift: server-side cursor batches, or UNLOAD -> Parquet for large marts
+# ----------------------------------------------
+
+def _rs_iter(conn, sql: str, batch_size: int):
+    # named cursor = server-side: rows stay in Redshift until fetched, batch by batch
+    cur = conn.cursor(name=f"marts_{uuid.uuid4().hex[:12]}")
+    cur.itersize = batch_size
+    try:
+        cur.execute(sql)
+        cols = None
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if cols is None:
+                cols = [d[0] for d in cur.description]
+                if not rows:
+                    # empty result: one empty batch, so callers still get the columns
+                    yield pd.DataFrame(columns=cols)
+                    return
+            if not rows:
+                return
+            yield pd.DataFrame(rows, columns=cols)
+    finally:
+        cur.close()
+
+def _unload_enabled() -> bool:
+    return bool(REDSHIFT_UNLOAD_S3_PREFIX and REDSHIFT_UNLOAD_IAM_ROLE)
+
+def _rs_unload_arrow(conn, sql: str):
+    import boto3
+    import pyarrow.dataset as ds
+
+    prefix = f"{REDSHIFT_UNLOAD_S3_PREFIX.rstrip('/')}/{uuid.uuid4().hex}/"
+    body = sql.strip().rstrip(";")
+    # UNLOAD rejects a LIMIT in the outer SELECT: wrap such a query as a subquery (only then, as
+    # an outer ORDER BY is what PARALLEL OFF sorts by). Parallel UNLOAD writes one file per
+    # slice, so an ordered query is written serially to keep its order (any ORDER BY counts,
+    # window clauses included: PARALLEL OFF only costs throughput)
+    if re.search(r"\blimit\b", body, re.IGNORECASE):
+        body = f"select * from ({body}) as unload_q"
+    parallel = "OFF" if re.search(r"\border\s+by\b", body, re.IGNORECASE) else "ON"
+    quoted = body.replace("'", "''")
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"UNLOAD ('{quoted}') TO '{prefix}' "
+            f"IAM_ROLE '{REDSHIFT_UNLOAD_IAM_ROLE}' FORMAT AS PARQUET PARALLEL {parallel}"
+        )
+    finally:
+        cur.close()
+
+    bucket, key_prefix = prefix[len("s3://"):].split("/", 1)
+    s3 = boto3.client("s3")
+    # serial UNLOAD numbers its files in write order (000, 001, ...)
+    keys = sorted(
+        o["Key"]
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key_prefix)
+        for o in page.get("Contents", [])
+    )
+    if not keys:   # UNLOAD writes no files for an empty result
+        return None
+    try:
+        return ds.dataset([f"{bucket}/{k}" for k in keys], format="parquet",
+                          filesystem=_s3_filesystem()).to_table()
+    finally:
+        # the unload prefix is scratch space: drop it once read
+        for i in range(0, len(keys), 1000):
+            s3.delete_objects(Bucket=bucket,
+                              Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]], "Quiet": True})
+
+def _s3_filesystem():
+    from pyarrow import fs
+    return fs.S3FileSystem(region=os.getenv("AWS_REGION", "us-east-1"))
+
+# ----------------------------------------------
+# Public API (target=None -> TARGET_WAREHOUSE)
+# ----------------------------------------------
+_FETCH_DF = {"snowflake": _sf_fetch_df, "spark": _cursor_fetch_df, "duckdb": _duckdb_fetch_df}
+_ITER = {"redshift": _rs_iter, "snowflake": _sf_iter, "spark": _cursor_iter, "duckdb": _duckdb_iter}
+
+def run_query(sql: str, large: bool = False, use_cache: bool = True, target: str = None,
+              query_class: str = None, hedge: bool = False) -> pd.DataFrame:
+    """
+    Whole result as a DataFrame. large=True routes Redshift through UNLOAD -> Parquet
+    when REDSHIFT_UNLOAD_S3_PREFIX / REDSHIFT_UNLOAD_IAM_ROLE are set, else batched fetch.
+    Results are shared across processes via result_cache (MARTS_CACHE_BACKEND).
+    target="auto" routes per query_class (default: the mart in FROM) via marts_router,
+    with fallback on error/timeout; hedge=True also races the runner-up target.
+    """
+    target = (target or TARGET).lower()
+    if target == "auto":
+        from marts_router import get_router
+        fetch = lambda: get_router().run(sql, query_class=query_class, hedge=hedge, large=large)
     else:
-        raise ValueError(f"Unsupported TARGET_WAREHOUSE={TARGET!r}")
+        fetch = lambda: _fetch(sql, large, target)
+    cache = get_cache() if use_cache else None
+    if cache is None:
+        return fetch()
+    return cache.get_or_compute(cache_key(sql, target), fetch)
+
+def _routed_target(sql: str, target: str) -> str:
+    if target != "auto":
+        return target
+    from marts_router import get_router, query_class_of
+    return get_router().rank(query_class_of(sql))[0][0]
+
+def _fetch(sql: str, large: bool, target: str) -> pd.DataFrame:
+    if target == "redshift":
+        if large and _unload_enabled():
+            table = _pool(target).run(lambda conn: _rs_unload_arrow(conn, sql))
+            if table is not None:
+                return table.to_pandas()
+            return _pool(target).run(lambda conn: _cursor_fetch_df(conn, sql))
+        if large:
+            return pd.concat(list(iter_query(sql, target=target)), ignore_index=True)
+        return _pool(target).run(lambda conn: _cursor_fetch_df(conn, sql))
+    elif target in _FETCH_DF:
+        return _pool(target).run(lambda conn: _FETCH_DF[target](conn, sql))
+    else:
+        raise ValueError(f"Unsupported TARGET_WAREHOUSE={target!r}")
+
+def run_query_arrow(sql: str, target: str = None):
+    """Whole result as a pyarrow.Table (no per-value Python objects on the Arrow paths)."""
+    import pyarrow as pa
+    target = _routed_target(sql, (target or TARGET).lower())
+    if target == "snowflake":
+        return _pool(target).run(lambda conn: _sf_fetch_arrow(conn, sql))
+    elif target == "duckdb":
+        return _pool(target).run(lambda conn: conn.execute(sql).fetch_arrow_table())
+    elif target == "redshift" and _unload_enabled():
+        table = _pool(target).run(lambda conn: _rs_unload_arrow(conn, sql))
+        if table is not None:
+            return table
+    return pa.Table.from_pandas(_fetch(sql, False, target), preserve_index=False)
 
+def iter_query(sql: str, batch_size: int = BATCH_SIZE, target: str = None):
+    """
+    Stream a big mart as DataFrame batches; one pooled connection is held until the
+    iterator is exhausted or closed.
+    """
+    target = _routed_target(sql, (target or TARGET).lower())
+    if target not in _ITER:
+        raise ValueError(f"Unsupported TARGET_WAREHOUSE={target!r}")
+    with _pool(target).connection() as conn:
+        yield from _ITER[target](conn, sql, batch_size)
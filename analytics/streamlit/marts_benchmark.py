@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Repeatable benchmark of the dbt marts across warehouses (replaces the one-off
+docs/benchmarks/snowflake_vs_Redshift_cost_and_perf.sql + xlsx comparison).
+
+Runs every mart query N times per target through dbt_marts_client.run_query (result
+cache bypassed, warehouse result cache switched off per session). Run 1 is reported as
+"cold", runs 2..N as "warm". Each (target, mart) records latency, rows, result bytes and
+an estimated compute cost at the target's hourly rate, and is:
+  - written to <out_dir>/marts_benchmark_<run_id>.json (full run)
+  - appended to <history> (one JSON line per target/mart, read by marts_router)
+
+Example:
+  python marts_benchmark.py --targets redshift snowflake --repeats 5
+  python marts_benchmark.py --targets duckdb --marts agg_busiest_pickup_zone   # offline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+import dbt_marts_client
+from dbt_marts_client import DBT_MART_SCHEMA, run_query
+
+TARGETS = ["redshift", "snowflake", "spark", "duckdb"]
+MARTS = [
+    "agg_monthly_cab_type_trip_counts",
+    "agg_avg_trip_duration_by_cab_type_month",
+    "agg_avg_fare_by_pickup_zone",
+    "agg_avg_passenger_count_by_cab_type",
+    "agg_busiest_pickup_zone",
+    "dash_nyc_taxi__baseline_hourly",
+    "dash_nyc_taxi__streaming_hourly",
+    "dash_nyc_taxi__stream_vs_baseline_hourly",
+]
+
+# $/hour of compute while a query runs (same prices as the one-off comparison):
+# Redshift Serverless $0.375/RPU-hour x base RPUs; Snowflake $2/credit x credits/hour of the warehouse size
+HOURLY_RATE_USD = {
+    "redshift": float(os.getenv("REDSHIFT_BASE_RPU", "8")) * float(os.getenv("REDSHIFT_RPU_HOUR_USD", "0.375")),
+    "snowflake": float(os.getenv("SNOWFLAKE_CREDITS_PER_HOUR", "1")) * float(os.getenv("SNOWFLAKE_CREDIT_USD", "2.00")),
+    "spark": float(os.getenv("SPARK_HOURLY_USD", "0")),
+    "duckdb": 0.0,
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(HERE, "..", "..", "docs", "benchmarks")
+HISTORY_PATH = os.path.join(BENCH_DIR, "marts_benchmark_history.jsonl")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--targets", nargs="+", default=["redshift", "snowflake"], choices=TARGETS)
+    ap.add_argument("--marts", nargs="+", default=MARTS)
+    ap.add_argument("--repeats", type=int, default=5, help="runs per mart and target (1 cold + N-1 warm)")
+    ap.add_argument("--out_dir", default=os.path.join(BENCH_DIR, "runs"))
+    ap.add_argument("--history", default=HISTORY_PATH)
+    ap.add_argument("--allow_warehouse_cache", action="store_true",
+                    help="keep the warehouse result cache on (measures cached reads)")
+    return ap.parse_args()
+
+
+def mart_schema(target):
+    # e.g. SPARK_MART_SCHEMA=nyc_taxi_db, DUCKDB_MART_SCHEMA=main
+    return os.getenv(f"{target.upper()}_MART_SCHEMA", DBT_MART_SCHEMA)
+
+
+def mart_sql(target, mart):
+    return f"select * from {mart_schema(target)}.{mart}"
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def bench_one(target, mart, repeats):
+    sql = mart_sql(target, mart)
+    timings, rows, nbytes = [], None, None
+    try:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            df = run_query(sql, use_cache=False, target=target)
+            timings.append((time.perf_counter() - t0) * 1000)
+            rows, nbytes = len(df), int(df.memory_usage(deep=True).sum())
+    except Exception as e:
+        return {"target": target, "mart": mart, "status": "ERROR", "error": f"{type(e).__name__}: {e}",
+                "runs": len(timings)}
+
+    warm = timings[1:]
+    typical_ms = statistics.median(warm) if warm else timings[0]
+    return {
+        "target": target,
+        "mart": mart,
+        "status": "OK",
+        "runs": len(timings),
+        "cold_ms": round(timings[0], 1),
+        "warm_ms": [round(t, 1) for t in warm],
+        "warm_p50_ms": round(statistics.median(warm), 1) if warm else None,
+        "warm_p95_ms": round(percentile(warm, 95), 1) if warm else None,
+        "rows": rows,
+        "bytes": nbytes,
+        "est_cost_usd": round(HOURLY_RATE_USD[target] * typical_ms / 1000 / 3600, 6),
+    }
+
+
+def main():
+    args = parse_args()
+    dbt_marts_client.WAREHOUSE_RESULT_CACHE = args.allow_warehouse_cache
+
+    started = datetime.now(timezone.utc)
+    run_id = started.strftime("%Y%m%dT%H%M%SZ")
+    results = []
+    for target in args.targets:
+        for mart in args.marts:
+            r = bench_one(target, mart, args.repeats)
+            results.append(r)
+            if r["status"] == "OK":
+                print(f"{target:<10} {mart:<45} cold={r['cold_ms']:>9.1f}ms "
+                      f"warm_p50={r['warm_p50_ms'] or 0:>9.1f}ms rows={r['rows']:<8} bytes={r['bytes']}")
+            else:
+                print(f"{target:<10} {mart:<45} {r['error'].splitlines()[0]}")
+
+    report = {
+        "run_id": run_id,
+        "started_at": started.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "repeats": args.repeats,
+        "targets": args.targets,
+        "warehouse_result_cache": args.allow_warehouse_cache,
+        "hourly_rate_usd": {t: HOURLY_RATE_USD[t] for t in args.targets},
+        "results": results,
+    }
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    out_path = os.path.join(args.out_dir, f"marts_benchmark_{run_id}.json")
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "a") as f:
+        for r in results:
+            f.write(json.dumps({"run_id": run_id, "started_at": report["started_at"], **r}) + "\n")
+    print(f"[OK] report -> {out_path}; history -> {args.history}")
+
+
+if __name__ == "__main__":
+    main()
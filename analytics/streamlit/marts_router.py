@@ -0,0 +1,196 @@
+"""
+Per-query-class warehouse routing for dbt_marts_client (TARGET_WAREHOUSE=auto).
+
+Instead of one global TARGET_WAREHOUSE, each query class (by default the mart the SQL
+reads from) is sent to the target that measured best for it in the marts_benchmark
+history, adjusted by live latencies observed in this process:
+
+    MARTS_ROUTER_TARGETS   candidate targets, in tie-break order (default redshift,snowflake)
+    MARTS_ROUTER_POLICY    latency | cost | balanced (default balanced)
+    MARTS_ROUTER_TIMEOUT   seconds before a query falls back to the next target (default 30)
+    MARTS_ROUTER_HISTORY   benchmark history JSONL (default docs/benchmarks/marts_benchmark_history.jsonl)
+
+Errors and timeouts fall back to the next-ranked target and put the failing one in a
+short cooldown. hedge=True (latency-critical panels) starts the runner-up as well when
+the primary is slower than its usual p95 and returns whichever finishes first. A query
+abandoned on timeout/hedge keeps running to completion in the background; its pooled
+connection is returned normally.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dbt_marts_client import run_query
+from marts_benchmark import HISTORY_PATH
+
+ROUTER_TARGETS = [t.strip() for t in os.getenv("MARTS_ROUTER_TARGETS", "redshift,snowflake").split(",") if t.strip()]
+ROUTER_POLICY = os.getenv("MARTS_ROUTER_POLICY", "balanced").lower()
+ROUTER_TIMEOUT = float(os.getenv("MARTS_ROUTER_TIMEOUT", "30"))
+ROUTER_HISTORY = os.getenv("MARTS_ROUTER_HISTORY", HISTORY_PATH)
+HISTORY_RUNS = 5          # latest benchmark runs per (class, target) considered
+ERROR_COOLDOWN = 60       # seconds a target is skipped after an error/timeout
+EWMA_ALPHA = 0.3          # weight of a live observation vs. the running estimate
+DEFAULT_HEDGE_AFTER = 1.0  # seconds, when the primary has no p95 yet
+
+_FROM_RE = re.compile(r"\bfrom\s+([\w\.\"]+)", re.IGNORECASE)
+
+
+def query_class_of(sql):
+    """Mart/table name of the first FROM (schema and quotes stripped) — the default class."""
+    m = _FROM_RE.search(sql)
+    return m.group(1).replace('"', "").split(".")[-1].lower() if m else "adhoc"
+
+
+class TargetStats:
+    __slots__ = ("p50_ms", "p95_ms", "cost_usd", "errors", "cooldown_until")
+
+    def __init__(self, p50_ms=None, p95_ms=None, cost_usd=None):
+        self.p50_ms = p50_ms
+        self.p95_ms = p95_ms
+        self.cost_usd = cost_usd
+        self.errors = 0
+        self.cooldown_until = 0.0
+
+
+class MartsRouter:
+    def __init__(self, targets=None, policy=ROUTER_POLICY, timeout=ROUTER_TIMEOUT, history_path=ROUTER_HISTORY):
+        self.targets = targets or ROUTER_TARGETS
+        self.policy = policy
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {}   # (query_class, target) -> TargetStats
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.targets) + 2, thread_name_prefix="marts-router")
+        self.load_history(history_path)
+
+    # ----------------------------------------------
+    # Statistics
+    # ----------------------------------------------
+    def load_history(self, path):
+        """Seed per-class stats from the latest benchmark runs (missing file -> no prior)."""
+        runs = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    r = json.loads(line)
+                    if r.get("status") == "OK" and r.get("target") in self.targets:
+                        runs.setdefault((r["mart"].lower(), r["target"]), []).append(r)
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            for key, rs in runs.items():
+                latest = sorted(rs, key=lambda r: r["started_at"])[-HISTORY_RUNS:]
+                p50 = [r["warm_p50_ms"] or r["cold_ms"] for r in latest]
+                p95 = [r["warm_p95_ms"] or r["cold_ms"] for r in latest]
+                cost = [r.get("est_cost_usd") or 0.0 for r in latest]
+                self._stats[key] = TargetStats(
+                    p50_ms=sorted(p50)[len(p50) // 2],
+                    p95_ms=max(p95),
+                    cost_usd=sum(cost) / len(cost),
+                )
+
+    def _get(self, query_class, target):
+        return self._stats.setdefault((query_class, target), TargetStats())
+
+    def _observe(self, query_class, target, elapsed_ms=None, failed=False):
+        with self._lock:
+            s = self._get(query_class, target)
+            if failed:
+                s.errors += 1
+                s.cooldown_until = time.monotonic() + ERROR_COOLDOWN
+                return
+            s.errors = 0
+            s.p50_ms = elapsed_ms if s.p50_ms is None else (1 - EWMA_ALPHA) * s.p50_ms + EWMA_ALPHA * elapsed_ms
+            # p95 drifts toward observed latencies but never sits below p50
+            s.p95_ms = max(s.p50_ms, elapsed_ms if s.p95_ms is None else (1 - EWMA_ALPHA) * s.p95_ms + EWMA_ALPHA * elapsed_ms)
+
+    def rank(self, query_class):
+        """Targets best-first for this class; cooling-down targets go last."""
+        now = time.monotonic()
+        with self._lock:
+            stats = {t: self._get(query_class, t) for t in self.targets}
+            known = [s for s in stats.values() if s.p50_ms is not None]
+            best_ms = min((s.p50_ms for s in known), default=None) or 1.0
+            best_cost = min((s.cost_usd for s in known if s.cost_usd), default=None)
+
+            def score(target):
+                s = stats[target]
+                if s.p50_ms is None:
+                    return float("inf")   # unmeasured: after measured targets, in config order
+                latency = s.p50_ms / best_ms
+                cost = (s.cost_usd or 0.0) / best_cost if best_cost else 0.0
+                if self.policy == "latency":
+                    return latency
+                if self.policy == "cost":
+                    return cost if best_cost else latency
+                return latency + cost
+
+            order = sorted(self.targets, key=lambda t: (stats[t].cooldown_until > now, score(t), self.targets.index(t)))
+            return order, {t: stats[t].p95_ms for t in order}
+
+    # ----------------------------------------------
+    # Execution
+    # ----------------------------------------------
+    def _timed(self, sql, query_class, target, large):
+        t0 = time.perf_counter()
+        try:
+            df = run_query(sql, large=large, use_cache=False, target=target)
+        except Exception:
+            self._observe(query_class, target, failed=True)
+            raise
+        self._observe(query_class, target, (time.perf_counter() - t0) * 1000)
+        return df
+
+    def run(self, sql, query_class=None, hedge=False, large=False):
+        query_class = (query_class or query_class_of(sql)).lower()
+        order, p95 = self.rank(query_class)
+        if hedge and len(order) > 1:
+            return self._run_hedged(sql, query_class, order, p95, large)
+
+        last_exc = None
+        for target in order:
+            future = self._executor.submit(self._timed, sql, query_class, target, large)
+            try:
+                return future.result(timeout=self.timeout)
+            except Exception as e:
+                if not future.done():   # timed out: count it against the target
+                    self._observe(query_class, target, failed=True)
+                print(f"[router] {query_class} on {target} failed ({type(e).__name__}), falling back")
+                last_exc = e
+        raise last_exc
+
+    def _run_hedged(self, sql, query_class, order, p95, large):
+        primary, backup = order[0], order[1]
+        hedge_after = (p95[primary] / 1000) if p95[primary] else DEFAULT_HEDGE_AFTER
+        futures = {self._executor.submit(self._timed, sql, query_class, primary, large): primary}
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done or next(iter(done)).exception() is not None:
+            futures[self._executor.submit(self._timed, sql, query_class, backup, large)] = backup
+
+        deadline = time.monotonic() + self.timeout
+        pending, last_exc = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                last_exc = f.exception()
+        raise last_exc or TimeoutError(f"{query_class}: no target answered within {self.timeout}s")
+
+
+_ROUTER = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router():
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            _ROUTER = MartsRouter()
+        return _ROUTER
@@ -0,0 +1,248 @@
+"""
+Cross-process result cache for warehouse queries (used by dbt_marts_client.run_query).
+
+@st.cache_data is per process, so every dashboard replica would re-run identical mart
+queries against Redshift Serverless / Snowflake. Results here are keyed on
+sha256(target + normalized SQL) and shared by every process on the host (disk backend)
+or across hosts (redis backend). get_or_compute() takes a per-key lock so that when an
+entry expires only one process re-runs the query; the others wait for its result.
+
+    MARTS_CACHE_BACKEND   disk (default) | redis | off
+    MARTS_CACHE_TTL       seconds an entry stays fresh (default 60)
+    MARTS_CACHE_DIR       disk backend directory (default /tmp/marts_cache)
+    MARTS_CACHE_MAX_MB    disk backend size cap, oldest entries evicted first (default 512)
+    MARTS_CACHE_REDIS_URL redis backend URL (size cap = the server's maxmemory policy)
+"""
+
+import fcntl
+import glob
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+CACHE_BACKEND = os.getenv("MARTS_CACHE_BACKEND", "disk").lower()
+CACHE_TTL = int(os.getenv("MARTS_CACHE_TTL", "60"))
+CACHE_DIR = os.getenv("MARTS_CACHE_DIR", "/tmp/marts_cache")
+CACHE_MAX_BYTES = int(os.getenv("MARTS_CACHE_MAX_MB", "512")) * 1024 * 1024
+REDIS_URL = os.getenv("MARTS_CACHE_REDIS_URL", "redis://localhost:6379/0")
+LOCK_TIMEOUT = 120   # seconds a waiter blocks on a refreshing key before querying itself
+REDIS_TIMEOUT = 2    # seconds per Redis call; an unreachable cache falls back to the warehouse
+
+
+def normalize_sql(sql: str) -> str:
+    # whitespace/trailing ';' only: case and literals are significant
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def cache_key(sql: str, target: str) -> str:
+    return hashlib.sha256(f"{target}\n{normalize_sql(sql)}".encode()).hexdigest()
+
+
+def _to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+def _store(cache, key, df):
+    # a result that can't be cached (duplicate column names, types Parquet can't hold, backend
+    # down) is still returned to the caller; the next request simply queries again
+    try:
+        cache.set(key, df)
+    except Exception as e:
+        print(f"[cache] not caching {key[:12]}: {type(e).__name__}: {e}")
+
+
+class DiskCache:
+    """
+    Parquet files in a shared directory; fcntl locks serialize refreshes per key. A key's
+    .lock file exists only while a refresh is in flight: the holder removes it before unlocking.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            return pd.read_parquet(path)
+        except (FileNotFoundError, OSError):
+            return None
+
+    def set(self, key, df):
+        # write-then-rename so readers never see a partial file
+        data = _to_parquet_bytes(df)
+        tmp = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def get_or_compute(self, key, compute):
+        df = self.get(key)
+        if df is not None:
+            return df
+        lock = self._acquire(key)
+        try:
+            # another process may have refreshed the key while we waited
+            df = self.get(key)
+            if df is not None:
+                return df
+            df = compute()
+            _store(self, key, df)
+            return df
+        finally:
+            if lock is not None:
+                self._release(key, lock)
+
+    def _lock_path(self, key):
+        return os.path.join(self.directory, f"{key}.lock")
+
+    def _acquire(self, key):
+        """Locked file object for the key, or None after LOCK_TIMEOUT (query without the lock)."""
+        path = self._lock_path(key)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            f = open(path, "a")
+            if not self._lock(f, deadline):
+                f.close()
+                return None
+            # the previous holder removes the file before unlocking: a lock on a removed file
+            # doesn't exclude anyone, so only the file currently at `path` counts
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _release(self, key, f):
+        try:
+            os.remove(self._lock_path(key))
+        except FileNotFoundError:
+            pass
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    def _lock(self, f, deadline):
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    print(f"[cache] lock wait exceeded {LOCK_TIMEOUT}s, querying without it")
+                    return False
+                time.sleep(0.1)
+
+    def _evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.parquet")):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        # expired entries first, then oldest until under the size cap
+        for mtime, size, path in sorted(entries):
+            if now - mtime <= self.ttl and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class RedisCache:
+    """
+    Parquet bytes in Redis with EX=ttl; a SET NX key per entry serializes refreshes. Redis
+    errors (outage, timeout) never fail a query: the result is computed without the cache.
+    """
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end"
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL, prefix="marts:"):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=REDIS_TIMEOUT, socket_timeout=REDIS_TIMEOUT)
+        self.errors = redis.exceptions.RedisError
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except self.errors as e:
+            print(f"[cache] redis get failed, treating as a miss: {type(e).__name__}: {e}")
+            return None
+        return pd.read_parquet(io.BytesIO(raw)) if raw is not None else None
+
+    def set(self, key, df):
+        self.client.set(self.prefix + key, _to_parquet_bytes(df), ex=self.ttl)
+
+    def get_or_compute(self, key, compute):
+        df = self.get(key)
+        if df is not None:
+            return df
+        lock_key, token = f"{self.prefix}lock:{key}", uuid.uuid4().hex
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        try:
+            while not self.client.set(lock_key, token, nx=True, px=LOCK_TIMEOUT * 1000):
+                time.sleep(0.1)
+                df = self.get(key)
+                if df is not None:
+                    return df
+                if time.monotonic() >= deadline:
+                    print(f"[cache] lock wait exceeded {LOCK_TIMEOUT}s, querying without it")
+                    return compute()
+        except self.errors as e:
+            print(f"[cache] redis unavailable, querying without the cache: {type(e).__name__}: {e}")
+            return compute()
+        try:
+            df = self.get(key)
+            if df is not None:
+                return df
+            df = compute()
+            _store(self, key, df)
+            return df
+        finally:
+            try:
+                self.client.eval(self._RELEASE, 1, lock_key, token)
+            except self.errors:
+                pass   # the lock expires on its own after LOCK_TIMEOUT
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache backend per MARTS_CACHE_BACKEND, or None when disabled."""
+    global _CACHE
+    if CACHE_BACKEND == "off":
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            if CACHE_BACKEND == "redis":
+                _CACHE = RedisCache()
+            elif CACHE_BACKEND == "disk":
+                _CACHE = DiskCache()
+            else:
+                raise ValueError(f"Unsupported MARTS_CACHE_BACKEND={CACHE_BACKEND!r}")
+        return _CACHE
@@ -0,0 +1,190 @@
+"""
+Rolling, process-shared window of streaming trips for the live dashboard.
+
+Instead of re-querying the whole window every refresh, RollingTripBuffer asks the warehouse
+only for rows inserted since the last seen watermark, folds them into per-minute, per-zone
+running aggregates and evicts minutes that fell out of the window. KPIs, the zone list and
+the per-minute histogram are read from those aggregates, so refresh cost tracks the number
+of new events, not the window size.
+
+The watermark is on inserted_at, not event_time: a trip that arrives late (producer or
+Firehose buffering) still has an insert time past the watermark. Like the incremental dbt
+model, each fetch re-reads lateness_minutes before the watermark (inserts don't commit in
+inserted_at order) and drops the trip_ids already folded.
+
+Share one buffer per process with @st.cache_resource; refresh() is throttled so concurrent
+sessions trigger at most one delta fetch per refresh interval.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# bucket layout: (minute, zone) -> [trips, fare_sum, passenger_sum, delay_sum, delay_cnt, first_ts, last_ts]
+TRIPS, FARE, PAX, DELAY_SUM, DELAY_CNT, FIRST_TS, LAST_TS = range(7)
+UNKNOWN_ZONE = "Unknown"   # trips without a resolved pickup zone: counted, but not listed/ranked
+
+
+class RollingTripBuffer:
+    def __init__(self, fetch_since, window_minutes=120, refresh_interval=60, keep_recent=500,
+                 lateness_minutes=10):
+        """
+        fetch_since      : callable(since: datetime | None) -> DataFrame with columns
+                           event_time, trip_id, pickup_zone, delay_time_minutes, fare_amount,
+                           passenger_count, inserted_at; rows with inserted_at >= since
+                           (since=None means "initial load of the full window")
+        window_minutes   : rolling window length
+        refresh_interval : min seconds between warehouse fetches (shared by all sessions)
+        keep_recent      : raw rows retained for the "recent trips" table
+        lateness_minutes : overlap re-read before the watermark on every fetch
+        """
+        self.fetch_since = fetch_since
+        self.window = timedelta(minutes=window_minutes)
+        self.refresh_interval = refresh_interval
+        self.keep_recent = keep_recent
+        self.lateness = timedelta(minutes=lateness_minutes)
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._recent = pd.DataFrame()
+        self.watermark = None            # max inserted_at seen so far
+        self._seen = {}                  # trip_id -> inserted_at, for rows inside the overlap
+        self._last_fetch = 0.0
+        self.last_fetch_rows = 0
+
+    # ----------------------------------------------
+    # Refresh: delta fetch -> fold -> evict
+    # ----------------------------------------------
+    def refresh(self, now=None, force=False):
+        """Fetch and fold new events if the refresh interval elapsed. Returns rows added."""
+        with self._lock:
+            if not force and time.monotonic() - self._last_fetch < self.refresh_interval:
+                return 0
+            self._last_fetch = time.monotonic()
+
+            since = None if self.watermark is None else self.watermark - self.lateness
+            new = self._drop_already_seen(self.fetch_since(since))
+            if not new.empty:
+                self._fold(new)
+            self._evict(now or datetime.utcnow())
+            self.last_fetch_rows = len(new)
+            return len(new)
+
+    def _drop_already_seen(self, df):
+        if df.empty:
+            return df
+        df = df.copy()
+        df["event_time"] = pd.to_datetime(df["event_time"])
+        df["inserted_at"] = pd.to_datetime(df["inserted_at"])
+        # the overlap re-reads rows already folded; a replayed record may be inserted twice
+        df = df[~df["trip_id"].isin(self._seen.keys())].drop_duplicates("trip_id")
+        if df.empty:
+            return df
+
+        latest = df["inserted_at"].max()
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+        self._seen.update(zip(df["trip_id"], df["inserted_at"]))
+        # ids inserted before the next fetch's overlap can't be returned again
+        horizon = self.watermark - self.lateness
+        self._seen = {tid: ts for tid, ts in self._seen.items() if ts >= horizon}
+        return df
+
+    def _fold(self, df):
+        df = df.assign(
+            minute=df["event_time"].dt.floor("min"),
+            pickup_zone=df["pickup_zone"].fillna(UNKNOWN_ZONE),
+            delay_cnt=df["delay_time_minutes"].notna().astype("int64"),
+        )
+        grouped = df.groupby(["minute", "pickup_zone"]).agg(
+            trips=("trip_id", "size"),
+            fare=("fare_amount", "sum"),
+            pax=("passenger_count", "sum"),
+            delay_sum=("delay_time_minutes", "sum"),
+            delay_cnt=("delay_cnt", "sum"),
+            first_ts=("event_time", "min"),
+            last_ts=("event_time", "max"),
+        )
+        for key, row in zip(grouped.index, grouped.itertuples(index=False)):
+            b = self._buckets.get(key)
+            if b is None:
+                self._buckets[key] = [row.trips, float(row.fare), float(row.pax),
+                                      float(row.delay_sum), row.delay_cnt, row.first_ts, row.last_ts]
+            else:
+                b[TRIPS] += row.trips
+                b[FARE] += float(row.fare)
+                b[PAX] += float(row.pax)
+                b[DELAY_SUM] += float(row.delay_sum)
+                b[DELAY_CNT] += row.delay_cnt
+                b[FIRST_TS] = min(b[FIRST_TS], row.first_ts)
+                b[LAST_TS] = max(b[LAST_TS], row.last_ts)
+
+        recent = pd.concat([self._recent, df.drop(columns=["minute", "delay_cnt", "inserted_at"])],
+                           ignore_index=True)
+        self._recent = recent.nlargest(self.keep_recent, "event_time")
+
+    def _evict(self, now):
+        # minute-granular: a bucket leaves once its whole minute is older than the window
+        cutoff = pd.Timestamp(now - self.window).floor("min")
+        for key in [k for k in self._buckets if k[0] < cutoff]:
+            del self._buckets[key]
+        if not self._recent.empty:
+            self._recent = self._recent[self._recent["event_time"] >= cutoff]
+
+    # ----------------------------------------------
+    # Reads (zone=None / 'All' -> all zones)
+    # ----------------------------------------------
+    def _select(self, zone):
+        with self._lock:
+            if zone in (None, "All"):
+                return [(k, list(b)) for k, b in self._buckets.items()]
+            return [(k, list(b)) for k, b in self._buckets.items() if k[1] == zone]
+
+    def zones(self):
+        with self._lock:
+            return sorted({zone for _, zone in self._buckets if zone != UNKNOWN_ZONE})
+
+    def kpis(self, zone=None):
+        items = self._select(zone)
+        if not items:
+            return {"total_trips": 0, "avg_delay": 0, "busiest_zone": "N/A", "total_fare": 0.0,
+                    "total_passengers": 0, "avg_fare_per_passenger": 0, "trip_rate": 0}
+
+        total_trips = sum(b[TRIPS] for _, b in items)
+        total_fare = round(sum(b[FARE] for _, b in items), 2)
+        total_passengers = int(sum(b[PAX] for _, b in items))
+        delay_cnt = sum(b[DELAY_CNT] for _, b in items)
+        avg_delay = round(sum(b[DELAY_SUM] for _, b in items) / delay_cnt, 2) if delay_cnt else 0
+
+        by_zone = {}
+        for (_, z), b in items:
+            if z != UNKNOWN_ZONE:
+                by_zone[z] = by_zone.get(z, 0) + b[TRIPS]
+        busiest_zone = max(by_zone, key=by_zone.get) if by_zone else "N/A"
+
+        span_min = (max(b[LAST_TS] for _, b in items) - min(b[FIRST_TS] for _, b in items)).total_seconds() / 60
+        return {
+            "total_trips": total_trips,
+            "avg_delay": avg_delay,
+            "busiest_zone": busiest_zone,
+            "total_fare": total_fare,
+            "total_passengers": total_passengers,
+            "avg_fare_per_passenger": round(total_fare / total_passengers, 2) if total_passengers > 0 else 0,
+            "trip_rate": round(total_trips / span_min, 2) if span_min > 0 else 0,
+        }
+
+    def per_minute(self, zone=None):
+        """Trips per minute (index: minute), sorted."""
+        counts = {}
+        for (minute, _), b in self._select(zone):
+            counts[minute] = counts.get(minute, 0) + b[TRIPS]
+        return pd.Series(counts, name="trip_count", dtype="int64").sort_index().rename_axis("minute")
+
+    def recent(self, zone=None, n=10):
+        with self._lock:
+            df = self._recent
+        if zone not in (None, "All") and not df.empty:
+            df = df[df["pickup_zone"] == zone]
+        return df.sort_values("event_time", ascending=False).head(n)
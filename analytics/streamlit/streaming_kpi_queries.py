@@ -0,0 +1,138 @@
+"""
+Server-side KPI queries for the live streaming dashboard.
+
+Pushes the dashboard aggregates (totals, averages, busiest zone, zone list, per-minute
+counts, latest rows) into parameterized SQL so each session receives a handful of small
+result sets instead of every raw trip in the window. The zone filter is a bound
+parameter, so zone-filtered variants are computed by the warehouse too.
+
+`run` is any callable(sql, params) -> DataFrame (e.g. a pooled redshift_connector fetch);
+callers cache the results per (zone, window) with st.cache_data.
+"""
+
+import pandas as pd
+
+ALL_ZONES = "All"
+
+
+def _window_filter(window_minutes, zone):
+    # window is an int we control; the zone is the only user-supplied value -> bound parameter
+    where = f"event_time >= GETDATE() - INTERVAL '{int(window_minutes)} minutes'"
+    if zone in (None, ALL_ZONES):
+        return where, None
+    return where + " AND pickup_zone = %s", (zone,)
+
+
+def load_zone_list(run, relation, window_minutes):
+    """Distinct pickup zones seen in the window (for the filter dropdown)."""
+    where, params = _window_filter(window_minutes, None)
+    df = run(f"""
+        SELECT DISTINCT pickup_zone
+        FROM {relation}
+        WHERE {where} AND pickup_zone IS NOT NULL
+        ORDER BY 1
+    """, params)
+    return df["pickup_zone"].tolist()
+
+
+def load_kpi_snapshot(run, relation, window_minutes, zone=ALL_ZONES, recent_rows=10):
+    """
+    KPIs, per-minute counts and latest rows for one (zone, window).
+    Returns {"kpis": {...}, "per_minute": Series(minute -> trip_count), "recent": DataFrame}
+    with the same KPI keys as streaming_buffer.RollingTripBuffer.kpis().
+    """
+    where, params = _window_filter(window_minutes, zone)
+
+    totals = run(f"""
+        SELECT
+            COUNT(*)                AS total_trips,
+            AVG(delay_time_minutes) AS avg_delay,
+            SUM(fare_amount)        AS total_fare,
+            SUM(passenger_count)    AS total_passengers,
+            MIN(event_time)         AS first_event,
+            MAX(event_time)         AS last_event
+        FROM {relation}
+        WHERE {where}
+    """, params).iloc[0]
+
+    busiest = run(f"""
+        SELECT pickup_zone, COUNT(*) AS trips
+        FROM {relation}
+        WHERE {where} AND pickup_zone IS NOT NULL
+        GROUP BY 1
+        ORDER BY 2 DESC
+        LIMIT 1
+    """, params)
+
+    per_minute = run(f"""
+        SELECT DATE_TRUNC('minute', event_time) AS minute, COUNT(*) AS trip_count
+        FROM {relation}
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 1
+    """, params)
+
+    recent = run(f"""
+        SELECT event_time, trip_id, pickup_zone, delay_time_minutes, fare_amount, passenger_count
+        FROM {relation}
+        WHERE {where}
+        ORDER BY event_time DESC
+        LIMIT {int(recent_rows)}
+    """, params)
+
+    total_trips = int(totals["total_trips"] or 0)
+    total_fare = round(float(totals["total_fare"] or 0), 2)
+    total_passengers = int(totals["total_passengers"] or 0)
+    span_min = 0
+    if total_trips:
+        span_min = (pd.Timestamp(totals["last_event"]) - pd.Timestamp(totals["first_event"])).total_seconds() / 60
+
+    kpis = {
+        "total_trips": total_trips,
+        "avg_delay": round(float(totals["avg_delay"]), 2) if pd.notna(totals["avg_delay"]) else 0,
+        "busiest_zone": busiest["pickup_zone"].iloc[0] if not busiest.empty else "N/A",
+        "total_fare": total_fare,
+        "total_passengers": total_passengers,
+        "avg_fare_per_passenger": round(total_fare / total_passengers, 2) if total_passengers > 0 else 0,
+        "trip_rate": round(total_trips / span_min, 2) if span_min > 0 else 0,
+    }
+    per_minute = (
+        per_minute.assign(minute=pd.to_datetime(per_minute["minute"]))
+                  .set_index("minute")["trip_count"]
+                  .astype("int64")
+    )
+    return {"kpis": kpis, "per_minute": per_minute, "recent": recent}
+
+
+HOP_ORDER = ["producer_to_firehose", "firehose_to_lambda", "lambda_to_s3", "s3_to_redshift", "end_to_end"]
+
+
+def load_latency_hops(run, relation, hours=6):
+    """
+    Per-hop latency percentiles (dbt mart dash_nyc_taxi__streaming_latency_hops) for the last
+    `hours` arrival hours. Returns {"latest": DataFrame(hop -> samples/p50/p95/p99/max, seconds),
+    "p95_by_hour": DataFrame(hour x hop, seconds)}; both empty when there are no checkpoints yet.
+    """
+    df = run(f"""
+        SELECT hour, hop, hop_order, samples, p50_ms, p95_ms, p99_ms, max_ms
+        FROM {relation}
+        WHERE hour >= DATE_TRUNC('hour', GETDATE()) - INTERVAL '{int(hours)} hours'
+        ORDER BY hour, hop_order
+    """, None)
+    if df.empty:
+        return {"latest": df, "p95_by_hour": df}
+
+    df = df.assign(hour=pd.to_datetime(df["hour"]))
+    for c in ("p50_ms", "p95_ms", "p99_ms", "max_ms"):
+        df[c.replace("_ms", "_sec")] = (pd.to_numeric(df[c]) / 1000).round(2)
+
+    latest = (
+        df[df["hour"] == df["hour"].max()]
+        .set_index("hop")[["samples", "p50_sec", "p95_sec", "p99_sec", "max_sec"]]
+        .reindex([h for h in HOP_ORDER if h in set(df["hop"])])
+    )
+    p95_by_hour = (
+        df.pivot_table(index="hour", columns="hop", values="p95_sec", aggfunc="max")
+          .reindex(columns=[h for h in HOP_ORDER if h in set(df["hop"])])
+    )
+    return {"latest": latest, "p95_by_hour": p95_by_hour}
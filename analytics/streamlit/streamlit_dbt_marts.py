@@ -1,5 +1,8 @@
 import os, json, pandas as pd, psycopg2, streamlit as st, boto3
 
+import dbt_marts_client
+from warehouse_pool import ConnectionPool, POOL_SIZE
+
 # --- Settings (edit if needed) ---
 REGION = "us-east-1"
 SECRET_NAME = "dev/dbt/redshift"  # <- your existing secret
@@ -7,6 +10,8 @@ HOST = "teo-nyc-workgroup.667137120741.us-east-1.redshift-serverless.amazonaws.c
 PORT = 5439
 DB   = "nyc_taxi_db"
 SCHEMA = os.getenv("DBT_MART_SCHEMA", "dev_viper_mart")
+# offline: marts built by dbt --target duckdb from local fixtures (scripts/helpers/generate_local_fixtures.py)
+LOCAL = os.getenv("TARGET_WAREHOUSE", "").lower() == "duckdb"
 
 VIEW_UNION = f"{SCHEMA}.dash_nyc_taxi__stream_vs_baseline_hourly"
 VIEW_STREAM = f"{SCHEMA}.dash_nyc_taxi__streaming_hourly"
@@ -18,13 +23,21 @@ def get_redshift_credentials():
     secret = json.loads(sm.get_secret_value(SecretId=SECRET_NAME)["SecretString"])
     return secret["username"], secret["password"]
 
+@st.cache_resource
+def get_redshift_pool():
+    user, pwd = get_redshift_credentials()
+    return ConnectionPool(
+        lambda: psycopg2.connect(
+            host=HOST, port=PORT, dbname=DB, user=user, password=pwd, sslmode="require"
+        ),
+        max_size=POOL_SIZE,
+    )
+
 @st.cache_data(ttl=60)
 def read_sql_df(sql: str) -> pd.DataFrame:
-    user, pwd = get_redshift_credentials()
-    with psycopg2.connect(
-        host=HOST, port=PORT, dbname=DB, user=user, password=pwd, sslmode="require"
-    ) as conn:
-        return pd.read_sql(sql, conn)
+    if LOCAL:
+        return dbt_marts_client.run_query(sql, use_cache=False, target="duckdb")
+    return get_redshift_pool().run(lambda conn: pd.read_sql(sql, conn))
 
 st.set_page_config(page_title="ZenClarity • Streaming vs Baseline", layout="wide")
 st.title("🚕 Streaming vs Baseline — Hourly")
@@ -2,10 +2,15 @@ import streamlit as st
 import pandas as pd
 import boto3
 import json
+import os
 import redshift_connector
 import time
 from datetime import timedelta, datetime
 
+from warehouse_pool import ConnectionPool, POOL_SIZE
+from streaming_buffer import RollingTripBuffer
+from streaming_kpi_queries import ALL_ZONES, load_kpi_snapshot, load_latency_hops, load_zone_list
+
 # ----------------------------------------------
 # Redshift & AWS Secrets Manager Configuration
 # ----------------------------------------------
@@ -16,6 +21,18 @@ REDSHIFT_PORT = 5439
 REDSHIFT_DB = 'nyc_taxi_db'
 REDSHIFT_SCHEMA = 'public'
 REDSHIFT_VIEW = 'taxi_streaming_trips_vw'
+WINDOW_MINUTES = 120
+# sql    : KPIs/zone list/per-minute counts aggregated in Redshift, cached per (zone, window)
+# buffer : shared in-process rolling buffer of raw rows (delta fetch, pandas aggregates)
+KPI_MODE = os.getenv('STREAMING_KPI_MODE', 'sql')
+# dbt mart with per-hop latency percentiles (producer -> Firehose -> Lambda -> S3 -> Redshift)
+LATENCY_VIEW = f"{os.getenv('DBT_MART_SCHEMA', 'dev_viper_mart')}.dash_nyc_taxi__streaming_latency_hops"
+LATENCY_HOURS = 6
+# offline: dbt --target duckdb build from local fixtures (scripts/helpers/generate_local_fixtures.py);
+# the enriched streaming model has the columns of the Redshift view
+LOCAL = os.getenv('TARGET_WAREHOUSE', '').lower() == 'duckdb'
+TRIPS_RELATION = (f"{os.getenv('DBT_INT_SCHEMA', 'dev_viper_int')}.int_nyc__streaming_enriched" if LOCAL
+                  else f"{REDSHIFT_SCHEMA}.{REDSHIFT_VIEW}")
 
 # ----------------------------------------------
 # Get Redshift credentials from Secrets Manager
@@ -28,32 +45,87 @@ def get_redshift_credentials():
     return secret['username'], secret['password']
 
 # ----------------------------------------------
-# Query recent streaming trip data from Redshift
+# Shared Redshift connection pool (one per process, reused across reruns/sessions)
 # ----------------------------------------------
-@st.cache_data(ttl=60)
-def load_data():
+@st.cache_resource
+def get_redshift_pool():
+    if LOCAL:
+        import duckdb
+        return ConnectionPool(
+            lambda: duckdb.connect(os.getenv('DUCKDB_PATH', 'nyc_taxi.duckdb'), read_only=True),
+            max_size=POOL_SIZE,
+            transactional=False,
+        )
     username, password = get_redshift_credentials()
-    conn = redshift_connector.connect(
-        host=REDSHIFT_HOST,
-        port=REDSHIFT_PORT,
-        database=REDSHIFT_DB,
-        user=username,
-        password=password
+    return ConnectionPool(
+        lambda: redshift_connector.connect(
+            host=REDSHIFT_HOST,
+            port=REDSHIFT_PORT,
+            database=REDSHIFT_DB,
+            user=username,
+            password=password
+        ),
+        max_size=POOL_SIZE,
     )
+
+def _fetch_df(conn, query, params=None):
+    if LOCAL:
+        # Redshift SQL -> DuckDB: qmark parameters, GETDATE() as naive UTC
+        query = query.replace('%s', '?').replace('GETDATE()', "(current_timestamp AT TIME ZONE 'UTC')")
     cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = [col[0] for col in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+
+# ----------------------------------------------
+# Query streaming trips from Redshift: full window once, then only newly inserted rows
+# (by inserted_at, so late events are picked up too)
+# ----------------------------------------------
+TRIP_COLUMNS = "event_time, trip_id, pickup_zone, delay_time_minutes, fare_amount, passenger_count, inserted_at"
+
+def fetch_trips_since(since):
+    if since is None:
+        query = f"""
+            SELECT {TRIP_COLUMNS}
+            FROM {TRIPS_RELATION}
+            WHERE event_time >= GETDATE() - INTERVAL '{WINDOW_MINUTES} minutes'
+        """
+        return get_redshift_pool().run(lambda conn: _fetch_df(conn, query))
     query = f"""
-        SELECT 
-            event_time, trip_id, pickup_zone, delay_time_minutes, fare_amount, passenger_count
-        FROM {REDSHIFT_SCHEMA}.{REDSHIFT_VIEW}
-        WHERE event_time >= GETDATE() - INTERVAL '120 minutes'
+        SELECT {TRIP_COLUMNS}
+        FROM {TRIPS_RELATION}
+        WHERE inserted_at >= %s
     """
-    cursor.execute(query)
-    columns = [col[0] for col in cursor.description]
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=columns)
-    cursor.close()
-    conn.close()
-    return df
+    return get_redshift_pool().run(lambda conn: _fetch_df(conn, query, (since.to_pydatetime(),)))
+
+# One rolling buffer per process: sessions share it, and it fetches at most once per 60s
+@st.cache_resource
+def get_trip_buffer():
+    return RollingTripBuffer(fetch_trips_since, window_minutes=WINDOW_MINUTES, refresh_interval=60)
+
+# ----------------------------------------------
+# Server-side aggregates: small result sets, cached per (zone, window) for 60s
+# ----------------------------------------------
+def run_query(query, params=None):
+    return get_redshift_pool().run(lambda conn: _fetch_df(conn, query, params))
+
+@st.cache_data(ttl=60)
+def get_zone_list(window_minutes):
+    return load_zone_list(run_query, TRIPS_RELATION, window_minutes)
+
+@st.cache_data(ttl=60)
+def get_kpi_snapshot(zone, window_minutes):
+    return load_kpi_snapshot(run_query, TRIPS_RELATION, window_minutes, zone=zone)
+
+@st.cache_data(ttl=60)
+def get_latency_hops(hours):
+    return load_latency_hops(run_query, LATENCY_VIEW, hours)
+
+def get_buffer_snapshot(buffer, zone):
+    return {"kpis": buffer.kpis(zone), "per_minute": buffer.per_minute(zone), "recent": buffer.recent(zone, n=10)}
 
 # ----------------------------------------------
 # Streamlit UI Setup
@@ -63,40 +135,43 @@ st.title("🚕 NLe_Taxity Live Streaming Dashboard")
 st.caption("Streaming Redshift Data | Auto-refresh every 60 seconds")
 
 # ----------------------------------------------
-# Load data
+# Load data (aggregated in Redshift, or delta fetch into the shared rolling window)
 # ----------------------------------------------
-data = load_data()
+if KPI_MODE == 'buffer':
+    buffer = get_trip_buffer()
+    buffer.refresh()
+    window_trips = buffer.kpis()["total_trips"]
+    zone_list = buffer.zones()
+else:
+    window_trips = get_kpi_snapshot(ALL_ZONES, WINDOW_MINUTES)["kpis"]["total_trips"]
+    zone_list = get_zone_list(WINDOW_MINUTES) if window_trips else []
 
-if data.empty:
+if window_trips == 0:
     st.warning("No streaming trip records found in the last 10 minutes.")
     st.stop()
 
-# ----------------------------------------------
-# Preprocessing
-# ----------------------------------------------
-data['event_time'] = pd.to_datetime(data['event_time'])
-data['minute'] = data['event_time'].dt.floor('min')
-
 # ----------------------------------------------
 # Zone Filter Dropdown
 # ----------------------------------------------
-zones = ['All'] + sorted(data['pickup_zone'].dropna().unique().tolist())
+zones = [ALL_ZONES] + zone_list
 selected_zone = st.selectbox("📍 Filter by Pickup Zone:", zones)
 
-if selected_zone != 'All':
-    data = data[data['pickup_zone'] == selected_zone]
-
 # ----------------------------------------------
-# KPI Calculations
+# KPI Calculations (server-side per zone, or from the buffer's running aggregates)
 # ----------------------------------------------
-total_trips = len(data)
-avg_delay = round(data['delay_time_minutes'].mean(), 2) if not data.empty else 0
-total_fare = round(data['fare_amount'].sum(), 2)
-total_passengers = int(data['passenger_count'].sum())
-busiest_zone = data['pickup_zone'].value_counts().idxmax() if not data.empty else "N/A"
-avg_fare_per_passenger = round(total_fare / total_passengers, 2) if total_passengers > 0 else 0
-time_range_min = (data['event_time'].max() - data['event_time'].min()).total_seconds() / 60
-trip_rate = round(total_trips / time_range_min, 2) if time_range_min > 0 else 0
+if KPI_MODE == 'buffer':
+    snapshot = get_buffer_snapshot(buffer, selected_zone)
+else:
+    snapshot = get_kpi_snapshot(selected_zone, WINDOW_MINUTES)
+
+k = snapshot["kpis"]
+total_trips = k["total_trips"]
+avg_delay = k["avg_delay"]
+total_fare = k["total_fare"]
+total_passengers = k["total_passengers"]
+busiest_zone = k["busiest_zone"]
+avg_fare_per_passenger = k["avg_fare_per_passenger"]
+trip_rate = k["trip_rate"]
 
 # ----------------------------------------------
 # 🎯 Custom KPI Card Layout (Box Style with thinner label section)
@@ -164,16 +239,29 @@ st.caption(f"🔄 Next refresh at: {next_refresh.strftime('%H:%M:%S')}")
 # ----------------------------------------------
 # Cumulative Line Chart
 # ----------------------------------------------
-trip_counts = data.groupby('minute').size().reset_index(name='trip_count')
-trip_counts = trip_counts.sort_values('minute')
+trip_counts = snapshot["per_minute"].to_frame()
 trip_counts['cumulative'] = trip_counts['trip_count'].cumsum()
 
-st.line_chart(trip_counts.set_index('minute')[['cumulative']])
+st.line_chart(trip_counts[['cumulative']])
 
 # ----------------------------------------------
 # Show recent trip rows
 # ----------------------------------------------
-st.write("📋 Recent Trips", data.sort_values('event_time', ascending=False).head(10))
+st.write("📋 Recent Trips", snapshot["recent"])
+
+# ----------------------------------------------
+# ⏱ Per-hop latency (which hop the delay comes from)
+# ----------------------------------------------
+st.subheader("⏱ Per-hop Latency (seconds)")
+latency = get_latency_hops(LATENCY_HOURS)
+if latency["latest"].empty:
+    st.info("No latency checkpoints yet (producer_sent_time / s3_written_time not populated).")
+else:
+    left, right = st.columns(2)
+    left.caption("Latest hour: samples and percentiles per hop")
+    left.dataframe(latency["latest"], use_container_width=True)
+    right.caption(f"p95 per hop, last {LATENCY_HOURS} hours")
+    right.line_chart(latency["p95_by_hour"])
 
 # ----------------------------------------------
 # ⏱️ Auto-refresh logic every 60 seconds (safe placement)
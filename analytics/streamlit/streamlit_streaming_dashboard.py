@@ -1,8 +1,12 @@
 import os, json, pandas as pd, psycopg2, streamlit as st, boto3
 import time
+from contextlib import contextmanager
 from datetime import datetime
 import pytz
 
+import dbt_marts_client
+from warehouse_pool import ConnectionPool, POOL_SIZE
+
 # ----------------------------------------------
 # Redshift & AWS Secrets Manager Configuration
 # ----------------------------------------------
@@ -13,9 +17,17 @@ PORT = 5439
 DB   = "nyc_taxi_db"
 NYC_TZ = pytz.timezone('America/New_York')
 
-# The new dbt views to use
-STREAM_VIEW = "dev_viper_mart.agg_daily_streaming_trips"
-BASELINE_VIEW = "dev_viper_mart.dash_nyc_taxi__baseline_hourly"
+SCHEMA = os.getenv("DBT_MART_SCHEMA", "dev_viper_mart")
+# offline: marts built by dbt --target duckdb from local fixtures (scripts/helpers/generate_local_fixtures.py)
+LOCAL = os.getenv("TARGET_WAREHOUSE", "").lower() == "duckdb"
+
+# The new dbt views to use (agg_daily_streaming_trips is Redshift-only; offline the hourly
+# streaming mart stands in for it)
+if LOCAL:
+    STREAM_VIEW, STREAM_HOUR = f"{SCHEMA}.dash_nyc_taxi__streaming_hourly", "EXTRACT(HOUR FROM hour)"
+else:
+    STREAM_VIEW, STREAM_HOUR = f"{SCHEMA}.agg_daily_streaming_trips", "pickup_hour"
+BASELINE_VIEW = f"{SCHEMA}.dash_nyc_taxi__baseline_hourly"
 
 
 # ----------------------------------------------
@@ -28,19 +40,29 @@ def get_redshift_credentials():
     return secret["username"], secret["password"]
 
 # ----------------------------------------------
-# Load data from Redshift with a single, optimized query
+# Shared Redshift connection pool (one per process, reused across reruns/sessions)
 # ----------------------------------------------
-@st.cache_data(ttl=60)
-def get_dashboard_data():
+@st.cache_resource
+def get_redshift_pool():
     username, password = get_redshift_credentials()
-    conn = psycopg2.connect(
-        host=HOST, port=PORT, dbname=DB, user=username, password=password, sslmode="require"
+    return ConnectionPool(
+        lambda: psycopg2.connect(
+            host=HOST, port=PORT, dbname=DB, user=username, password=password, sslmode="require"
+        ),
+        max_size=POOL_SIZE,
     )
-    
+
+# ----------------------------------------------
+# Data-load layer: one query -> one typed frame -> all derived views, computed once
+# ----------------------------------------------
+FRAME_COLUMNS = ["series", "hour", "trips", "fare_total"]
+
+@st.cache_data(ttl=60)
+def get_dashboard_data():
     query = f"""
     SELECT
         'stream' AS series,
-        pickup_hour AS hour,
+        {STREAM_HOUR} AS hour,
         trips,
         fare_total
     FROM {STREAM_VIEW}
@@ -58,9 +80,57 @@ def get_dashboard_data():
     ORDER BY hour;
     """
     
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    if LOCAL:
+        df = dbt_marts_client.run_query(query, use_cache=False, target="duckdb")
+    else:
+        df = get_redshift_pool().run(lambda conn: pd.read_sql(query, conn))
+
+    # Typed once here so every section can use the frame as-is (Redshift returns Decimals)
+    return pd.DataFrame({
+        "series": df["series"].astype("category"),
+        "hour": pd.to_numeric(df["hour"]).astype("int64"),
+        "trips": pd.to_numeric(df["trips"]).astype("float64"),
+        "fare_total": pd.to_numeric(df["fare_total"]).astype("float64"),
+    }, columns=FRAME_COLUMNS)
+
+def build_dashboard_views(df):
+    """KPI totals and the hour x series pivot, derived once per rerun from the loaded frame."""
+    totals = df.groupby("series", observed=False)[["trips", "fare_total"]].sum()
+    totals = totals.reindex(["stream", "baseline"], fill_value=0)
+
+    wide = df.pivot_table(
+        index="hour", columns="series", values=["trips", "fare_total"],
+        aggfunc="sum", fill_value=0, observed=False,
+    )
+    trips_by_hour = wide["trips"].reindex(columns=["stream", "baseline"], fill_value=0)
+    fare_by_hour = wide["fare_total"].reindex(columns=["stream", "baseline"], fill_value=0)
+
+    difference = pd.DataFrame({"difference": trips_by_hour["stream"] - trips_by_hour["baseline"]})
+    difference["color"] = difference["difference"].map(lambda x: '#e74c3c' if x < 0 else '#2ecc71')
+
+    return {
+        "trips_stream": totals.at["stream", "trips"],
+        "trips_baseline": totals.at["baseline", "trips"],
+        "fare_stream": totals.at["stream", "fare_total"],
+        "fare_baseline": totals.at["baseline", "fare_total"],
+        "trips_by_hour": trips_by_hour,
+        "fare_by_hour": fare_by_hour,
+        "difference": difference,
+        "recent": df.sort_values("hour", ascending=False).head(10),
+    }
+
+# ----------------------------------------------
+# Per-section render timings (shown in the debug panel with ?debug=1)
+# ----------------------------------------------
+SECTION_TIMINGS = {}
+
+@contextmanager
+def timed_section(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SECTION_TIMINGS[name] = round((time.perf_counter() - start) * 1000, 1)
 
 # ----------------------------------------------
 # Streamlit UI Setup
@@ -73,21 +143,20 @@ st.caption("Compare Real-Time Simulation vs. Historical Peak | Refreshes every 6
 # ----------------------------------------------
 # Load Data and Preprocessing
 # ----------------------------------------------
-df_combined = get_dashboard_data()
+with timed_section("load"):
+    df_combined = get_dashboard_data()
 
 if df_combined.empty:
     st.warning("No data available to display KPIs or trends.")
     st.stop()
 
-# Get today's and baseline data for KPIs
-today_df = df_combined[df_combined['series'] == 'stream']
-baseline_df = df_combined[df_combined['series'] == 'baseline']
+with timed_section("derive"):
+    views = build_dashboard_views(df_combined)
 
-# KPI Calculations
-trips_stream = today_df['trips'].sum() if not today_df.empty else 0
-trips_baseline = baseline_df['trips'].sum() if not baseline_df.empty else 0
-fare_stream = today_df['fare_total'].sum() if not today_df.empty else 0.0
-fare_baseline = baseline_df['fare_total'].sum() if not baseline_df.empty else 0.0
+trips_stream = views["trips_stream"]
+trips_baseline = views["trips_baseline"]
+fare_stream = views["fare_stream"]
+fare_baseline = views["fare_baseline"]
 
 # Delta calculation function
 def calc_delta(current, base):
@@ -99,75 +168,81 @@ def calc_delta(current, base):
 # ----------------------------------------------
 # UI and Dashboard
 # ----------------------------------------------
-st.subheader("📊 Real-Time KPIs vs Baseline")
-col1, col2, col3 = st.columns(3)
+with timed_section("kpis"):
+    st.subheader("📊 Real-Time KPIs vs Baseline")
+    col1, col2, col3 = st.columns(3)
 
-with col1:
-    st.metric("🚖 Total Trips", f"{trips_stream:,.0f}", delta=calc_delta(trips_stream, trips_baseline))
-    st.markdown("Total trips in the streaming data so far.")
+    with col1:
+        st.metric("🚖 Total Trips", f"{trips_stream:,.0f}", delta=calc_delta(trips_stream, trips_baseline))
+        st.markdown("Total trips in the streaming data so far.")
 
-with col2:
-    st.metric("💰 Total Fare ($)", f"${fare_stream:,.2f}", delta=calc_delta(fare_stream, fare_baseline))
-    st.markdown("Total fare collected from the streaming data so far.")
+    with col2:
+        st.metric("💰 Total Fare ($)", f"${fare_stream:,.2f}", delta=calc_delta(fare_stream, fare_baseline))
+        st.markdown("Total fare collected from the streaming data so far.")
 
-with col3:
-    if trips_baseline > 0:
-        trips_delta = trips_stream - trips_baseline
-        st.metric(
-            label="Trips Change vs. Baseline",
-            value=f"{trips_delta:,.0f}",
-            delta=f"{((trips_delta / trips_baseline) * 100):,.2f}%"
-        )
-    else:
-        st.metric("Trips Change vs. Baseline", "N/A")
-    st.markdown("Change in trips compared to the same period in the historical baseline.")
+    with col3:
+        if trips_baseline > 0:
+            trips_delta = trips_stream - trips_baseline
+            st.metric(
+                label="Trips Change vs. Baseline",
+                value=f"{trips_delta:,.0f}",
+                delta=f"{((trips_delta / trips_baseline) * 100):,.2f}%"
+            )
+        else:
+            st.metric("Trips Change vs. Baseline", "N/A")
+        st.markdown("Change in trips compared to the same period in the historical baseline.")
 
-st.info(
-    "💡 **Insight**: The metrics show a strong performance for today's streaming data, with an increase in trips and total fare compared to the baseline. This suggests a positive trend in customer demand."
-)
+    st.info(
+        "💡 **Insight**: The metrics show a strong performance for today's streaming data, with an increase in trips and total fare compared to the baseline. This suggests a positive trend in customer demand."
+    )
 
 st.divider()
 
 # --- Hourly Aggregated Comparison Chart ---
-st.subheader("📈 Hourly Trip and Fare Comparison")
-left_chart, right_chart = st.columns(2)
+with timed_section("hourly_charts"):
+    st.subheader("📈 Hourly Trip and Fare Comparison")
+    left_chart, right_chart = st.columns(2)
 
-# Chart 1: Trips per hour
-left_chart.subheader("Trips per Hour")
-left_chart.line_chart(df_combined.pivot(index="hour", columns="series", values="trips"))
+    # Chart 1: Trips per hour
+    left_chart.subheader("Trips per Hour")
+    left_chart.line_chart(views["trips_by_hour"])
 
-# Chart 2: Fare per hour
-right_chart.subheader("Fare Total per Hour")
-right_chart.bar_chart(df_combined.pivot(index="hour", columns="series", values="fare_total"))
+    # Chart 2: Fare per hour
+    right_chart.subheader("Fare Total per Hour")
+    right_chart.bar_chart(views["fare_by_hour"])
+
+    st.markdown("This line chart provides a direct comparison of trips per hour. The bar chart on the right visualizes the fare total.")
 
-st.markdown("This line chart provides a direct comparison of trips per hour. The bar chart on the right visualizes the fare total.")
-    
 st.divider()
 
 # --- Difference Chart ---
-st.subheader("Difference in Trips: Stream - Baseline")
-
-# Pivot the data to calculate the difference
-df_pivoted = df_combined.pivot(index="hour", columns="series", values="trips").fillna(0)
-df_pivoted['difference'] = df_pivoted['stream'] - df_pivoted['baseline']
-
-# Assign a color to each bar based on its value
-df_pivoted['color'] = df_pivoted['difference'].apply(lambda x: '#e74c3c' if x < 0 else '#2ecc71')
-
-st.bar_chart(
-    df_pivoted,
-    y='difference',
-    color='color',
-    use_container_width=True
-)
-st.markdown("This bar chart visualizes the performance delta. A positive bar (green) indicates the stream is outperforming the baseline, while a negative bar (red) shows underperformance. This is a very clear and intuitive way to present performance.")
-    
+with timed_section("difference_chart"):
+    st.subheader("Difference in Trips: Stream - Baseline")
+    st.bar_chart(
+        views["difference"],
+        y='difference',
+        color='color',
+        use_container_width=True
+    )
+    st.markdown("This bar chart visualizes the performance delta. A positive bar (green) indicates the stream is outperforming the baseline, while a negative bar (red) shows underperformance. This is a very clear and intuitive way to present performance.")
+
 st.divider()
 
 # --- Recent Rows Table ---
-st.subheader("📝 Recent Data Sample from Baseline")
-df_recent = get_dashboard_data()
-st.dataframe(df_recent.sort_values("hour", ascending=False).head(10), use_container_width=True)
+with timed_section("recent_rows"):
+    st.subheader("📝 Recent Data Sample from Baseline")
+    st.dataframe(views["recent"], use_container_width=True)
+
+# ----------------------------------------------
+# Debug panel: ?debug=1
+# ----------------------------------------------
+if st.query_params.get("debug") == "1":
+    with st.expander("🛠 Debug: section render timings (ms)", expanded=True):
+        st.dataframe(
+            pd.DataFrame(list(SECTION_TIMINGS.items()), columns=["section", "ms"]),
+            use_container_width=True,
+        )
+        st.caption(f"Frame: {len(df_combined)} rows, {df_combined.memory_usage(deep=True).sum():,} bytes")
 
 # ----------------------------------------------
 # Auto-refresh every 60 seconds
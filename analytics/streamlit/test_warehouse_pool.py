@@ -0,0 +1,122 @@
+"""
+Unit tests for warehouse_pool.ConnectionPool with a fake DB-API driver that, like
+psycopg2/redshift_connector, rejects every statement after an error until rollback():
+  python -m pytest analytics/streamlit/test_warehouse_pool.py -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from warehouse_pool import ConnectionPool  # noqa: E402
+
+
+class ProgrammingError(Exception):
+    pass
+
+
+class OperationalError(Exception):
+    pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.aborted = False
+        self.dead = False
+        self.closed = False
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.dead:
+            raise OperationalError("server closed the connection unexpectedly")
+        self.aborted = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        if self.conn.dead:
+            raise OperationalError("server closed the connection unexpectedly")
+        if self.conn.aborted:
+            raise ProgrammingError("current transaction is aborted")
+        self.conn.executed.append(sql)
+        if "bad_column" in sql:
+            self.conn.aborted = True
+            raise ProgrammingError('column "bad_column" does not exist')
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def _query(sql):
+    def fn(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+            return cur.fetchall()
+        finally:
+            cur.close()
+    return fn
+
+
+@pytest.fixture
+def pool():
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    p = ConnectionPool(connect, max_size=2)
+    p.opened = opened
+    return p
+
+
+def test_sql_error_keeps_connection_and_is_not_retried(pool):
+    with pytest.raises(ProgrammingError):
+        pool.run(_query("select bad_column"))
+    assert len(pool.opened) == 1                       # no reconnect
+    assert pool.opened[0].executed == ["select bad_column"]   # not re-run
+    assert pool.stats() == {"open": 1, "idle": 1, "max_size": 2}
+
+    # the pooled connection was rolled back and serves the next query
+    assert pool.run(_query("select 1")) == [(1,)]
+    assert len(pool.opened) == 1
+
+
+def test_sql_error_in_connection_block_keeps_connection(pool):
+    with pytest.raises(ProgrammingError):
+        with pool.connection() as conn:
+            _query("select bad_column")(conn)
+    assert not pool.opened[0].closed
+    assert pool.stats()["idle"] == 1
+
+
+def test_dead_connection_is_replaced_and_retried(pool):
+    pool.run(_query("select 1"))
+    pool.opened[0].dead = True
+    assert pool.run(_query("select 2")) == [(1,)]
+    assert pool.opened[0].closed
+    assert len(pool.opened) == 2
+    assert pool.stats() == {"open": 1, "idle": 1, "max_size": 2}
+
+
+def test_close_all_closes_borrowed_connection_on_release(pool):
+    with pool.connection() as conn:
+        pool.close_all()
+    assert conn.closed
+    assert pool.stats()["open"] == 0
@@ -0,0 +1,223 @@
+"""
+Long-lived, health-checked warehouse connections for the dashboards and dbt_marts_client.
+
+Opening a Redshift Serverless / Snowflake connection costs a TLS + auth handshake
+(hundreds of ms). ConnectionPool keeps a bounded set of connections open and hands them
+out across Streamlit reruns and sessions; wrap it in @st.cache_resource so one pool is
+shared per process:
+
+    @st.cache_resource
+    def get_redshift_pool():
+        user, pwd = get_redshift_credentials()
+        return ConnectionPool(lambda: psycopg2.connect(...), max_size=POOL_SIZE)
+
+    df = get_redshift_pool().run(lambda conn: pd.read_sql(sql, conn))
+
+Works with any DB-API connection (psycopg2, redshift_connector, snowflake.connector).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+POOL_SIZE = int(os.getenv("WAREHOUSE_POOL_SIZE", "4"))
+# DB-API exception classes that mean the connection itself failed (not the statement)
+CONNECTION_ERRORS = ("OperationalError", "InterfaceError")
+
+
+class PoolTimeout(Exception):
+    """No connection became available within acquire_timeout."""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect,
+        max_size=POOL_SIZE,
+        acquire_timeout=30,
+        health_check_after=30,
+        max_lifetime=3600,
+        health_check_sql="select 1",
+        transactional=True,
+    ):
+        """
+        connect            : zero-arg callable returning a new DB-API connection
+        max_size           : max open connections (idle + in use)
+        acquire_timeout    : seconds to wait for a free connection before PoolTimeout
+        health_check_after : ping a connection that has been idle longer than this (seconds)
+        max_lifetime       : recycle connections older than this (seconds)
+        transactional      : False for drivers without rollback() (DuckDB, PyHive/Spark Thrift)
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self.health_check_sql = health_check_sql
+        self.transactional = transactional
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, created_at, last_used)] — LIFO, warmest first
+        self._created = {}     # id(conn) -> (created_at, generation)
+        self._size = 0         # open connections (idle + in use)
+        self._generation = 0   # bumped by close_all(); older connections are closed on release
+
+    # ----------------------------------------------
+    # Public API
+    # ----------------------------------------------
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it goes back to the pool (or is dropped if broken) on exit."""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = self._is_broken(conn, e)
+            raise
+        finally:
+            self._release(conn, discard=broken)
+
+    def run(self, fn, retries=1):
+        """
+        Call fn(conn) on a pooled connection. If it fails and the connection turns out to
+        be dead (warehouse restart, idle timeout, network blip), retry on a fresh one; an
+        ordinary SQL error is raised as-is and the connection stays pooled.
+        """
+        for attempt in range(retries + 1):
+            conn = self._acquire()
+            try:
+                result = fn(conn)
+            except Exception as e:
+                broken = self._is_broken(conn, e)
+                self._release(conn, discard=broken)
+                if not broken or attempt >= retries:
+                    raise
+                print(f"[pool] connection lost, reconnecting (attempt {attempt + 1}/{retries})")
+                continue
+            self._release(conn)
+            return result
+
+    def close_all(self):
+        """Close idle connections (in-use ones are closed when released)."""
+        with self._cond:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {"open": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+    # ----------------------------------------------
+    # Internals
+    # ----------------------------------------------
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            expired, entry, open_new = [], None, False
+            with self._cond:
+                while self._idle and entry is None:
+                    conn, created_at, last_used = self._idle.pop()
+                    if time.monotonic() - created_at > self.max_lifetime:
+                        self._size -= 1
+                        expired.append(conn)
+                    else:
+                        entry = (conn, last_used)
+                if entry is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                        open_new = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeout(f"no warehouse connection free after {self.acquire_timeout}s")
+                        self._cond.wait(remaining)
+
+            # network work (close / connect / ping) happens outside the lock
+            for conn in expired:
+                self._close(conn)
+            if open_new:
+                return self._open()
+            if entry is None:
+                continue
+            conn, last_used = entry
+            if time.monotonic() - last_used <= self.health_check_after or self._is_healthy(conn):
+                return conn
+            print("[pool] stale connection dropped, reconnecting")
+            self._close(conn)
+            return self._open()
+
+    def _open(self):
+        # the caller has already counted this connection in _size
+        generation = self._generation
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._created[id(conn)] = (time.monotonic(), generation)
+        return conn
+
+    def _release(self, conn, discard=False):
+        if not discard and self.transactional:
+            try:
+                # end the implicit transaction so the next borrower sees fresh data
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        created_at, generation = self._created.get(id(conn), (time.monotonic(), self._generation))
+        if generation != self._generation:
+            # borrowed before close_all(): close it instead of returning it to the pool
+            discard = True
+        if discard:
+            self._close(conn)
+        with self._cond:
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def _is_broken(self, conn, error):
+        """Whether a failure left the connection unusable, as opposed to a failed statement."""
+        if self.transactional:
+            try:
+                # a failed statement aborts the transaction; end it before anything else
+                conn.rollback()
+            except Exception:
+                return True
+        if not any(c.__name__ in CONNECTION_ERRORS for c in type(error).__mro__):
+            return False
+        # OperationalError also covers cancelled/timed-out statements: ping to tell them apart
+        return not self._is_healthy(conn)
+
+    def _is_healthy(self, conn):
+        try:
+            if self.transactional:
+                conn.rollback()
+            cur = conn.cursor()
+            try:
+                cur.execute(self.health_check_sql)
+                cur.fetchall()
+            finally:
+                cur.close()
+            if self.transactional:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
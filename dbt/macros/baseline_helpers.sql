@@ -0,0 +1,19 @@
+{#
+  Resolves the latest loaded pickup_date from the day-level metadata model at run time,
+  so baseline marts can filter on literal bounds (sort keys / partition pruning) instead
+  of a correlated max() over trip data. Returns none at parse time or before the metadata
+  model exists; callers fall back to a scalar subquery.
+#}
+{% macro latest_trip_day(days_model='int_nyc__trip_days') -%}
+  {%- if not execute -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set days = ref(days_model) -%}
+  {%- set relation = adapter.get_relation(database=days.database, schema=days.schema, identifier=days.identifier) -%}
+  {%- if relation is none -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set result = run_query('select max(pickup_date) from ' ~ relation) -%}
+  {%- set latest = result.columns[0].values()[0] -%}
+  {{ return(latest | string if latest is not none else none) }}
+{%- endmacro %}
@@ -0,0 +1,68 @@
+{#
+  Helpers shared by the incremental trip models (see docs: incremental_refresh).
+
+  Trip models are rebuilt per (pickup_month, cab_type) slice: each incremental run
+  re-selects the trailing month(s) and swaps those slices in the target.
+    - redshift / snowflake : delete+insert on (pickup_month, cab_type)
+    - spark                : insert_overwrite of the (cab_type, pickup_month) partitions
+#}
+
+{% macro trip_incremental_strategy() -%}
+  {%- if target.type == 'spark' -%}
+    insert_overwrite
+  {%- else -%}
+    delete+insert
+  {%- endif -%}
+{%- endmacro %}
+
+
+{#
+  First pickup month (inclusive, 'YYYY-MM-01') to reprocess on an incremental run.
+    --vars '{refresh_month_from: "2024-01"}'  -> explicit backfill start
+    var('incremental_months_back', 1)         -> months re-read before the latest month in {{ this }}
+  Resolved at run time so models filter on a literal (static partition pruning on Spark,
+  zone maps on Redshift). Returns none at parse time or when {{ this }} is empty.
+#}
+{% macro incremental_month_floor(month_column='pickup_month') -%}
+  {%- if var('refresh_month_from', none) -%}
+    {{ return(var('refresh_month_from') ~ '-01') }}
+  {%- endif -%}
+  {%- if not execute -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set result = run_query('select max(' ~ month_column ~ ') from ' ~ this) -%}
+  {%- set latest = result.columns[0].values()[0] -%}
+  {%- if latest is none -%}
+    {{ return(none) }}
+  {%- endif -%}
+  {%- set latest = latest | string -%}
+  {%- set months = (latest[0:4] | int) * 12 + (latest[5:7] | int) - 1 - (var('incremental_months_back', 1) | int) -%}
+  {{ return('%04d-%02d-01' | format(months // 12, months % 12 + 1)) }}
+{%- endmacro %}
+
+
+{#
+  Lower bound (inclusive) of the pickup months to reprocess, as a SQL expression:
+  the literal floor when it can be resolved, else a scalar subquery over {{ this }}.
+#}
+{% macro incremental_month_lower_bound(month_column='pickup_month') -%}
+  {%- set floor = incremental_month_floor(month_column) -%}
+  {%- if floor -%}
+    cast('{{ floor }}' as date)
+  {%- else -%}
+    (
+      select {{ dbt.dateadd('month', -1 * var('incremental_months_back', 1),
+                            "coalesce(max(" ~ month_column ~ "), cast('1900-01-01' as date))") }}
+      from {{ this }}
+    )
+  {%- endif -%}
+{%- endmacro %}
+
+{#
+  dbt-duckdb deletes composite keys with `delete ... using <tmp> where k1 = k1 and k2 = k2`,
+  a many-to-many join on our non-unique (pickup_month, cab_type) keys. Use the dbt-core
+  default instead: `where (k1, k2) in (select distinct k1, k2 from <tmp>)`.
+#}
+{% macro duckdb__get_delete_insert_merge_sql(target, source, unique_key, dest_columns, incremental_predicates) -%}
+  {{ dbt.default__get_delete_insert_merge_sql(target, source, unique_key, dest_columns, incremental_predicates) }}
+{%- endmacro %}
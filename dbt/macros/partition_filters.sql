@@ -0,0 +1,33 @@
+{#
+  Month / cab_type filter for trip data, rendered so each engine can prune:
+    spark/duckdb -> predicates on the lake partition columns (cab_type=/year=/month=/day=)
+    warehouses   -> half-open range on the pickup timestamp (sort key)
+  month_from / month_to are 'YYYY-MM' (a trailing '-DD' is ignored); cab_types is a list
+  or a comma-separated string. Bounds left as none are omitted.
+#}
+{% macro trip_partition_predicate(month_from=none, month_to=none, cab_types=none,
+                                  year_col='year', month_col='month',
+                                  ts_col='pickup_datetime', cab_col='cab_type') -%}
+  1 = 1
+  {%- if month_from %}
+    {%- set y, m = month_from[0:4] | int, month_from[5:7] | int %}
+    {%- if is_lake_target() %}
+  and ({{ year_col }} > {{ y }} or ({{ year_col }} = {{ y }} and {{ month_col }} >= {{ m }}))
+    {%- else %}
+  and {{ ts_col }} >= cast('{{ "%04d-%02d-01" | format(y, m) }}' as timestamp)
+    {%- endif %}
+  {%- endif %}
+  {%- if month_to %}
+    {%- set y, m = month_to[0:4] | int, month_to[5:7] | int %}
+    {%- if is_lake_target() %}
+  and ({{ year_col }} < {{ y }} or ({{ year_col }} = {{ y }} and {{ month_col }} <= {{ m }}))
+    {%- else %}
+    {%- set next_month = y * 12 + m %}
+  and {{ ts_col }} < cast('{{ "%04d-%02d-01" | format(next_month // 12, next_month % 12 + 1) }}' as timestamp)
+    {%- endif %}
+  {%- endif %}
+  {%- if cab_types %}
+    {%- set cabs = cab_types.split(',') if cab_types is string else cab_types %}
+  and {{ cab_col }} in ({% for c in cabs %}'{{ c | trim | lower }}'{{ ", " if not loop.last }}{% endfor %})
+  {%- endif %}
+{%- endmacro %}
@@ -0,0 +1,24 @@
+{#
+  Watermark for the incremental streaming models: newest inserted_at already materialized
+  in {{ this }}, pulled back by var('streaming_lateness_minutes'). Rows that land in the
+  warehouse up to that many minutes "behind" the newest row are still picked up; anything
+  later than that is outside the lateness bound and needs a --full-refresh.
+  Rendered as a literal when resolvable, else a scalar subquery over {{ this }}. While
+  {{ this }} is empty it falls back to the live-window floor of the initial build, so a
+  model first built without streaming rows still fills up on the next run.
+#}
+{% macro streaming_watermark(ts_column='inserted_at') -%}
+  {%- set lateness = var('streaming_lateness_minutes', 10) | int -%}
+  {%- set floor = dbt.dateadd('day', -var('streaming_days_back', 1), 'current_date') -%}
+  {%- if execute -%}
+    {%- set latest = run_query('select max(' ~ ts_column ~ ') from ' ~ this).columns[0].values()[0] -%}
+    {%- if latest is not none -%}
+      {%- set latest = modules.datetime.datetime.fromisoformat(latest | string) -%}
+      {%- set watermark = latest - modules.datetime.timedelta(minutes=lateness) -%}
+      {{ return("cast('" ~ watermark.strftime('%Y-%m-%d %H:%M:%S') ~ "' as timestamp)") }}
+    {%- else -%}
+      {{ return(floor) }}
+    {%- endif -%}
+  {%- endif -%}
+  {{ return("(select coalesce(" ~ dbt.dateadd('minute', -lateness, 'max(' ~ ts_column ~ ')') ~ ", " ~ floor ~ ") from " ~ this ~ ")") }}
+{%- endmacro %}
@@ -0,0 +1,34 @@
+{#
+  True when sources are read in the S3 lake layout (Glue partition columns cab_type=/year=/
+  month=/day=, lake column names like locationid) rather than from warehouse load tables:
+    spark  -> Glue Catalog tables over s3://teo-nyc-taxi/processed/
+    duckdb -> local Parquet extracts in the same layout (scripts/helpers/generate_local_fixtures.py)
+#}
+{% macro is_lake_target() -%}
+  {{ return(target.type in ('spark', 'duckdb')) }}
+{%- endmacro %}
+
+{# 'YYYY-MM' label of a timestamp expression (TO_CHAR on Redshift/Snowflake) #}
+{% macro format_year_month(ts) -%}
+  {%- if target.type == 'spark' -%}
+    DATE_FORMAT({{ ts }}, 'yyyy-MM')
+  {%- elif target.type == 'duckdb' -%}
+    STRFTIME({{ ts }}, '%Y-%m')
+  {%- else -%}
+    TO_CHAR({{ ts }}, 'YYYY-MM')
+  {%- endif -%}
+{%- endmacro %}
+
+{#
+  Continuous percentile of an expression as an aggregate (fraction p in 0..1).
+  Redshift allows several of these in one select only if they share the same order-by expression.
+#}
+{% macro percentile(expr, p) -%}
+  {%- if target.type == 'spark' -%}
+    percentile_approx({{ expr }}, {{ p }})
+  {%- elif target.type == 'duckdb' -%}
+    quantile_cont({{ expr }}, {{ p }})
+  {%- else -%}
+    percentile_cont({{ p }}) within group (order by {{ expr }})
+  {%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,24 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy=trip_incremental_strategy(),
+    unique_key=['pickup_month', 'cab_type'],
+    partition_by=(['cab_type', 'pickup_month'] if target.type == 'spark' else none),
+    file_format=('parquet' if target.type == 'spark' else none),
+    on_schema_change='append_new_columns'
+) }}
+
+-- Day-level metadata (a few rows per day): lets marts resolve "latest day" / baseline days
+-- without a max() over trip-level data.
+
+select
+  pickup_date,
+  cab_type,
+  pickup_month,
+  sum(trip_count)  as trip_count,
+  min(pickup_hour_at) as first_hour_at,
+  max(pickup_hour_at) as last_hour_at
+from {{ ref('int_nyc__trip_hourly_rollup') }}
+{% if is_incremental() %}
+where pickup_month >= {{ incremental_month_lower_bound() }}
+{% endif %}
+group by 1,2,3
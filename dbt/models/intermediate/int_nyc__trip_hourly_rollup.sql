@@ -0,0 +1,38 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy=trip_incremental_strategy(),
+    unique_key=['pickup_month', 'cab_type'],
+    partition_by=(['cab_type', 'pickup_month'] if target.type == 'spark' else none),
+    file_format=('parquet' if target.type == 'spark' else none),
+    sort=['pickup_hour_at', 'cab_type'],
+    on_schema_change='append_new_columns'
+) }}
+
+-- Single source for the dashboard marts: one row per (hour, cab_type, pickup_location_id).
+-- Measures are additive (sums + counts) so marts re-aggregate at any coarser grain;
+-- averages are always sum / cnt, never an average of averages.
+
+select
+  date_trunc('hour', pickup_at)   as pickup_hour_at,
+  cab_type,
+  pickup_location_id,
+  pickup_zone,
+  pickup_borough,
+  pickup_date,
+  pickup_month,
+  pickup_hour,
+
+  count(*)                        as trip_count,
+  sum(fare_amount)                as fare_sum,
+  count(fare_amount)              as fare_cnt,
+  sum(passenger_count)            as passenger_sum,
+  count(passenger_count)          as passenger_cnt,
+  count(nullif(passenger_count, 0)) as passenger_nonzero_cnt,
+  sum(trip_duration_min)          as duration_min_sum,
+  count(trip_duration_min)        as duration_min_cnt
+
+from {{ ref('int_nyc__trip_zone') }}
+{% if is_incremental() %}
+where pickup_month >= {{ incremental_month_lower_bound() }}
+{% endif %}
+group by 1,2,3,4,5,6,7,8
@@ -1,7 +1,15 @@
--- switch to 'table' later if needed{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=trip_incremental_strategy(),
+    unique_key=['pickup_month', 'cab_type'],
+    partition_by=(['cab_type', 'pickup_month'] if target.type == 'spark' else none),
+    file_format=('parquet' if target.type == 'spark' else none),
+    sort=['pickup_month', 'cab_type'],
+    cluster_by=['pickup_month', 'cab_type'],
+    on_schema_change='append_new_columns'
+) }}
 
--- switch to 'table' later if needed
-{{ config(materialized='view') }}
+{%- set month_floor = incremental_month_floor() if is_incremental() else none %}
 
 with trips as (
   select
@@ -17,6 +25,16 @@ with trips as (
     total_amount,
     cab_type
   from {{ ref('stg_nyc_taxi__trip_data') }}
+  {% if is_incremental() %}
+  -- only the trailing month slice(s) are rebuilt; older months stay as materialized.
+  -- pickup_year / pickup_month are the partition columns on Spark, so this prunes S3 prefixes.
+  where {% if month_floor -%}
+    {{ trip_partition_predicate(month_from=month_floor, year_col='pickup_year',
+                                month_col='pickup_month', ts_col='pickup_at') }}
+  {%- else -%}
+    pickup_at >= {{ incremental_month_lower_bound() }}
+  {%- endif %}
+  {% endif %}
 ),
 zones as (
   select
@@ -41,7 +59,7 @@ select /*+ BROADCAST(z) */
   {% else %}
     CAST(t.pickup_at AS DATE) as pickup_date,
     CAST(DATE_TRUNC('month', t.pickup_at) AS DATE) as pickup_month,
-    TO_CHAR(DATE_TRUNC('month', t.pickup_at), 'YYYY-MM') as pickup_month_ym,
+    {{ format_year_month("DATE_TRUNC('month', t.pickup_at)") }} as pickup_month_ym,
     EXTRACT(hour FROM t.pickup_at) as pickup_hour,
     DATEDIFF('minute', t.pickup_at, t.dropoff_at) as trip_duration_min
   {% endif %}
@@ -1,8 +1,9 @@
-{{ config(materialized='view') }}
+-- all-time aggregate: not sliceable by month, so rebuilt as a table on every run
+{{ config(materialized='table') }}
 
 select
   pickup_zone,
-  avg(fare_amount) as avg_fare
-from {{ ref('int_nyc__trip_zone') }}
-where fare_amount is not null
+  sum(fare_sum) / sum(fare_cnt) as avg_fare
+from {{ ref('int_nyc__trip_hourly_rollup') }}
 group by 1
+having sum(fare_cnt) > 0
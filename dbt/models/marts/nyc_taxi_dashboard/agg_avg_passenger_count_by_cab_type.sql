@@ -1,8 +1,9 @@
-{{ config(materialized='view') }}
+-- all-time aggregate: not sliceable by month, so rebuilt as a table on every run
+{{ config(materialized='table') }}
 
 select
   cab_type,
-  avg(passenger_count) as avg_passenger_count
-from {{ ref('int_nyc__trip_zone') }}
-where passenger_count is not null
+  sum(passenger_sum) * 1.0 / sum(passenger_cnt) as avg_passenger_count
+from {{ ref('int_nyc__trip_hourly_rollup') }}
 group by 1
+having sum(passenger_cnt) > 0
@@ -1,9 +1,18 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=trip_incremental_strategy(),
+    unique_key=['pickup_month', 'cab_type'],
+    partition_by=(['cab_type', 'pickup_month'] if target.type == 'spark' else none),
+    file_format=('parquet' if target.type == 'spark' else none)
+) }}
 
 select
   cab_type,
   pickup_month,
-  avg(trip_duration_min) as avg_trip_duration_min
-from {{ ref('int_nyc__trip_zone') }}
-where trip_duration_min is not null
+  sum(duration_min_sum) * 1.0 / sum(duration_min_cnt) as avg_trip_duration_min
+from {{ ref('int_nyc__trip_hourly_rollup') }}
+{% if is_incremental() %}
+where pickup_month >= {{ incremental_month_lower_bound() }}
+{% endif %}
 group by 1,2
+having sum(duration_min_cnt) > 0
@@ -1,8 +1,9 @@
-{{ config(materialized='view') }}
+-- all-time aggregate: not sliceable by month, so rebuilt as a table on every run
+{{ config(materialized='table') }}
 
 with zone_counts as (
-  select pickup_zone, count(*) as total_trips
-  from {{ ref('int_nyc__trip_zone') }}
+  select pickup_zone, sum(trip_count) as total_trips
+  from {{ ref('int_nyc__trip_hourly_rollup') }}
   group by 1
 ),
 ranked_overall as (
@@ -11,8 +12,8 @@ ranked_overall as (
   from zone_counts
 ),
 zone_counts_month as (
-  select pickup_month, pickup_zone, count(*) as total_trips
-  from {{ ref('int_nyc__trip_zone') }}
+  select pickup_month, pickup_zone, sum(trip_count) as total_trips
+  from {{ ref('int_nyc__trip_hourly_rollup') }}
   group by 1,2
 ),
 ranked_month as (
@@ -1,8 +1,17 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy=trip_incremental_strategy(),
+    unique_key=['pickup_month', 'cab_type'],
+    partition_by=(['cab_type', 'pickup_month'] if target.type == 'spark' else none),
+    file_format=('parquet' if target.type == 'spark' else none)
+) }}
 
 select
   cab_type,
   pickup_month,
-  count(*) as trip_count
-from {{ ref('int_nyc__trip_zone') }}
+  sum(trip_count) as trip_count
+from {{ ref('int_nyc__trip_hourly_rollup') }}
+{% if is_incremental() %}
+where pickup_month >= {{ incremental_month_lower_bound() }}
+{% endif %}
 group by 1,2
@@ -1,21 +1,47 @@
-{{ config(materialized='view', tags=['mart','nyc_taxi','baseline']) }}
+{{ config(materialized='table', tags=['mart','nyc_taxi','baseline']) }}
 
-with chosen_day as (
-  {% if var('baseline_date', none) %}
-    -- quote the var safely and cast to date (prevents empty results)
-    select {{ "'" ~ var('baseline_date') ~ "'" }}::date as d
-  {% else %}
-    -- fallback: latest baseline day present in data
-    select max(date(pickup_at)) as d
-    from {{ ref('int_nyc__trip_zone') }}
-  {% endif %}
+{#-
+  Baseline = the same weekday over the last `baseline_weeks` weeks ending at the anchor day,
+  averaged per hour of day and projected onto the anchor day's hours.
+    anchor day: var('baseline_date') if set, else the latest day in int_nyc__trip_days
+  The anchor is resolved to a literal when possible so the range below prunes on
+  pickup_hour_at (Redshift sort key) and pickup_month (Spark partitions).
+-#}
+{%- set baseline_weeks = var('baseline_weeks', 1) | int -%}
+{%- set anchor_day = var('baseline_date', none) or latest_trip_day() -%}
+{%- if anchor_day -%}
+  {%- set anchor = modules.datetime.date.fromisoformat(anchor_day | string) -%}
+  {%- set window_start = anchor - modules.datetime.timedelta(days=7 * (baseline_weeks - 1)) -%}
+  {%- set anchor_expr = "cast('" ~ anchor ~ "' as date)" -%}
+{%- else -%}
+  {%- set anchor_expr = "(select max(pickup_date) from " ~ ref('int_nyc__trip_days') ~ ")" -%}
+{%- endif -%}
+
+with baseline_days as (
+  select distinct pickup_date
+  from {{ ref('int_nyc__trip_days') }}
+  where pickup_date in (
+    {%- for k in range(baseline_weeks) %}
+      {{ dbt.dateadd('day', -7 * k, anchor_expr) }}{{ "," if not loop.last }}
+    {%- endfor %}
+  )
+),
+n_days as (
+  select count(*) as n from baseline_days
 )
 select
-  date_trunc('hour', pickup_at)                         as hour,
-  count(*)                                              as trips,
-  sum(fare_amount)                                      as fare_total,
-  avg(nullif(passenger_count, 0))                       as avg_passenger_count
-from {{ ref('int_nyc__trip_zone') }}, chosen_day
-where date(pickup_at) = chosen_day.d
-group by 1
-order by 1
\ No newline at end of file
+  {{ dbt.dateadd('hour', 'r.pickup_hour', anchor_expr) }} as hour,
+  sum(r.trip_count) * 1.0 / n_days.n                    as trips,
+  sum(r.fare_sum) / n_days.n                            as fare_total,
+  sum(r.passenger_sum) * 1.0 / nullif(sum(r.passenger_nonzero_cnt), 0) as avg_passenger_count
+from {{ ref('int_nyc__trip_hourly_rollup') }} r
+cross join n_days
+-- sargable range on the sort key first, then the exact baseline days
+where r.pickup_hour_at >= {{ dbt.dateadd('day', -7 * (baseline_weeks - 1), anchor_expr) }}
+  and r.pickup_hour_at <  {{ dbt.dateadd('day', 1, anchor_expr) }}
+  {%- if anchor_day %}
+  and r.pickup_month   >= cast('{{ window_start.replace(day=1) }}' as date)
+  {%- endif %}
+  and r.pickup_date in (select pickup_date from baseline_days)
+group by 1, n_days.n
+order by 1
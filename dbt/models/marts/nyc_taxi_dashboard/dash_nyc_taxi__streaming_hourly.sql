@@ -6,5 +6,7 @@ select
   sum(fare_amount)              as fare_total,
   avg(nullif(passenger_count,0)) as avg_passenger_count
 from {{ ref('int_nyc__streaming_enriched') }}
+-- live window; range on the sort key rather than a cast of pickup_at
+where pickup_at >= {{ dbt.dateadd('day', -var('streaming_days_back', 1), 'current_date') }}
 group by 1
 order by 1
@@ -0,0 +1,47 @@
+{{ config(materialized='view', tags=['mart','nyc_taxi','streaming']) }}
+
+-- Per-hop latency percentiles by warehouse arrival hour: one row per (hour, hop).
+-- Hops are the checkpoint deltas of int_nyc__streaming_enriched; end_to_end is producer
+-- send -> Redshift insert.
+
+{%- set hops = [
+  ('producer_to_firehose', 1),
+  ('firehose_to_lambda', 2),
+  ('lambda_to_s3', 3),
+  ('s3_to_redshift', 4),
+  ('end_to_end', 5),
+] %}
+
+with e as (
+  select *
+  from {{ ref('int_nyc__streaming_enriched') }}
+  -- live window; range on the sort key
+  where inserted_at >= {{ dbt.dateadd('day', -var('streaming_days_back', 1), 'current_date') }}
+),
+hops as (
+  {%- for hop, hop_order in hops %}
+  select
+    date_trunc('hour', inserted_at) as hour,
+    '{{ hop }}'                     as hop,
+    {{ hop_order }}                 as hop_order,
+    {{ hop }}_ms                    as latency_ms
+  from e
+  where {{ hop }}_ms is not null
+  {%- if not loop.last %}
+  union all
+  {%- endif %}
+  {%- endfor %}
+)
+
+select
+  hour,
+  hop,
+  hop_order,
+  count(*)                                 as samples,
+  {{ percentile('latency_ms', 0.5) }}  as p50_ms,
+  {{ percentile('latency_ms', 0.9) }}  as p90_ms,
+  {{ percentile('latency_ms', 0.95) }} as p95_ms,
+  {{ percentile('latency_ms', 0.99) }} as p99_ms,
+  max(latency_ms)                          as max_ms
+from hops
+group by 1, 2, 3
@@ -9,6 +9,11 @@ select
   payment_type,
   event_time,
   lambda_received_time,
+  -- per-hop latency checkpoints (infrastructure/redshift/streaming_latency_checkpoints.sql)
+  producer_sent_time,
+  firehose_received_time,
+  lambda_processed_time,
+  s3_written_time,
   inserted_at
 from {{ source('nyc_taxi_stream', 'taxi_streaming_trips') }}
 
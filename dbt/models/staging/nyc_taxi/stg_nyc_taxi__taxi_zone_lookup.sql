@@ -1,6 +1,6 @@
 SELECT
   -- Handle different column names between platforms
-  {% if target.type == 'spark' %}
+  {% if is_lake_target() %}
     locationid AS location_id,  -- Glue has 'locationid'
   {% else %}
     location_id,                -- Snowflake has 'LOCATION_ID'
@@ -8,7 +8,7 @@ SELECT
   borough,
   zone,
   service_zone,
-  {% if target.type != 'spark' %}
+  {% if not is_lake_target() %}
     filename_loaded  -- Only exists in Snowflake/Redshift
   {% else %}
     NULL AS filename_loaded  -- Add as NULL for Spark
@@ -23,8 +23,8 @@ SELECT
   cab_type,
 
   -- Date parts: Use existing columns or calculate them
-  {% if target.type == 'spark' %}
-    -- Glue already has year, month, day columns
+  {% if is_lake_target() %}
+    -- Glue partition columns (cab_type=/year=/month=/day=): filter on these to prune S3 prefixes
     year AS pickup_year,
     month AS pickup_month,
     day AS pickup_day,
@@ -36,7 +36,7 @@ SELECT
   {% endif %}
 
   -- Handle platform-specific columns
-  {% if target.type == 'spark' %}
+  {% if is_lake_target() %}
     NULL AS filename_loaded,      -- Not in Glue table
     NULL AS load_timestamp        -- Not in Glue table
   {% else %}
@@ -45,3 +45,9 @@ SELECT
   {% endif %}
 
 FROM {{ source('nyc_taxi_db', 'trip_data') }}
+-- Month / cab scoping via vars; on Spark/DuckDB this prunes cab_type=/year=/month= prefixes
+WHERE {{ trip_partition_predicate(
+    month_from=var('trip_month_from', none),
+    month_to=var('trip_month_to', none),
+    cab_types=var('cab_types', none)
+) }}
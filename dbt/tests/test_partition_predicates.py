@@ -0,0 +1,78 @@
+"""
+Compile-time check that the trip staging model is partition-aware.
+
+Compiles stg_nyc_taxi__trip_data with month/cab vars against the active profile target
+(DBT_TARGET, default 'spark') and asserts the compiled SQL carries prunable predicates:
+  spark/duckdb -> year/month/cab_type partition columns (lake layout)
+  warehouses   -> half-open pickup_datetime range + cab_type
+
+Run from the dbt project dir (needs dbt-core and a reachable target for compile):
+  DBT_TARGET=spark python -m pytest tests/test_partition_predicates.py -q
+Skipped when dbt, the profile/target or its adapter is unavailable; a compile error fails.
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+
+import pytest
+
+dbt_main = pytest.importorskip("dbt.cli.main")
+from dbt.adapters.exceptions import FailedToConnectError  # noqa: E402
+from dbt.cli.exceptions import DbtUsageException  # noqa: E402
+from dbt.exceptions import DbtProfileError  # noqa: E402
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+TARGET = os.getenv("DBT_TARGET", "spark")
+VARS = {"trip_month_from": "2024-11", "trip_month_to": "2025-02", "cab_types": ["yellow", "green"]}
+
+
+def _target_unavailable(exc):
+    # no profiles.yml / target, adapter plugin not installed, or warehouse unreachable
+    if isinstance(exc, (DbtProfileError, DbtUsageException, FailedToConnectError)):
+        return True
+    return exc is not None and "Could not find adapter type" in str(exc)
+
+
+def _compile(*args):
+    res = dbt_main.dbtRunner().invoke(
+        ["compile", "--project-dir", str(PROJECT_DIR), "--target", TARGET, "--quiet", *args]
+    )
+    if not res.success:
+        if _target_unavailable(res.exception):
+            pytest.skip(f"dbt target {TARGET!r} unavailable: {res.exception}")
+        pytest.fail(f"dbt compile failed for target {TARGET!r}: {res.exception or res.result}")
+    return res.result.results[0].node.compiled_code
+
+
+def _normalize(sql):
+    return re.sub(r"\s+", " ", sql).strip().lower()
+
+
+@pytest.fixture(scope="module")
+def target_type():
+    return _compile("--inline", "select '{{ target.type }}' as t").split("'")[1]
+
+
+@pytest.fixture(scope="module")
+def staging_sql():
+    return _normalize(_compile("-s", "stg_nyc_taxi__trip_data", "--vars", json.dumps(VARS)))
+
+
+def test_cab_type_predicate(staging_sql):
+    assert "cab_type in ('yellow', 'green')" in staging_sql
+
+
+def test_month_range_predicate(staging_sql, target_type):
+    if target_type in ("spark", "duckdb"):
+        assert "(year > 2024 or (year = 2024 and month >= 11))" in staging_sql
+        assert "(year < 2025 or (year = 2025 and month <= 2))" in staging_sql
+    else:
+        assert "pickup_datetime >= cast('2024-11-01' as timestamp)" in staging_sql
+        assert "pickup_datetime < cast('2025-03-01' as timestamp)" in staging_sql
+
+
+def test_no_vars_means_no_scoping():
+    sql = _normalize(_compile("-s", "stg_nyc_taxi__trip_data"))
+    assert sql.endswith("where 1 = 1")
@@ -0,0 +1,31 @@
+-- Latency checkpoints for the streaming path (one column per hop boundary, UTC):
+--   producer_sent_time      streaming_simulator.py, right before put_record
+--   firehose_received_time  Firehose arrival (approximateArrivalTimestamp), set by the cleanse Lambda
+--   lambda_processed_time   cleanse Lambda, when the record is re-encoded
+--   s3_written_time         LastModified of the Firehose parquet object, set by the copy Lambda
+--   inserted_at             Redshift insert (column default)
+--
+-- The Firehose record-format-conversion schema (Glue table) needs the first three columns
+-- appended at the end as well: COPY ... FORMAT AS PARQUET maps parquet columns to the
+-- staging table by position.
+
+-- Step 1: staging table (parquet columns, in Firehose schema order)
+ALTER TABLE public.staging_taxi_streaming_trips ADD COLUMN producer_sent_time TIMESTAMP;
+ALTER TABLE public.staging_taxi_streaming_trips ADD COLUMN firehose_received_time TIMESTAMP;
+ALTER TABLE public.staging_taxi_streaming_trips ADD COLUMN lambda_processed_time TIMESTAMP;
+
+-- Step 2: final table
+ALTER TABLE public.taxi_streaming_trips ADD COLUMN producer_sent_time TIMESTAMP;
+ALTER TABLE public.taxi_streaming_trips ADD COLUMN firehose_received_time TIMESTAMP;
+ALTER TABLE public.taxi_streaming_trips ADD COLUMN lambda_processed_time TIMESTAMP;
+ALTER TABLE public.taxi_streaming_trips ADD COLUMN s3_written_time TIMESTAMP;
+
+-- Step 3: sanity check, per-hop seconds over the last hour
+SELECT
+    COUNT(*) AS trips,
+    AVG(DATEDIFF(ms, producer_sent_time, firehose_received_time)) / 1000.0 AS producer_to_firehose_sec,
+    AVG(DATEDIFF(ms, firehose_received_time, lambda_processed_time)) / 1000.0 AS firehose_to_lambda_sec,
+    AVG(DATEDIFF(ms, lambda_processed_time, s3_written_time)) / 1000.0 AS lambda_to_s3_sec,
+    AVG(DATEDIFF(ms, s3_written_time, inserted_at)) / 1000.0 AS s3_to_redshift_sec
+FROM public.taxi_streaming_trips
+WHERE inserted_at >= DATEADD(hour, -1, GETDATE());
@@ -0,0 +1,218 @@
+"""
+Deferrable EMR step submission for the Airflow DAGs in this folder.
+
+EmrStepsOperator submits one step per month spec onto an existing EMR (EC2) cluster,
+keeping at most `max_active_steps` of them queued/running, and defers to
+EmrStepsTrigger between submissions. The trigger runs in the triggerer's asyncio loop
+(boto3 calls in a thread), so no worker slot is held while steps run.
+
+Per-step metrics (queued_sec, run_sec, state) come from the step timeline; they are
+returned (XCom return_value), logged, and sent to StatsD as emr_step.queued / emr_step.run.
+With metrics_prefix set, each step also writes the job's per-month rows/bytes/duration
+JSON (--metrics_uri) and the operator attaches it with rows_per_sec / bytes_per_sec.
+
+A spec is {cab_type, year, month}, or {cab_type, months: ["YYYY-MM", ...]} for one
+multi-month step.
+"""
+
+import asyncio
+import json
+from datetime import timedelta
+from functools import partial
+
+import boto3
+from botocore.config import Config
+from airflow.exceptions import AirflowException
+from airflow.models import BaseOperator
+from airflow.stats import Stats
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+TERMINAL_STATES = {"COMPLETED", "FAILED", "CANCELLED", "INTERRUPTED"}
+LIST_STEPS_MAX_IDS = 10   # list_steps StepIds filter limit
+
+_BOTO_CONFIG = Config(retries={"max_attempts": 10, "mode": "standard"})
+
+
+def step_name(spec):
+    if spec.get("months"):
+        return f"TripData_{spec['cab_type']}_{spec['months'][0]}_{spec['months'][-1]}"
+    return f"TripData_{spec['cab_type']}_{spec['year']}-{int(spec['month']):02d}"
+
+
+def build_step(spec, script_s3, raw_prefix, dest_prefix, spark_opts, extra_args=None):
+    """EMR step definition for one spec (same args as emr_process_trip_data.py)."""
+    if spec.get("months"):
+        period = ["--months", *spec["months"]]
+    else:
+        period = ["--year", str(spec["year"]), "--month", f"{int(spec['month']):02d}"]
+    if spec.get("metrics_uri"):
+        period += ["--metrics_uri", spec["metrics_uri"]]
+    args = ["spark-submit"] + spark_opts.split() + [
+        script_s3,
+        "--cab_type", spec["cab_type"],
+        *period,
+        "--raw_prefix", raw_prefix,
+        "--dest_prefix", dest_prefix,
+    ] + list(extra_args or [])
+    return {
+        "Name": step_name(spec),
+        "ActionOnFailure": "CONTINUE",
+        "HadoopJarStep": {"Jar": "command-runner.jar", "Args": args},
+    }
+
+
+def step_metrics(step):
+    """State and durations of a list_steps/describe_step entry."""
+    status = step["Status"]
+    timeline = status.get("Timeline", {})
+    created, started, ended = (timeline.get(k) for k in ("CreationDateTime", "StartDateTime", "EndDateTime"))
+    return {
+        "step_id": step["Id"],
+        "name": step.get("Name"),
+        "state": status["State"],
+        "reason": status.get("StateChangeReason", {}).get("Message"),
+        "created_at": created.isoformat() if created else None,
+        "started_at": started.isoformat() if started else None,
+        "ended_at": ended.isoformat() if ended else None,
+        "queued_sec": round((started - created).total_seconds(), 1) if created and started else None,
+        "run_sec": round((ended - started).total_seconds(), 1) if started and ended else None,
+    }
+
+
+def read_job_metrics(uri, region):
+    """The job's --metrics_uri JSON, with step-level throughput totals; None if unavailable."""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    try:
+        body = boto3.client("s3", region_name=region).get_object(Bucket=bucket, Key=key)["Body"].read()
+    except Exception:
+        return None
+    report = json.loads(body)
+    months = report.get("months", [])
+    rows = sum(m["rows"] for m in months)
+    nbytes = sum(m["input_bytes"] for m in months)
+    busy = sum(m["duration_sec"] for m in months) or 1e-3
+    return {**report, "rows": rows, "input_bytes": nbytes,
+            "rows_per_sec": round(rows / busy, 1), "bytes_per_sec": round(nbytes / busy, 1)}
+
+
+class EmrStepsTrigger(BaseTrigger):
+    """Fires as soon as any of `step_ids` reaches a terminal state."""
+
+    def __init__(self, cluster_id, step_ids, region, poll_interval=30):
+        super().__init__()
+        self.cluster_id = cluster_id
+        self.step_ids = list(step_ids)
+        self.region = region
+        self.poll_interval = poll_interval
+
+    def serialize(self):
+        return (
+            f"{self.__class__.__module__}.{self.__class__.__qualname__}",
+            {
+                "cluster_id": self.cluster_id,
+                "step_ids": self.step_ids,
+                "region": self.region,
+                "poll_interval": self.poll_interval,
+            },
+        )
+
+    async def run(self):
+        emr = boto3.client("emr", region_name=self.region, config=_BOTO_CONFIG)
+        loop = asyncio.get_running_loop()
+        while True:
+            steps = []
+            for i in range(0, len(self.step_ids), LIST_STEPS_MAX_IDS):
+                resp = await loop.run_in_executor(None, partial(
+                    emr.list_steps, ClusterId=self.cluster_id, StepIds=self.step_ids[i:i + LIST_STEPS_MAX_IDS]))
+                steps.extend(resp["Steps"])
+            finished = [step_metrics(s) for s in steps if s["Status"]["State"] in TERMINAL_STATES]
+            if finished:
+                done = {m["step_id"] for m in finished}
+                yield TriggerEvent({
+                    "finished": finished,
+                    "running": [sid for sid in self.step_ids if sid not in done],
+                })
+                return
+            self.log.info("Waiting on %d step(s) of %s", len(self.step_ids), self.cluster_id)
+            await asyncio.sleep(self.poll_interval)
+
+
+class EmrStepsOperator(BaseOperator):
+    """
+    Submit `specs` ([{cab_type, year, month}, ...]) as EMR steps, at most
+    `max_active_steps` at a time, deferring while they run. Fails after every step has
+    finished if any of them did not complete; returns the per-step metrics.
+    """
+
+    template_fields = ("specs", "cluster_id", "script_s3", "raw_prefix", "dest_prefix", "spark_opts",
+                       "region", "max_active_steps", "extra_args", "metrics_prefix")
+
+    def __init__(self, *, specs, cluster_id, script_s3, raw_prefix, dest_prefix,
+                 spark_opts="--deploy-mode cluster", extra_args=None, region="us-east-1",
+                 max_active_steps=2, metrics_prefix=None, poll_interval=30,
+                 wait_timeout=timedelta(hours=6), **kwargs):
+        super().__init__(**kwargs)
+        self.specs = specs
+        self.cluster_id = cluster_id
+        self.script_s3 = script_s3
+        self.raw_prefix = raw_prefix
+        self.dest_prefix = dest_prefix
+        self.spark_opts = spark_opts
+        self.extra_args = extra_args
+        self.region = region
+        self.max_active_steps = max_active_steps
+        self.metrics_prefix = metrics_prefix
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+
+    def _submit(self, specs):
+        emr = boto3.client("emr", region_name=self.region, config=_BOTO_CONFIG)
+        if self.metrics_prefix:
+            specs = [{**s, "metrics_uri": f"{self.metrics_prefix.rstrip('/')}/{step_name(s)}.json"} for s in specs]
+        steps = [build_step(s, self.script_s3, self.raw_prefix, self.dest_prefix, self.spark_opts, self.extra_args)
+                 for s in specs]
+        step_ids = emr.add_job_flow_steps(JobFlowId=self.cluster_id, Steps=steps)["StepIds"]
+        for spec, step, step_id in zip(specs, steps, step_ids):
+            self.log.info("Submitted step %s for %s: %s", step_id, spec, json.dumps(step["HadoopJarStep"]["Args"]))
+        return dict(zip(step_ids, specs))
+
+    def _defer_or_finish(self, context, queue, running, results):
+        free = int(self.max_active_steps) - len(running)
+        if queue and free > 0:
+            running = {**running, **self._submit(queue[:free])}
+            queue = queue[free:]
+        if running:
+            self.defer(
+                trigger=EmrStepsTrigger(self.cluster_id, list(running), self.region, self.poll_interval),
+                method_name="execute_complete",
+                kwargs={"queue": queue, "running": running, "results": results},
+                timeout=self.wait_timeout,
+            )
+
+        context["ti"].xcom_push(key="step_metrics", value=results)
+        failed = [r for r in results if r["state"] != "COMPLETED"]
+        if failed:
+            raise AirflowException(
+                f"{len(failed)}/{len(results)} step(s) did not complete: "
+                + ", ".join(f"{r['step_id']} {r['state']} ({r['reason']})" for r in failed))
+        return results
+
+    def execute(self, context):
+        if not self.specs:
+            raise AirflowException("No steps to submit")
+        return self._defer_or_finish(context, list(self.specs), {}, [])
+
+    def execute_complete(self, context, event, queue, running, results):
+        for m in event["finished"]:
+            spec = running.pop(m["step_id"])
+            m = {**spec, **m}
+            if m["state"] == "COMPLETED" and spec.get("metrics_uri"):
+                m["job_metrics"] = read_job_metrics(spec["metrics_uri"], self.region)
+            results.append(m)
+            self.log.info("Step %s %s: queued %ss, ran %ss", m["step_id"], m["state"], m["queued_sec"], m["run_sec"])
+            if m["queued_sec"] is not None:
+                Stats.timing("emr_step.queued", timedelta(seconds=m["queued_sec"]))
+            if m["run_sec"] is not None:
+                Stats.timing("emr_step.run", timedelta(seconds=m["run_sec"]))
+            Stats.incr(f"emr_step.{m['state'].lower()}")
+        return self._defer_or_finish(context, queue, running, results)
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os, json
+import boto3
+from airflow import DAG
+from airflow.models import Variable
+from airflow.operators.python import PythonOperator
+from airflow.exceptions import AirflowException
+
+from emr_deferrable import EmrStepsOperator
+
+# EMR keeps at most 256 PENDING + RUNNING steps per cluster
+EMR_MAX_ACTIVE_STEPS = 256
+# mapped run_steps tasks running at once (the cluster's step concurrency is split between them)
+PARALLEL_BATCHES = int(os.environ.get("ZCU_BACKFILL_PARALLEL_BATCHES", "2"))
+
+# dag_run.conf example:
+# {"start_month": "2024-01", "end_month": "2024-12", "cab_types": ["yellow", "green"],
+#  "mode": "per_month", "batch_size": 6}
+# mode=multi_month submits one step per cab type covering the whole range instead.
+
+
+def _month_range(start, end):
+    y, m = (int(p) for p in start.split("-"))
+    end_y, end_m = (int(p) for p in end.split("-"))
+    months = []
+    while (y, m) <= (end_y, end_m):
+        months.append(f"{y}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def _plan_batches(**context):
+    """One mapped run_steps task per batch: [{"specs": [...], "max_active_steps": n}, ...]."""
+    conf = (context.get("dag_run").conf or {}) if context.get("dag_run") else {}
+    region     = Variable.get("ZCU_REGION", default_var=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
+    cluster_id = conf.get("cluster_id", Variable.get("ZCU_EC2_CLUSTER_ID"))
+
+    try:
+        months = _month_range(conf["start_month"], conf.get("end_month", conf["start_month"]))
+    except (KeyError, ValueError):
+        raise AirflowException("conf needs start_month (and optionally end_month) as YYYY-MM")
+    if not months:
+        raise AirflowException(f"Empty month range {conf['start_month']}..{conf.get('end_month')}")
+    cab_types        = conf.get("cab_types", ["yellow", "green", "fhv"])
+    mode             = conf.get("mode", "per_month")
+    batch_size       = int(conf.get("batch_size", 6))
+
+    if mode == "multi_month":
+        specs = [{"cab_type": cab, "months": months} for cab in cab_types]
+        batch_size = 1
+    elif mode == "per_month":
+        specs = [{"cab_type": cab, "year": ym[:4], "month": ym[5:]} for ym in months for cab in cab_types]
+    else:
+        raise AirflowException(f"Unknown mode {mode!r}; use per_month or multi_month")
+
+    # capacity: the cluster's step concurrency, minus steps already there, shared by the parallel batches
+    emr = boto3.client("emr", region_name=region)
+    step_concurrency = emr.describe_cluster(ClusterId=cluster_id)["Cluster"].get("StepConcurrencyLevel", 1)
+    active = sum(len(p["Steps"]) for p in emr.get_paginator("list_steps").paginate(
+        ClusterId=cluster_id, StepStates=["PENDING", "RUNNING"]))
+    if active >= EMR_MAX_ACTIVE_STEPS:
+        raise AirflowException(f"Cluster {cluster_id} already has {active} pending/running steps")
+    per_batch = max(1, min(step_concurrency - active, EMR_MAX_ACTIVE_STEPS - active) // PARALLEL_BATCHES)
+
+    batches = [
+        {"specs": specs[i:i + batch_size], "max_active_steps": per_batch}
+        for i in range(0, len(specs), batch_size)
+    ]
+    print(f"[plan] {len(specs)} step(s) in {len(batches)} batch(es); step concurrency {step_concurrency}, "
+          f"{active} active, {per_batch} per batch")
+    return batches
+
+
+def _summarize(**context):
+    """Per-step runtime/throughput from the mapped run_steps tasks -> XCom + control table (stage emr_step)."""
+    region = Variable.get("ZCU_REGION", default_var=os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
+    table  = boto3.resource("dynamodb", region_name=region).Table(
+        Variable.get("ZCU_CONTROL_TABLE", default_var="pipeline_execution_control_table"))
+    mode   = ((context.get("dag_run").conf or {}) if context.get("dag_run") else {}).get("mode", "per_month")
+
+    steps = [m for batch in context["ti"].xcom_pull(task_ids="run_steps", key="step_metrics") or [] for m in batch or []]
+    summary = []
+    for m in steps:
+        job = m.get("job_metrics") or {}
+        row = {
+            "step_id": m["step_id"],
+            "name": m["name"],
+            "state": m["state"],
+            "queued_sec": m["queued_sec"],
+            "run_sec": m["run_sec"],
+            "rows": job.get("rows"),
+            "input_bytes": job.get("input_bytes"),
+            "rows_per_sec": job.get("rows_per_sec"),
+            "bytes_per_sec": job.get("bytes_per_sec"),
+        }
+        summary.append(row)
+
+        # one item per month covered by the step, so per-month orchestration decisions can read it
+        per_month = {p["pipeline_id"]: p for p in job.get("months", [])}
+        months = m.get("months") or [f"{m['year']}-{int(m['month']):02d}"]
+        for ym in months:
+            pipeline_id = f"{m['cab_type']}_tripdata_{ym}"
+            details = {k: v for k, v in {**row, **per_month.get(pipeline_id, {}), "mode": mode}.items() if v is not None}
+            table.put_item(Item={
+                "pipeline_id": pipeline_id,
+                "stage": "emr_step",
+                "pipeline_name": "nyc_taxi_batch",
+                "pipeline_type": "batch",
+                "executor": "emr",
+                "status": "SUCCEEDED" if m["state"] == "COMPLETED" else "FAILED",
+                "timestamp": datetime.utcnow().isoformat(),
+                # DynamoDB rejects Python floats
+                "details": json.loads(json.dumps(details), parse_float=Decimal),
+            })
+
+    for row in summary:
+        print(f"[summary] {row['name']:<40} {row['state']:<10} queued={row['queued_sec']}s run={row['run_sec']}s "
+              f"rows/s={row['rows_per_sec']} bytes/s={row['bytes_per_sec']}")
+    failed = [r for r in summary if r["state"] != "COMPLETED"]
+    if failed or not summary:
+        raise AirflowException(f"{len(failed)} of {len(summary)} step(s) did not complete")
+    return summary
+
+
+default_args = {
+    "owner": "zenclarity",
+    "retries": 0,
+}
+
+with DAG(
+    dag_id="emr_ec2_backfill",
+    description="Backfill a month range on the EMR (EC2) cluster: mapped, deferred step batches",
+    start_date=datetime(2024, 1, 1),
+    schedule_interval=None,   # trigger manually with conf
+    catchup=False,
+    default_args=default_args,
+    tags=["zenclarity","emr-ec2","spark","backfill"],
+    render_template_as_native_obj=True,
+) as dag:
+
+    plan_batches = PythonOperator(
+        task_id="plan_batches",
+        python_callable=_plan_batches,
+    )
+
+    # one mapped task per batch; each keeps max_active_steps of its steps on the cluster
+    run_steps = EmrStepsOperator.partial(
+        task_id="run_steps",
+        cluster_id="{{ dag_run.conf.get('cluster_id', var.value.ZCU_EC2_CLUSTER_ID) }}",
+        script_s3="{{ var.value.ZCU_SCRIPT_S3 }}",
+        raw_prefix="{{ dag_run.conf.get('raw_prefix', var.value.ZCU_RAW_PREFIX) }}",
+        dest_prefix="{{ dag_run.conf.get('dest_prefix', var.value.ZCU_DEST_PREFIX) }}",
+        spark_opts="{{ var.value.get('ZCU_SPARK_OPTS', '--deploy-mode cluster') }}",
+        region="{{ var.value.get('ZCU_REGION', 'us-east-1') }}",
+        extra_args=["--control_table", "{{ var.value.get('ZCU_CONTROL_TABLE', 'pipeline_execution_control_table') }}"],
+        metrics_prefix="{{ var.value.get('ZCU_METRICS_PREFIX', 's3://teo-nyc-taxi/logs/emr_metrics') }}/{{ ts_nodash }}",
+        max_active_tis_per_dag=PARALLEL_BATCHES,
+        poll_interval=60,
+        wait_timeout=timedelta(hours=12),
+    ).expand_kwargs(plan_batches.output)
+
+    summarize = PythonOperator(
+        task_id="summarize",
+        python_callable=_summarize,
+        trigger_rule="all_done",   # report failed batches too
+    )
+
+    plan_batches >> run_steps >> summarize
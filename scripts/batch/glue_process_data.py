@@ -1,6 +1,6 @@
 import sys
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import traceback
 import logging
 from pyspark.context import SparkContext
@@ -26,7 +26,8 @@ from pipeline_logger import log_pipeline_stage
 
 
 # ✅ Import after adding the PyFile
-from pipeline_logger import log_pipeline_stage
+from pipeline_logger import log_pipeline_stage, s3_prefix_objects, s3_prefix_stats
+from partition_catalog import written_partitions, write_manifest   # same flat zip
 
 # ✅ Timestamp
 TIMESTAMP = datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')
@@ -60,6 +61,7 @@ log_pipeline_stage(
 # ✅ S3 paths
 RAW_DATA_PATH = f"s3://teo-nyc-taxi/raw/{CAB_TYPE}_tripdata_{YEAR}-{MONTH}.parquet"
 PROCESSED_DATA_PATH = "s3://teo-nyc-taxi/processed/trip_data/"
+CATALOG_DATABASE, CATALOG_TABLE = "teo_nyc_taxi_db", "trip_data"
 
 # ✅ Local + remote log paths (optional)
 LOG_S3_PATH = f"s3://teo-nyc-taxi/logs/{TIMESTAMP}_glue_nyc_taxi_processing.log"
@@ -72,6 +74,17 @@ logging.basicConfig(
     handlers=[logging.FileHandler(LOCAL_LOG_PATH), logging.StreamHandler()]
 )
 logger = logging.getLogger(__name__)
+def glue_executor_info():
+    """Worker type/count of this run (for per-stage metrics); executor count if the run can't be looked up."""
+    try:
+        import boto3
+        opts = getResolvedOptions(sys.argv, ["JOB_NAME", "JOB_RUN_ID"])
+        run = boto3.client("glue").get_job_run(JobName=opts["JOB_NAME"], RunId=opts["JOB_RUN_ID"])["JobRun"]
+        return {"type": "glue", "worker_type": run.get("WorkerType"), "workers": run.get("NumberOfWorkers"),
+                "dpu": run.get("MaxCapacity"), "glue_version": run.get("GlueVersion")}
+    except Exception:
+        return {"type": "glue", "workers": sc._jsc.sc().getExecutorMemoryStatus().size() - 1}
+
 def log_event(level, message, **kwargs):
     logger.log(getattr(logging, level.upper()), {
         "timestamp": datetime.utcnow().isoformat(),
@@ -89,7 +102,8 @@ log_event("INFO", "✅ Glue Spark session started.")
 # ✅ Read raw data
 try:
     df = spark.read.parquet(RAW_DATA_PATH)
-    log_event("INFO", "✅ Loaded raw data", path=RAW_DATA_PATH, count=df.count())
+    rows_in = df.count()
+    log_event("INFO", "✅ Loaded raw data", path=RAW_DATA_PATH, count=rows_in)
 except Exception as e:
     log_pipeline_stage(
         pipeline_id=pipeline_id,
@@ -165,6 +179,7 @@ for colname in ["_metadata", "_spark_metadata"]:
 
 # ✅ Write partitioned output
 try:
+    write_started = datetime.now(timezone.utc)
     df_enriched.repartition(10, "cab_type", "year", "month", "day") \
         .write \
         .option("spark.sql.parquet.compression.codec", "snappy") \
@@ -174,6 +189,33 @@ try:
         .partitionBy("cab_type", "year", "month", "day") \
         .parquet(PROCESSED_DATA_PATH)
 
+    # ✅ Stage metrics (files of this month's partitions written by this run); rows_out comes from
+    # the Parquet footers of those files, not from re-running the whole job with df_enriched.count()
+    written = s3_prefix_objects(
+        f"{PROCESSED_DATA_PATH}cab_type={CAB_TYPE}/year={int(YEAR)}/month={int(MONTH)}/", since=write_started)
+    output_bytes, files_written = sum(size for _, size in written), len(written)
+    written_files = [uri for uri, _ in written if uri.endswith(".parquet")]
+    rows_out = spark.read.parquet(*written_files).count() if written_files else 0
+    metrics = {
+        "duration_sec": round(time.time() - start_time, 1),
+        "input_bytes": s3_prefix_stats(RAW_DATA_PATH)[0],
+        "output_bytes": output_bytes,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "files_written": files_written,
+        "executor": glue_executor_info(),
+    }
+
+    # ✅ Partition manifest: exactly the cab_type/year/month/day partitions this run wrote,
+    # registered by the catalog Lambda instead of MSCK REPAIR over the whole prefix
+    try:
+        partitions = written_partitions(PROCESSED_DATA_PATH, since=write_started,
+                                        cab_type=CAB_TYPE, year=YEAR, month=MONTH)
+        manifest = write_manifest(pipeline_id, CATALOG_DATABASE, CATALOG_TABLE, PROCESSED_DATA_PATH, partitions)
+    except Exception as e:
+        log_event("WARNING", "⚠️ Partition manifest not written; catalog update falls back to MSCK", error=str(e))
+        manifest = None
+
     log_pipeline_stage(
         pipeline_id=pipeline_id,
         stage="transform",
@@ -182,9 +224,14 @@ try:
         executor="glue",
         status="SUCCEEDED",
         timestamp=datetime.utcnow().isoformat(),
-        record_count=df_enriched.count(),
+        record_count=rows_out,
         s3_output=PROCESSED_DATA_PATH,
-        details={"partition_by": ["cab_type", "year", "month", "day"]}
+        details={
+            "partition_by": ["cab_type", "year", "month", "day"],
+            "duration_sec": int(round(metrics["duration_sec"])),  # orchestration_router history
+            "partition_manifest": manifest,
+        },
+        metrics=metrics
     )
 except Exception as e:
     log_pipeline_stage(
@@ -1,7 +1,11 @@
 import boto3
 import time
 
+from lambda_log import get_logger
+from pipeline_logger import StageTimer, flush, s3_prefix_stats
+
 redshift = boto3.client('redshift-data')
+LOG = get_logger("redshift_monthly_copy")
 
 def execute_sql(secret_arn, workgroup, database, sql):
     resp = redshift.execute_statement(
@@ -26,6 +30,11 @@ def wait_for_completion(statement_id):
             break
         time.sleep(1)
 
+def statement_stats(statement_id):
+    """(duration_sec, rows affected) of a finished statement."""
+    response = redshift.describe_statement(Id=statement_id)
+    return response.get("Duration", 0) / 1e9, response.get("ResultRows", -1)
+
 def build_insert_sql(cab_type, staging_table, final_table):
     base_columns = [
         "vendorid", "pickup_datetime", "dropoff_datetime", "store_and_fwd_flag", "ratecodeid",
@@ -74,34 +83,54 @@ def get_row_count(secret_arn, workgroup, database, table_name):
 def run_copy_pipeline(cab_type, secret_arn, workgroup, database, s3_path, pipeline_id):
     staging_table = f"public.{cab_type}_trip_data_staging"
     final_table = "public.taxi_trip_data"
-
-    print(f"🧹 Truncating staging table: {staging_table}")
-    execute_sql(secret_arn, workgroup, database, f"TRUNCATE TABLE {staging_table};")
-
-    copy_sql = f"""
-        COPY {staging_table}
-        FROM '{s3_path}'
-        IAM_ROLE 'arn:aws:iam::667137120741:role/teo_redshift_service_role'
-        FORMAT AS PARQUET;
-    """
-    print("📄 COPY SQL:\n", copy_sql)
-    execute_sql(secret_arn, workgroup, database, copy_sql)
-
-    staging_count = get_row_count(secret_arn, workgroup, database, staging_table)
-    print(f"🧮 Rows in staging after COPY: {staging_count}")
-
-    if staging_count == 0:
-        raise Exception("🚫 No records found in staging table after COPY.")
-
-    insert_sql = build_insert_sql(cab_type, staging_table, final_table)
-    print("📥 Running INSERT into final table...")
-    print("🧾 INSERT SQL:\n", insert_sql)
-    execute_sql(secret_arn, workgroup, database, insert_sql)
-
-    final_count = get_row_count(secret_arn, workgroup, database, final_table)
-    print(f"✅ Final table row count: {final_count}")
+    log = LOG.bind(pipeline_id=pipeline_id)
+
+    # ✅ Logged as stage "redshift_load" with COPY/INSERT timings and row counts; the stage item is
+    # buffered, so it is written before returning (or raising) while the Lambda is still running
+    try:
+        with StageTimer(pipeline_id, "redshift_load", "nyc_taxi_batch", "batch", "lambda", log_start=False,
+                        s3_input=s3_path, db_table=final_table) as timer:
+            log.info("truncating staging table", table=staging_table)
+            execute_sql(secret_arn, workgroup, database, f"TRUNCATE TABLE {staging_table};")
+
+            copy_sql = f"""
+                COPY {staging_table}
+                FROM '{s3_path}'
+                IAM_ROLE 'arn:aws:iam::667137120741:role/teo_redshift_service_role'
+                FORMAT AS PARQUET;
+            """
+            log.debug("COPY", sql=copy_sql)
+            copy_sec, _ = statement_stats(execute_sql(secret_arn, workgroup, database, copy_sql))
+
+            staging_count = get_row_count(secret_arn, workgroup, database, staging_table)
+            log.info("COPY finished", staging_rows=staging_count, copy_sec=round(copy_sec, 3))
+
+            if staging_count == 0:
+                raise Exception("🚫 No records found in staging table after COPY.")
+
+            insert_sql = build_insert_sql(cab_type, staging_table, final_table)
+            log.debug("INSERT", sql=insert_sql)
+            insert_sec, inserted = statement_stats(execute_sql(secret_arn, workgroup, database, insert_sql))
+
+            final_count = get_row_count(secret_arn, workgroup, database, final_table)
+            log.info("INSERT finished", inserted_rows=inserted, final_rows=final_count, insert_sec=round(insert_sec, 3))
+
+            input_bytes, input_files = s3_prefix_stats(s3_path)
+            timer.metrics.update(
+                input_bytes=input_bytes,
+                rows_in=staging_count,
+                rows_out=inserted,
+                executor={"type": "redshift", "workgroup": workgroup},
+            )
+            timer.details.update(copy_sec=copy_sec, insert_sec=insert_sec, input_files=input_files)
+
+    finally:
+        flush()
 
     return {
         "staging_rows": staging_count,
-        "final_row_count": final_count
+        "final_row_count": final_count,
+        "inserted_rows": inserted,
+        "copy_sec": round(copy_sec, 3),
+        "insert_sec": round(insert_sec, 3),
     }
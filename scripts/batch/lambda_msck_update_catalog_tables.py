@@ -1,33 +1,42 @@
-import boto3
-import json
+import time
 import traceback
 from datetime import datetime
 import os
 
-from pipeline_logger import log_pipeline_stage  # ensure this is part of Lambda ZIP
+from botocore.exceptions import ClientError
 
-athena_client = boto3.client('athena')
+from lambda_log import get_logger
+from pipeline_logger import flush_on_return, log_pipeline_stage  # ensure this is part of Lambda ZIP
+from partition_catalog import manifest_uri, msck_repair, read_manifest, register_partitions
 
 DATABASE_NAME = "teo_nyc_taxi_db"
 TABLES = ["trip_data"]
-ATHENA_OUTPUT = "s3://teo-nyc-taxi/Athena/output_result/"
 
-def run_query(query):
-    response = athena_client.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={'Database': DATABASE_NAME},
-        ResultConfiguration={'OutputLocation': ATHENA_OUTPUT}
-    )
-    return response['QueryExecutionId']
+# glue (batch_create_partition) | athena (ALTER TABLE ADD IF NOT EXISTS PARTITION)
+REGISTER_METHOD = os.environ.get("CATALOG_UPDATE_METHOD", "glue")
 
-def lambda_handler(event, context):
-    print("✅ Event received:")
-    print(json.dumps(event, indent=2))
+LOG = get_logger("catalog_update")
+
+def load_manifest(event, pipeline_id):
+    """Partition manifest written by the batch job, or None (-> MSCK fallback)."""
+    uri = event.get("partition_manifest") or manifest_uri(pipeline_id)
+    try:
+        return uri, read_manifest(uri)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            LOG.warning("no partition manifest", manifest=uri, pipeline_id=pipeline_id)
+            return uri, None
+        raise
 
+@flush_on_return
+def lambda_handler(event, context):
     pipeline_id = event.get("pipeline_id", f"catalog_refresh_{datetime.utcnow().strftime('%Y-%m-%d')}")
+    log = LOG.bind(request_id=getattr(context, "aws_request_id", None), pipeline_id=pipeline_id)
+    log.debug("event", event=event)
     timestamp = datetime.utcnow().isoformat()
+    started = time.perf_counter()
 
-    # ✅ Log start
+    # ✅ Log start (stage name kept from the MSCK version; details.method tells which path ran)
     log_pipeline_stage(
         pipeline_id=pipeline_id,
         stage="msck_repair",
@@ -40,13 +49,23 @@ def lambda_handler(event, context):
     )
 
     try:
-        query_ids = []
-        for table in TABLES:
-            query = f"MSCK REPAIR TABLE {DATABASE_NAME}.{table};"
-            print(f"🛠 Running: {query}")
-            query_id = run_query(query)
-            print(f"✅ QueryExecutionId: {query_id}")
-            query_ids.append({table: query_id})
+        uri, manifest = load_manifest(event, pipeline_id)
+        if manifest is not None:
+            # ✅ Register only the partitions the job wrote
+            log.info("registering partitions", partitions=len(manifest["partitions"]),
+                     table=f"{manifest['database']}.{manifest['table']}", method=REGISTER_METHOD)
+            results = [register_partitions(manifest["database"], manifest["table"], manifest["partitions"],
+                                           method=REGISTER_METHOD)]
+            details = {"method": REGISTER_METHOD, "partition_manifest": uri, **{
+                k: v for k, v in results[0].items() if k in ("created", "already_existed", "query_ids")}}
+        else:
+            # ✅ No manifest (older job / manual run): full MSCK REPAIR, waiting for it
+            results = []
+            for table in TABLES:
+                log.info("running MSCK REPAIR TABLE", table=f"{DATABASE_NAME}.{table}")
+                results.append(msck_repair(DATABASE_NAME, table))
+            details = {"method": "msck", "query_ids": [q for r in results for q in r["query_ids"]]}
+        log.info("catalog updated", results=results)
 
         log_pipeline_stage(
             pipeline_id=pipeline_id,
@@ -56,12 +75,19 @@ def lambda_handler(event, context):
             executor="lambda",
             status="SUCCEEDED",
             timestamp=datetime.utcnow().isoformat(),
-            details={"query_ids": query_ids}
+            details=details,
+            metrics={
+                "duration_sec": round(time.perf_counter() - started, 3),
+                "rows_out": sum(r.get("partitions", 0) for r in results),   # partitions registered
+                "executor": {"type": "glue" if details["method"] == "glue" else "athena",
+                             "queries": len(details.get("query_ids", []))},
+            }
         )
 
-        return {"status": "MSCK repair successful", "queries": query_ids}
+        return {"status": "Catalog update successful", **details}
 
     except Exception as e:
+        log.error("catalog update failed", error=str(e))
         log_pipeline_stage(
             pipeline_id=pipeline_id,
             stage="msck_repair",
@@ -70,6 +96,7 @@ def lambda_handler(event, context):
             executor="lambda",
             status="FAILED",
             timestamp=datetime.utcnow().isoformat(),
-            details={"error": str(e), "trace": traceback.format_exc()}
+            details={"error": str(e), "trace": traceback.format_exc()},
+            metrics={"duration_sec": round(time.perf_counter() - started, 3), "executor": {"type": "athena"}}
         )
         raise
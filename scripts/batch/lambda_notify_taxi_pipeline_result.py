@@ -2,7 +2,10 @@ import os
 import json
 import boto3
 
+from lambda_log import get_logger  # pipeline logger layer
+
 sns = boto3.client("sns")
+log = get_logger("notify_pipeline_result")
 
 # Get the SNS topic from environment variable
 TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")
@@ -38,8 +41,8 @@ Status     : {status}
             Subject=subject,
             Message=message
         )
-        print(f"✅ Notification sent to {TOPIC_ARN}")
+        log.info("notification sent", topic=TOPIC_ARN, pipeline_id=pipeline_id, status=status)
         return {"message": "Notification sent", "status": status}
     except Exception as e:
-        print(f"❌ Failed to send SNS notification: {str(e)}")
+        log.error("failed to send SNS notification", pipeline_id=pipeline_id, error=str(e))
         return {"error": str(e)}
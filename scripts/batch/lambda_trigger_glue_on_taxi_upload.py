@@ -1,28 +1,204 @@
+import hashlib
 import json
 import re
+import time
 from datetime import datetime
 import boto3
 import os
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
 
-from pipeline_logger import log_pipeline_stage
+from lambda_log import BatchSummary, get_logger
+from pipeline_logger import DYNAMO_TABLE, flush_on_return, log_pipeline_stage
+from orchestration_router import choose_engine, log_decision
 
-# Step Functions client
+# Step Functions / EMR clients
 sfn = boto3.client("stepfunctions")
+emr = boto3.client("emr")
+dynamodb = boto3.resource("dynamodb")
+
+LOG = get_logger("trigger_glue_on_upload")
 
 # Step Function ARN (replace with your actual one!)
 STATE_MACHINE_ARN = "arn:aws:states:us-east-1:667137120741:stateMachine:step_function_nyc_taxi_monthly_batch"
+
+# EMR path (opt-in, ROUTER_ENABLE_EMR=true or ORCHESTRATION_ENGINE=emr): step on the long-running
+# EC2 cluster, same job as the Airflow DAG. It writes the test table (nyc_taxi_db.emr_trip_data
+# under EMR_DEST_PREFIX) and none of the state machine's downstream stages (catalog update,
+# Redshift COPY, notify) run for it; register its partitions with
+# `python partition_catalog.py register <manifest>` from the manifest it writes.
+EMR_CLUSTER_ID = os.environ.get("EMR_CLUSTER_ID")
+EMR_SCRIPT_S3 = os.environ.get("EMR_SCRIPT_S3", "s3://teo-nyc-taxi/scripts/emr-jobs/emr_process_trip_data.py")
+EMR_RAW_PREFIX = os.environ.get("EMR_RAW_PREFIX", "s3://teo-nyc-taxi/raw/")
+EMR_DEST_PREFIX = os.environ.get("EMR_DEST_PREFIX", "s3://teo-nyc-taxi/processed/emr/trip_data/")
+CONTROL_TABLE = os.environ.get("CONTROL_TABLE", "pipeline_execution_control_table")
+MANIFEST_PREFIX = os.environ.get("PARTITION_MANIFEST_PREFIX", "s3://teo-nyc-taxi/manifests/partitions/")
+
+# Coalescing: every record of the event (S3 notification, or SQS with a batching window
+# in front of it) is deduplicated and the Glue months go out as batched executions.
+# Default 1 = the per-file input the deployed state machine reads; raise it only once the
+# state machine maps over "items" (see glue_batch_input)
+MAX_BATCH_MONTHS = int(os.environ.get("TRIGGER_MAX_BATCH_MONTHS", "1"))     # months per execution
+MAX_RUNNING_EXECUTIONS = int(os.environ.get("MAX_RUNNING_EXECUTIONS", "3"))  # running executions cap
+DEDUPE_WINDOW_SEC = int(os.environ.get("TRIGGER_DEDUPE_SEC", "900"))        # re-uploads within this are skipped
+
+RAW_KEY_PATTERN = re.compile(r"^raw/(yellow|green|fhv)_tripdata_(\d{4})-(\d{2})\.parquet$")
+
+
+def route_upload(bucket, object_key, cab_type, pipeline_id):
+    """Glue or EMR for this file; falls back to the Glue Step Function if routing fails."""
+    try:
+        decision = choose_engine(bucket, object_key, cab_type)
+    except Exception as e:
+        LOG.warning("routing failed, defaulting to Glue", pipeline_id=pipeline_id, error=str(e))
+        return {"engine": "glue", "reason": f"routing error: {e}"}
+    if decision["engine"] == "emr" and not EMR_CLUSTER_ID:
+        decision = {**decision, "engine": "glue", "reason": "EMR_CLUSTER_ID not set"}
+    LOG.info("route", pipeline_id=pipeline_id, **decision)
+    log_decision(pipeline_id, decision, s3_input=f"s3://{bucket}/{object_key}")
+    return decision
+
+
+def start_emr_step(cab_type, year, month, pipeline_id, executors):
+    args = [
+        "spark-submit", "--deploy-mode", "cluster",
+        "--conf", f"spark.executor.instances={executors}",
+        "--conf", "spark.executor.memory=2g",
+        "--conf", "spark.executor.cores=1",
+        EMR_SCRIPT_S3,
+        "--cab_type", cab_type,
+        "--year", year,
+        "--month", str(int(month)),
+        "--raw_prefix", EMR_RAW_PREFIX,
+        "--dest_prefix", EMR_DEST_PREFIX,
+        "--pipeline_id", pipeline_id,
+        "--control_table", CONTROL_TABLE,
+        "--manifest_prefix", MANIFEST_PREFIX,
+    ]
+    resp = emr.add_job_flow_steps(
+        JobFlowId=EMR_CLUSTER_ID,
+        Steps=[{
+            "Name": f"TripData_{cab_type}_{year}-{month}",
+            "ActionOnFailure": "CONTINUE",
+            "HadoopJarStep": {"Jar": "command-runner.jar", "Args": args},
+        }],
+    )
+    return resp["StepIds"][0]
+
+
+# ----------------------------------------------
+# Coalescing helpers
+# ----------------------------------------------
+def iter_s3_records(event):
+    """(sqs_message_id, s3_record) for direct S3 notifications and SQS-wrapped ones."""
+    for record in event.get("Records", []):
+        if record.get("eventSource") == "aws:sqs":
+            body = json.loads(record["body"])
+            for s3_record in body.get("Records", []):   # s3:TestEvent has no Records
+                yield record["messageId"], s3_record
+        elif "s3" in record:
+            yield None, record
+
+
+def claim_pipeline(pipeline_id, batch_id, etag):
+    """Conditional put of stage 'dispatch': False if this pipeline_id was dispatched within the window."""
+    now = int(time.time())
+    try:
+        dynamodb.Table(DYNAMO_TABLE).put_item(
+            Item={
+                "pipeline_id": pipeline_id,
+                "stage": "dispatch",
+                "pipeline_name": "nyc_taxi_batch",
+                "pipeline_type": "batch",
+                "executor": "lambda",
+                "status": "STARTED",
+                "timestamp": datetime.utcnow().isoformat(),
+                "dispatched_epoch": now,
+                "details": {"batch_id": batch_id, "etag": etag},
+            },
+            ConditionExpression=Attr("pipeline_id").not_exists() | Attr("dispatched_epoch").lt(now - DEDUPE_WINDOW_SEC),
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def release_pipeline(pipeline_id, batch_id):
+    """Undo a claim whose dispatch failed, so a retry is not treated as a duplicate."""
+    try:
+        dynamodb.Table(DYNAMO_TABLE).delete_item(
+            Key={"pipeline_id": pipeline_id, "stage": "dispatch"},
+            ConditionExpression=Attr("details.batch_id").eq(batch_id),
+        )
+    except ClientError as e:
+        LOG.warning("could not release dispatch claim", pipeline_id=pipeline_id, error=str(e))
+
+
+def running_executions(limit):
+    """RUNNING executions of the state machine, counted up to `limit`."""
+    count = 0
+    for page in sfn.get_paginator("list_executions").paginate(stateMachineArn=STATE_MACHINE_ARN, statusFilter="RUNNING"):
+        count += len(page["executions"])
+        if count >= limit:
+            break
+    return count
+
+
+def glue_batch_input(batch_id, items):
+    """
+    One execution for several months: the state machine maps over "items" (one
+    glue:startJobRun each). A single-month batch also carries the flat fields the
+    per-file input always had.
+
+    Only single-month inputs have a top-level pipeline_id / cab_type / year / month, so
+    before TRIGGER_MAX_BATCH_MONTHS goes above 1 the per-month states (Glue job, catalog
+    update, Redshift COPY, notify) must run inside a Map over the items, each iteration
+    reading its own fields:
+
+        "ProcessMonths": {
+          "Type": "Map", "ItemsPath": "$.items", "MaxConcurrency": 4,
+          "ItemProcessor": {"StartAt": "StartGlueJob", "States": { ...existing per-month states... }},
+          "ResultPath": null, "End": true
+        }
+
+    with StartGlueJob passing "--pipeline_id.$": "$.pipeline_id" (and NumberOfWorkers.$ /
+    WorkerType.$ from glue_number_of_workers / glue_worker_type when present).
+    """
+    sfn_input = {"batch_id": batch_id, "items": items}
+    if len(items) == 1:
+        sfn_input.update(items[0])
+    return sfn_input
+
+
+def log_dispatch_failure(pipeline_id, engine, error):
+    log_pipeline_stage(
+        pipeline_id=pipeline_id,
+        stage="step_function_start" if engine == "glue" else "emr_step_start",
+        pipeline_name="nyc_taxi_batch",
+        pipeline_type="batch",
+        executor="lambda",
+        status="FAILED",
+        timestamp=datetime.utcnow().isoformat(),
+        details={"error": str(error)}
+    )
+
+@flush_on_return
 def lambda_handler(event, context):
-    print("🚀 Event Received:", json.dumps(event))
+    log = LOG.bind(request_id=getattr(context, "aws_request_id", None))
+    log.info("event received", records=len(event.get("Records", [])))
+    log.debug("event", event=event)
+    summary = BatchSummary(log, "dispatch")
 
-    for record in event["Records"]:
+    # ✅ Collect every record; the latest upload of a pipeline_id wins within the event
+    uploads, invalid, messages = {}, [], {}
+    for message_id, record in iter_s3_records(event):
         bucket = record["s3"]["bucket"]["name"]
         object_key = record["s3"]["object"]["key"]
-        print(f"📦 Object Key: {object_key}")
-
-        # Match expected pattern
-        pattern = r"^raw/(yellow|green|fhv)_tripdata_(\d{4})-(\d{2})\.parquet$"
-        match = re.match(pattern, object_key)
+        log.debug("object", bucket=bucket, key=object_key)
 
+        match = RAW_KEY_PATTERN.match(object_key)
         if not match:
             log_pipeline_stage(
                 pipeline_id="invalid_filename_" + object_key,
@@ -35,11 +211,62 @@ def lambda_handler(event, context):
                 s3_input=f"s3://{bucket}/{object_key}",
                 details={"error": "Invalid file name pattern"}
             )
+            invalid.append(object_key)
+            summary.failed("invalid_filename", key=object_key)
             continue
 
         cab_type, year, month = match.groups()
         pipeline_id = f"{cab_type}_tripdata_{year}-{month}"
-        timestamp = datetime.utcnow().isoformat()
+        uploads[pipeline_id] = {
+            "bucket": bucket,
+            "object_key": object_key,
+            "etag": record["s3"]["object"].get("eTag", ""),
+            "cab_type": cab_type,
+            "year": year,
+            "month": month,
+        }
+        if message_id:
+            messages.setdefault(pipeline_id, set()).add(message_id)
+
+    if not uploads:
+        log_pipeline_stage(
+            pipeline_id="unrecognized_event",
+            stage="transform_start",
+            pipeline_name="nyc_taxi_batch",
+            pipeline_type="batch",
+            executor="lambda",
+            status="FAILED",
+            timestamp=datetime.utcnow().isoformat(),
+            details={"error": "No valid tripdata files in event", "event": json.dumps(event)}
+        )
+        summary.emit()
+        return {"error": "No valid records found", "invalid": invalid}
+
+    from_sqs = bool(messages)
+    batch_id = "batch_{}_{}".format(
+        datetime.utcnow().strftime("%Y%m%dT%H%M%S"),
+        hashlib.sha1(",".join(sorted(uploads)).encode()).hexdigest()[:8],
+    )
+
+    # ✅ Concurrency cap: with SQS, leave the messages on the queue for a later invocation
+    running = running_executions(MAX_RUNNING_EXECUTIONS)
+    if running >= MAX_RUNNING_EXECUTIONS:
+        log.warning("concurrency cap reached; deferring", running_cap=MAX_RUNNING_EXECUTIONS,
+                    uploads=sorted(uploads))
+        if from_sqs:
+            deferred = sorted({m for ids in messages.values() for m in ids})
+            return {"batchItemFailures": [{"itemIdentifier": m} for m in deferred], "deferred": sorted(uploads)}
+        raise RuntimeError(f"Concurrency cap reached ({MAX_RUNNING_EXECUTIONS} running executions)")
+
+    # ✅ Deduplicate across invocations (repeated uploads / redelivered messages)
+    dispatched, duplicates, failed = [], [], []
+    glue_items = []
+    for pipeline_id, upload in sorted(uploads.items()):
+        if not claim_pipeline(pipeline_id, batch_id, upload["etag"]):
+            log.info("already dispatched; skipping", pipeline_id=pipeline_id, window_sec=DEDUPE_WINDOW_SEC)
+            duplicates.append(pipeline_id)
+            summary.count("duplicate")
+            continue
 
         # ✅ Log transform start
         log_pipeline_stage(
@@ -49,53 +276,85 @@ def lambda_handler(event, context):
             pipeline_type="batch",
             executor="lambda",
             status="STARTED",
-            timestamp=timestamp,
-            s3_input=f"s3://{bucket}/{object_key}",
-            details={"trigger": "s3_put_event"}
+            timestamp=datetime.utcnow().isoformat(),
+            s3_input=f"s3://{upload['bucket']}/{upload['object_key']}",
+            details={"trigger": "sqs_batch" if from_sqs else "s3_put_event", "batch_id": batch_id}
         )
 
-        # ✅ Trigger Step Function
+        # ✅ Pick Glue or EMR (size + history); EMR steps queue on the cluster, one per month
+        decision = route_upload(upload["bucket"], upload["object_key"], upload["cab_type"], pipeline_id)
+        if decision["engine"] == "emr":
+            try:
+                step_id = start_emr_step(upload["cab_type"], upload["year"], upload["month"], pipeline_id, decision["workers"])
+                log.info("EMR step submitted", pipeline_id=pipeline_id, step_id=step_id)
+                dispatched.append({"pipeline_id": pipeline_id, "engine": "emr"})
+                summary.count("emr")
+            except Exception as e:
+                summary.failed("emr_start", pipeline_id=pipeline_id, error=str(e))
+                release_pipeline(pipeline_id, batch_id)
+                log_dispatch_failure(pipeline_id, "emr", e)
+                failed.append(pipeline_id)
+            continue
+
+        item = {
+            "cab_type": upload["cab_type"],
+            "year": upload["year"],
+            "month": upload["month"],
+            "pipeline_id": pipeline_id
+        }
+        if "workers" in decision:
+            # state machine passes these to glue:startJobRun (NumberOfWorkers / WorkerType)
+            item.update({"glue_worker_type": "G.1X", "glue_number_of_workers": decision["workers"]})
+        glue_items.append(item)
+
+    # ✅ Glue months: one batched execution per MAX_BATCH_MONTHS, counted against the cap;
+    # chunks past it are released and deferred to a later invocation
+    deferred = []
+    for i in range(0, len(glue_items), MAX_BATCH_MONTHS):
+        chunk = glue_items[i:i + MAX_BATCH_MONTHS]
+        name = batch_id if i == 0 else f"{batch_id}_{i // MAX_BATCH_MONTHS}"
+        if running >= MAX_RUNNING_EXECUTIONS:
+            for it in chunk:
+                release_pipeline(it["pipeline_id"], batch_id)
+                deferred.append(it["pipeline_id"])
+            summary.count("deferred", len(chunk))
+            continue
         try:
             response = sfn.start_execution(
                 stateMachineArn=STATE_MACHINE_ARN,
-                input=json.dumps({
-                    "cab_type": cab_type,
-                    "year": year,
-                    "month": month,
-                    "pipeline_id": pipeline_id
-                })
+                name=name,
+                input=json.dumps(glue_batch_input(name, chunk))
             )
-            print(f"✅ Step Function started: {response['executionArn']}")
+            running += 1
+            log.info("Step Function started", execution_arn=response["executionArn"], months=len(chunk))
+            dispatched.extend({"pipeline_id": it["pipeline_id"], "engine": "glue", "batch_id": name} for it in chunk)
+            summary.count("glue", len(chunk))
         except Exception as e:
-            print(f"❌ Failed to start Step Function: {e}")
-            log_pipeline_stage(
-                pipeline_id=pipeline_id,
-                stage="step_function_start",
-                pipeline_name="nyc_taxi_batch",
-                pipeline_type="batch",
-                executor="lambda",
-                status="FAILED",
-                timestamp=datetime.utcnow().isoformat(),
-                details={"error": str(e)}
-            )
-            raise
+            for it in chunk:
+                summary.failed("glue_start", pipeline_id=it["pipeline_id"], error=str(e))
+                release_pipeline(it["pipeline_id"], batch_id)
+                log_dispatch_failure(it["pipeline_id"], "glue", e)
+                failed.append(it["pipeline_id"])
 
-        return {
-            "cab_type": cab_type,
-            "year": year,
-            "month": month,
-            "pipeline_id": pipeline_id
-        }
-
-    log_pipeline_stage(
-        pipeline_id="unrecognized_event",
-        stage="transform_start",
-        pipeline_name="nyc_taxi_batch",
-        pipeline_type="batch",
-        executor="lambda",
-        status="FAILED",
-        timestamp=datetime.utcnow().isoformat(),
-        details={"error": "No valid tripdata files in event", "event": json.dumps(event)}
-    )
+    summary.emit(batch_id=batch_id)
+    if deferred:
+        log.warning("concurrency cap reached; deferring", running_cap=MAX_RUNNING_EXECUTIONS, uploads=deferred)
+    if failed and not from_sqs:
+        raise RuntimeError(f"Failed to dispatch: {', '.join(failed)}")
+    if deferred and not from_sqs:
+        raise RuntimeError(f"Concurrency cap reached ({MAX_RUNNING_EXECUTIONS} running executions); "
+                           f"deferred: {', '.join(deferred)}")
 
-    return {"error": "No valid records found"}
+    result = {
+        "batch_id": batch_id,
+        "dispatched": dispatched,
+        "duplicates": duplicates,
+        "deferred": deferred,
+        "invalid": invalid,
+    }
+    if from_sqs:
+        # requires ReportBatchItemFailures on the event source mapping
+        result["batchItemFailures"] = [
+            {"itemIdentifier": m} for m in sorted({m for pid in failed + deferred for m in messages.get(pid, ())})
+        ]
+    return result
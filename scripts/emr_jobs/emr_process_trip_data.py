@@ -4,6 +4,7 @@ EMR PySpark job — process trip data (base stage, no zone joins)
 
 Mirrors the Glue job behavior with 3 cab types (yellow/green/fhv):
 - Reads a single month from S3 raw: {cab_type}_tripdata_{YEAR}-{MM}.parquet
+  (or several months in one step with --months YYYY-MM ..., processed one after another)
 - Normalizes pickup/dropoff timestamp column names by cab type
 - Adds missing columns for FHV to keep a stable schema
 - Filters to the requested YEAR/MONTH
@@ -16,6 +17,10 @@ Example (EMR step):
     --cab_type yellow --year 2024 --month 1 \
     --raw_prefix s3://teo-nyc-taxi/raw/ \
     --dest_prefix s3://teo-nyc-taxi/processed/emr/trip_data/
+
+  Backfill (one step, several months, per-month metrics JSON for the Airflow DAG):
+    ... --cab_type yellow --months 2024-01 2024-02 2024-03 \
+    --metrics_uri s3://teo-nyc-taxi/logs/emr_metrics/<run>/yellow.json --control_table pipeline_execution_control_table
 Version: 1 -
     --Add AQE V1 optimizations
     --Removing df.repartition(...)
@@ -24,6 +29,8 @@ Version: 1 -
 """
 
 import argparse
+import json
+import re
 from pyspark.sql import SparkSession, functions as F, types as T
 import time
 
@@ -31,13 +38,37 @@ import time
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--cab_type", required=True, choices=["yellow", "green", "fhv"])
-    ap.add_argument("--year", required=True, type=int)
-    ap.add_argument("--month", required=True, type=int)
+    ap.add_argument("--year", type=int)
+    ap.add_argument("--month", type=int)
+    ap.add_argument("--months", nargs="+", default=None, help="YYYY-MM ... (instead of --year/--month)")
     ap.add_argument("--raw_prefix", default="s3://teo-nyc-taxi/raw/")
     ap.add_argument("--dest_prefix", default="s3://teo-nyc-taxi/processed/emr/trip_data/")
     ap.add_argument("--coalesce", type=int, default=10)
+    # optional: record the run in the pipeline control table (orchestration_router history)
+    ap.add_argument("--pipeline_id", default=None)
+    ap.add_argument("--control_table", default=None)
+    # optional: per-month rows/bytes/duration as JSON (s3:// or local path)
+    ap.add_argument("--metrics_uri", default=None)
+    # optional: partition manifest per month (<prefix>/<pipeline_id>.json, see partition_catalog.py)
+    ap.add_argument("--manifest_prefix", default=None)
+    ap.add_argument("--catalog_database", default="nyc_taxi_db")
+    ap.add_argument("--catalog_table", default="emr_trip_data")
     return ap.parse_args()
 
+
+def months_to_process(args):
+    """[(year, month), ...] from --months or --year/--month."""
+    if args.months:
+        periods = [tuple(int(p) for p in ym.split("-")) for ym in args.months]
+    elif args.year is not None and args.month is not None:
+        periods = [(args.year, args.month)]
+    else:
+        raise ValueError("pass --year and --month, or --months YYYY-MM ...")
+    for _, month in periods:
+        if month < 1 or month > 12:
+            raise ValueError("month must be between 1 and 12")
+    return periods
+
 def standardize_timestamp_cols(df, cab_type: str):
     """
     Make sure we have 'pickup_datetime' and 'dropoff_datetime' columns.
@@ -71,32 +102,108 @@ def add_missing_fhv_cols(df):
     return df
 
 
-def main():
-    args = parse_args()
-    if args.month < 1 or args.month > 12:
-        raise ValueError("month must be between 1 and 12")
+def input_bytes(spark, path):
+    """Size of the raw input via the Hadoop FileSystem API (works for s3:// and local paths)."""
+    jpath = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(spark._jsc.hadoopConfiguration())
+    return int(fs.getContentSummary(jpath).getLength())
 
-    raw_path = f"{args.raw_prefix}{args.cab_type}_tripdata_{args.year}-{args.month:02d}.parquet"
-    dest_path = args.dest_prefix.rstrip("/") + "/"
 
-# --- START TIMING BLOCK (S-1.2.6.8) ---
-    start_time = time.time()
-    spark = (
-        SparkSession.builder
-        .appName(f"emr_process_trip_data_{args.cab_type}_{args.year}_{args.month:02d}")
-        .getOrCreate()
-    )
+def written_files(spark, path, since_sec):
+    """Parquet files (path, bytes) under `path` modified at/after `since_sec` — this run's appends."""
+    jpath = spark._jvm.org.apache.hadoop.fs.Path(path)
+    fs = jpath.getFileSystem(spark._jsc.hadoopConfiguration())
+    if not fs.exists(jpath):
+        return []
+    files, it = [], fs.listFiles(jpath, True)
+    while it.hasNext():
+        st = it.next()
+        name = st.getPath().toString()
+        if name.endswith(".parquet") and st.getModificationTime() >= since_sec * 1000:
+            files.append((name, int(st.getLen())))
+    return files
+
+
+def write_partition_manifest(args, pipeline_id, dest_path, files):
+    """Same format as partition_catalog.write_manifest (the layer isn't on EMR)."""
+    days = sorted({int(re.search(r"/day=(\d+)/", f).group(1)) for f, _ in files if "/day=" in f})
+    year, month = (int(p) for p in pipeline_id.rsplit("_", 1)[1].split("-"))
+    partitions = [
+        {"cab_type": args.cab_type, "year": year, "month": month, "day": d,
+         "location": f"{dest_path}cab_type={args.cab_type}/year={year}/month={month}/day={d}/"}
+        for d in days
+    ]
+    write_metrics(f"{args.manifest_prefix.rstrip('/')}/{pipeline_id}.json", {
+        "pipeline_id": pipeline_id,
+        "database": args.catalog_database,
+        "table": args.catalog_table,
+        "table_location": dest_path,
+        "partitions": partitions,
+    })
+
+
+def executor_info(spark):
+    conf = spark.sparkContext.getConf()
+    return {
+        "type": "emr",
+        "workers": conf.get("spark.executor.instances", None),
+        "executor_cores": conf.get("spark.executor.cores", None),
+        "executor_memory": conf.get("spark.executor.memory", None),
+    }
+
+
+def log_transform_succeeded(control_table, pipeline_id, metrics, dest_path):
+    """Same item shape as pipeline_logger.log_pipeline_stage (the layer isn't on EMR)."""
+    import boto3
+    from datetime import datetime
+    from decimal import Decimal
+    stage_metrics = {k: metrics[k] for k in ("duration_sec", "input_bytes", "output_bytes", "rows_in", "rows_out",
+                                             "files_written", "executor")}
+    boto3.resource("dynamodb").Table(control_table).put_item(Item={
+        "pipeline_id": pipeline_id,
+        "stage": "transform",
+        "pipeline_name": "nyc_taxi_batch",
+        "pipeline_type": "batch",
+        "executor": "emr",
+        "status": "SUCCEEDED",
+        "timestamp": datetime.utcnow().isoformat(),
+        "record_count": metrics["rows_out"],
+        "s3_output": dest_path,
+        "details": {
+            "job": "emr_process_trip_data",
+            "duration_sec": int(round(metrics["duration_sec"])),
+            "input_bytes": metrics["input_bytes"],
+            # DynamoDB rejects Python floats
+            "rows_per_sec": Decimal(str(metrics["rows_per_sec"])),
+            "bytes_per_sec": Decimal(str(metrics["bytes_per_sec"])),
+        },
+        # per-stage metrics, same keys as pipeline_logger.METRIC_FIELDS
+        "metrics": json.loads(json.dumps(stage_metrics), parse_float=Decimal),
+    })
+    print(f"[INFO] Logged to control table: {pipeline_id} [transform] - SUCCEEDED")
+
+
+def write_metrics(uri, report):
+    body = json.dumps(report, indent=2)
+    if uri.startswith("s3://"):
+        import boto3
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body.encode(), ContentType="application/json")
+    else:
+        with open(uri, "w") as f:
+            f.write(body)
+    print(f"[INFO] Written {uri}")
 
-    # Write behavior to mirror Glue tuning
-    spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
-    spark.conf.set("spark.sql.adaptive.enabled", "true") # Enable AQE - V1 enhancements
-    spark.conf.set("spark.sql.parquet.compression.codec", "snappy")
-    spark.conf.set("parquet.enable.dictionary", "false")
-    spark.conf.set("parquet.writer.version", "v1")
 
+def process_month(spark, args, year, month, dest_path):
+    """Transform and append one month; returns its rows/bytes/duration."""
+    raw_path = f"{args.raw_prefix}{args.cab_type}_tripdata_{year}-{month:02d}.parquet"
+    month_start = time.time()
 
     print(f"[INFO] Reading {raw_path}")
     df = spark.read.parquet(raw_path)
+    rows = df.count()   # answered from Parquet footers
+    nbytes = input_bytes(spark, raw_path)
 
     # Canonicalize timestamp columns based on cab type
     df = standardize_timestamp_cols(df, args.cab_type)
@@ -111,15 +218,15 @@ def main():
 
     # Filter to requested month (guard against broad inputs)
     df = df.filter(
-        (F.year(F.col("pickup_datetime")) == F.lit(int(args.year))) &
-        (F.month(F.col("pickup_datetime")) == F.lit(int(args.month)))
+        (F.year(F.col("pickup_datetime")) == F.lit(int(year))) &
+        (F.month(F.col("pickup_datetime")) == F.lit(int(month)))
     )
 
     # Add partition columns and typed constants
     df = (
         df.withColumn("cab_type", F.lit(args.cab_type).cast(T.StringType()))
-          .withColumn("year", F.lit(args.year).cast(T.IntegerType()))
-          .withColumn("month", F.lit(args.month).cast(T.IntegerType()))
+          .withColumn("year", F.lit(year).cast(T.IntegerType()))
+          .withColumn("month", F.lit(month).cast(T.IntegerType()))
           .withColumn("day", F.dayofmonth(F.col("pickup_datetime")).cast(T.IntegerType()))
     )
 
@@ -135,8 +242,6 @@ def main():
     print("[INFO] Normalized schema:")
     df.printSchema()
 
-# ... (Continuing inside the main() function) ...
-
     # Write partitioned Parquet (append) to the TEST destination
     print(f"[INFO] Writing to {dest_path}")
     (df
@@ -145,11 +250,76 @@ def main():
        .partitionBy("cab_type", "year", "month", "day")
        .parquet(dest_path))
 
+    # Stage metrics: rows_out from the footers of the files this run wrote
+    files = written_files(spark, f"{dest_path}cab_type={args.cab_type}/year={year}/month={month}/", month_start)
+    rows_out = spark.read.parquet(*[f for f, _ in files]).count() if files else 0
+
+    pipeline_id = f"{args.cab_type}_tripdata_{year}-{month:02d}"
+    if args.manifest_prefix:
+        write_partition_manifest(args, pipeline_id, dest_path, files)
+
+    duration = time.time() - month_start
+    return {
+        "pipeline_id": pipeline_id,
+        "year": year,
+        "month": month,
+        "rows": rows,
+        "input_bytes": nbytes,
+        "rows_in": rows,
+        "rows_out": rows_out,
+        "output_bytes": sum(size for _, size in files),
+        "files_written": len(files),
+        "executor": executor_info(spark),
+        "duration_sec": round(duration, 1),
+        "rows_per_sec": round(rows / max(duration, 1e-3), 1),
+        "bytes_per_sec": round(nbytes / max(duration, 1e-3), 1),
+    }
+
+
+def main():
+    args = parse_args()
+    periods = months_to_process(args)
+    dest_path = args.dest_prefix.rstrip("/") + "/"
+    label = "_".join(f"{y}_{m:02d}" for y, m in (periods[0], periods[-1]))
+
+# --- START TIMING BLOCK (S-1.2.6.8) ---
+    start_time = time.time()
+    spark = (
+        SparkSession.builder
+        .appName(f"emr_process_trip_data_{args.cab_type}_{label}")
+        .getOrCreate()
+    )
+
+    # Write behavior to mirror Glue tuning
+    spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+    spark.conf.set("spark.sql.adaptive.enabled", "true") # Enable AQE - V1 enhancements
+    spark.conf.set("spark.sql.parquet.compression.codec", "snappy")
+    spark.conf.set("parquet.enable.dictionary", "false")
+    spark.conf.set("parquet.writer.version", "v1")
+
+    results = []
+    for year, month in periods:
+        metrics = process_month(spark, args, year, month, dest_path)
+        print(f"[BENCHMARK] {metrics['pipeline_id']}: {metrics['rows']} rows, {metrics['input_bytes']} bytes "
+              f"in {metrics['duration_sec']}s ({metrics['rows_per_sec']} rows/s)")
+        results.append(metrics)
+        if args.control_table:
+            # --pipeline_id (set by the trigger Lambda) only applies to a single-month run
+            pipeline_id = args.pipeline_id if args.pipeline_id and len(periods) == 1 else metrics["pipeline_id"]
+            log_transform_succeeded(args.control_table, pipeline_id, metrics, dest_path)
+
     # --- END TIMING BLOCK (S-1.2.6.8) ---
     end_time = time.time()
     print(f"[BENCHMARK] Total Optimized Job Time: {end_time - start_time:.3f} seconds")
     # --- END TIMING BLOCK ---
 
+    if args.metrics_uri:
+        write_metrics(args.metrics_uri, {
+            "cab_type": args.cab_type,
+            "job_sec": round(end_time - start_time, 1),
+            "months": results,
+        })
+
     print("[DONE] Write complete.")
     spark.stop()  # <-- Must be indented inside main()
 
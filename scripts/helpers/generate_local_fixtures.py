@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Local Parquet fixtures for offline dbt / dashboard runs (TARGET_WAREHOUSE=duckdb)
+
+Writes synthetic data in the same layout as the S3 lake, so the dbt duckdb target and
+dbt_marts_client read it exactly like Spark/Glue read s3://teo-nyc-taxi/processed/:
+  <out_dir>/processed/trip_data/cab_type=<cab>/year=<Y>/month=<M>/day=<D>/part-00000.parquet
+  <out_dir>/processed/taxi_zone_lookup/taxi_zone_lookup.parquet
+  <out_dir>/streaming/taxi_streaming_trips.parquet   (last --stream_minutes, ending now)
+
+Volumes and shapes follow the real feeds: hour-of-day demand curve, Zipf-like zone
+popularity, lognormal trip durations, fare ~ distance, 1-6 passengers.
+
+Example (3 months, ~50k yellow trips/day):
+  python scripts/helpers/generate_local_fixtures.py --out_dir fixtures \
+    --months 2024-10 2024-11 2024-12 --trips_per_day 50000
+  cd dbt && DUCKDB_FIXTURES_DIR=../fixtures dbt build --target duckdb   # profile: type duckdb, path nyc_taxi.duckdb
+  TARGET_WAREHOUSE=duckdb DUCKDB_PATH=dbt/nyc_taxi.duckdb streamlit run analytics/streamlit/streamlit_dbt_marts.py
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+N_ZONES = 265
+BOROUGHS = ["Manhattan", "Brooklyn", "Queens", "Bronx", "Staten Island", "EWR"]
+BOROUGH_WEIGHTS = [0.25, 0.23, 0.26, 0.16, 0.08, 0.02]
+# share of a day's trips per hour (00..23): overnight trough, 8am and 6pm peaks
+HOUR_WEIGHTS = np.array([
+    2.5, 1.7, 1.2, 0.9, 0.8, 1.0, 2.0, 3.5, 4.6, 4.7, 4.6, 4.8,
+    5.0, 5.1, 5.4, 5.6, 5.7, 6.0, 6.6, 6.3, 5.6, 5.2, 4.6, 3.6,
+])
+HOUR_WEIGHTS = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+CAB_SHARE = {"yellow": 1.0, "green": 0.06, "fhv": 0.35}
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out_dir", default="fixtures")
+    ap.add_argument("--months", nargs="+", default=["2024-12"], help="YYYY-MM months of batch trip data")
+    ap.add_argument("--cab_types", nargs="+", default=["yellow", "green", "fhv"], choices=list(CAB_SHARE))
+    ap.add_argument("--trips_per_day", type=int, default=20000, help="yellow trips/day (others scaled)")
+    ap.add_argument("--stream_minutes", type=int, default=180)
+    ap.add_argument("--stream_trips_per_minute", type=int, default=120)
+    ap.add_argument("--seed", type=int, default=42)
+    return ap.parse_args()
+
+
+def zone_lookup(rng):
+    ids = np.arange(1, N_ZONES + 1)
+    borough = rng.choice(BOROUGHS, size=N_ZONES, p=BOROUGH_WEIGHTS)
+    return pd.DataFrame({
+        "locationid": ids.astype("int64"),
+        "borough": borough,
+        "zone": [f"{b} Zone {i:03d}" for b, i in zip(borough, ids)],
+        "service_zone": np.where(borough == "Manhattan", "Yellow Zone", "Boro Zone"),
+    })
+
+
+def zone_popularity(rng):
+    # Zipf-like: a few zones (airports, Midtown) carry most pickups
+    weights = 1.0 / np.arange(1, N_ZONES + 1) ** 0.9
+    weights = rng.permutation(weights)
+    return weights / weights.sum()
+
+
+def trips_for_day(rng, day, n, zone_p):
+    hours = rng.choice(24, size=n, p=HOUR_WEIGHTS)
+    pickup = (pd.Timestamp(day)
+              + pd.to_timedelta(hours, unit="h")
+              + pd.to_timedelta(rng.integers(0, 3600, size=n), unit="s"))
+    duration_s = np.clip(rng.lognormal(mean=6.6, sigma=0.6, size=n), 60, 4 * 3600).astype("int64")
+    distance = np.round(duration_s / 3600 * rng.normal(11, 3, size=n).clip(3, 30), 2)
+    fare = np.round(3.0 + 2.5 * distance + rng.normal(0, 1.5, size=n).clip(-2, 6), 2)
+    tip = np.round(np.where(rng.random(n) < 0.7, fare * rng.uniform(0.1, 0.25, size=n), 0.0), 2)
+    tolls = np.where(rng.random(n) < 0.05, 6.94, 0.0)
+    return pd.DataFrame({
+        "vendorid": rng.choice([1, 2], size=n).astype("int64"),
+        "pickup_datetime": pickup,
+        "dropoff_datetime": pickup + pd.to_timedelta(duration_s, unit="s"),
+        "store_and_fwd_flag": rng.choice(["N", "Y"], size=n, p=[0.995, 0.005]),
+        "ratecodeid": rng.choice([1.0, 2.0, 5.0], size=n, p=[0.95, 0.04, 0.01]),
+        "pulocationid": rng.choice(N_ZONES, size=n, p=zone_p).astype("int64") + 1,
+        "dolocationid": rng.choice(N_ZONES, size=n, p=zone_p).astype("int64") + 1,
+        "passenger_count": rng.choice([1, 2, 3, 4, 5, 6], size=n, p=[0.72, 0.15, 0.05, 0.03, 0.03, 0.02]).astype("float64"),
+        "trip_distance": distance,
+        "fare_amount": fare,
+        "extra": rng.choice([0.0, 1.0, 2.5], size=n),
+        "mta_tax": 0.5,
+        "tip_amount": tip,
+        "tolls_amount": tolls,
+        "ehail_fee": np.nan,
+        "improvement_surcharge": 1.0,
+        "total_amount": np.round(fare + tip + tolls + 1.5, 2),
+        "payment_type": rng.choice([1, 2, 3, 4], size=n, p=[0.78, 0.2, 0.01, 0.01]).astype("int64"),
+        "trip_type": 1.0,
+        "congestion_surcharge": 2.5,
+        "airport_fee": np.where(rng.random(n) < 0.08, 1.75, 0.0),
+    })
+
+
+def write_trip_data(rng, out_dir, months, cab_types, trips_per_day, zone_p):
+    total = 0
+    for ym in months:
+        start = datetime.strptime(ym, "%Y-%m")
+        end = (start + timedelta(days=32)).replace(day=1)
+        for cab in cab_types:
+            day = start
+            while day < end:
+                n = max(1, int(rng.poisson(trips_per_day * CAB_SHARE[cab])))
+                df = trips_for_day(rng, day, n, zone_p)
+                part = os.path.join(out_dir, "processed", "trip_data", f"cab_type={cab}",
+                                    f"year={day.year}", f"month={day.month}", f"day={day.day}")
+                os.makedirs(part, exist_ok=True)
+                df.to_parquet(os.path.join(part, "part-00000.parquet"), index=False)
+                total += n
+                day += timedelta(days=1)
+        print(f"[OK] trip_data {ym}: {', '.join(cab_types)}")
+    return total
+
+
+def write_streaming(rng, out_dir, minutes, per_minute, zone_p):
+    now = pd.Timestamp.now("UTC").tz_localize(None).floor("s")
+    n = minutes * per_minute
+    event_time = now - pd.to_timedelta(rng.integers(0, minutes * 60, size=n), unit="s")
+    # simulator replays historical trips, so pickup times are "today" but not the event time
+    base = trips_for_day(rng, now.normalize(), n, zone_p)
+    # checkpoints: producer -> Firehose -> transform Lambda -> S3 object (one per buffer flush) -> Redshift
+    sent = event_time + pd.to_timedelta(rng.integers(1, 20, size=n), unit="ms")
+    firehose = sent + pd.to_timedelta(rng.integers(20, 300, size=n), unit="ms")
+    received = firehose + pd.to_timedelta(rng.integers(50, 2000, size=n), unit="ms")
+    processed = received + pd.to_timedelta(rng.integers(1, 50, size=n), unit="ms")
+    s3_written = (processed + pd.Timedelta(seconds=1)).ceil("60s")
+    inserted = s3_written + pd.to_timedelta(rng.gamma(2.0, 45.0, size=n), unit="s")
+    df = pd.DataFrame({
+        "trip_id": [f"cab_{i:09d}" for i in rng.choice(10**9, size=n, replace=False)],
+        "pickup_datetime": base["pickup_datetime"],
+        "dropoff_datetime": base["dropoff_datetime"],
+        "pulocationid": base["pulocationid"],
+        "dolocationid": base["dolocationid"],
+        "passenger_count": base["passenger_count"].astype("int64"),
+        "fare_amount": base["fare_amount"],
+        "payment_type": base["payment_type"],
+        "event_time": event_time,
+        "lambda_received_time": received,
+        "producer_sent_time": sent,
+        "firehose_received_time": firehose,
+        "lambda_processed_time": processed,
+        "s3_written_time": s3_written,
+        "inserted_at": inserted.floor("s"),
+    }).sort_values("inserted_at")
+    path = os.path.join(out_dir, "streaming")
+    os.makedirs(path, exist_ok=True)
+    df.to_parquet(os.path.join(path, "taxi_streaming_trips.parquet"), index=False)
+    return n
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    zones = zone_lookup(rng)
+    zone_dir = os.path.join(args.out_dir, "processed", "taxi_zone_lookup")
+    os.makedirs(zone_dir, exist_ok=True)
+    zones.to_parquet(os.path.join(zone_dir, "taxi_zone_lookup.parquet"), index=False)
+
+    zone_p = zone_popularity(rng)
+    n_batch = write_trip_data(rng, args.out_dir, args.months, args.cab_types, args.trips_per_day, zone_p)
+    n_stream = write_streaming(rng, args.out_dir, args.stream_minutes, args.stream_trips_per_minute, zone_p)
+    print(f"[OK] {n_batch:,} batch trips, {n_stream:,} streaming trips, {N_ZONES} zones -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
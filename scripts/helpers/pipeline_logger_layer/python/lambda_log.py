@@ -0,0 +1,153 @@
+"""
+Structured, level-gated logging for the Lambdas: one JSON line per message on stdout
+(CloudWatch Logs), so lines are cheap to filter with Logs Insights and nothing is
+serialized for messages below LOG_LEVEL.
+
+    from lambda_log import BatchSummary, get_logger
+
+    log = get_logger("cleanse_firehose")
+    log = log.bind(request_id=context.aws_request_id)      # per invocation
+    log.info("copy finished", rows=123)
+    log.debug("event received", event=event)               # only with LOG_LEVEL=DEBUG
+    log.sample("record transformed", record_id=rid)        # ~LOG_SAMPLE_RATE of the calls
+
+    summary = BatchSummary(log, "records")
+    summary.ok()
+    summary.failed("missing_fields", record_id=rid)        # counted; first few kept as examples
+    summary.emit(records=n)                                # one line per batch
+
+Per-record messages go through sample() or BatchSummary; per-batch outcomes through emit().
+
+LOG_LEVEL             DEBUG | INFO | WARNING | ERROR (default INFO)
+LOG_SAMPLE_RATE       fraction of sample() calls emitted (default 0.01; 1 = all, 0 = none)
+LOG_SUMMARY_EXAMPLES  examples kept per failure reason in a batch summary (default 3)
+"""
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+MAX_EXAMPLES = int(os.environ.get("LOG_SUMMARY_EXAMPLES", "3"))
+
+
+class Logger:
+    def __init__(self, name, level=LOG_LEVEL, sample_rate=SAMPLE_RATE, **context):
+        self.name = name
+        self.level = level
+        self.threshold = LEVELS.get(level, LEVELS["INFO"])
+        self.sample_rate = sample_rate
+        self.context = context
+
+    def bind(self, **context):
+        """Same logger with extra fields on every line (request_id, pipeline_id, ...)."""
+        return Logger(self.name, self.level, self.sample_rate, **{**self.context, **context})
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.threshold
+
+    def log(self, level, msg, **fields):
+        if LEVELS[level] < self.threshold:
+            return
+        line = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "level": level,
+            "logger": self.name,
+            "msg": msg,
+            **self.context,
+            **fields,
+        }
+        print(json.dumps(line, default=str))
+
+    def debug(self, msg, **fields):
+        self.log("DEBUG", msg, **fields)
+
+    def info(self, msg, **fields):
+        self.log("INFO", msg, **fields)
+
+    def warning(self, msg, **fields):
+        self.log("WARNING", msg, **fields)
+
+    def error(self, msg, **fields):
+        self.log("ERROR", msg, **fields)
+
+    def sample(self, msg, level="INFO", **fields):
+        """Per-record message: emitted for ~sample_rate of the calls (the rate is on the line)."""
+        if not self.enabled(level) or self.sample_rate <= 0:
+            return
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            self.log(level, msg, sample_rate=self.sample_rate, **fields)
+
+
+_loggers = {}
+
+
+def get_logger(name, **context):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name].bind(**context) if context else _loggers[name]
+
+
+class BatchSummary:
+    """
+    Counters for one batch (records of a Firehose invocation, files of a copy run, ...),
+    logged as a single line by emit(): outcome counts, failures by reason with a few
+    examples, total duration and the per-name timings collected with timed().
+    """
+
+    def __init__(self, logger, name="batch"):
+        self.logger = logger
+        self.name = name
+        self.started = time.perf_counter()
+        self.counts = {}
+        self.reasons = {}
+        self.examples = {}
+        self.timings = {}
+
+    def count(self, outcome, n=1):
+        self.counts[outcome] = self.counts.get(outcome, 0) + n
+
+    def ok(self, n=1):
+        self.count("ok", n)
+
+    def failed(self, reason, **example):
+        self.count("failed")
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        examples = self.examples.setdefault(reason, [])
+        if len(examples) < MAX_EXAMPLES and example:
+            examples.append(example)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            total, n, worst = self.timings.get(name, (0.0, 0, 0.0))
+            self.timings[name] = (total + ms, n + 1, max(worst, ms))
+
+    def as_dict(self):
+        return {
+            "counts": self.counts,
+            "failed_by_reason": self.reasons,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "timings_ms": {
+                name: {"n": n, "avg": round(total / n, 1), "max": round(worst, 1)}
+                for name, (total, n, worst) in self.timings.items()
+            },
+        }
+
+    def emit(self, **fields):
+        """One line for the batch (WARNING when anything failed); returns the summary dict."""
+        summary = self.as_dict()
+        level = "WARNING" if self.reasons else "INFO"
+        extra = {"examples": self.examples} if self.examples else {}
+        self.logger.log(level, f"{self.name} summary", **summary, **extra, **fields)
+        return summary
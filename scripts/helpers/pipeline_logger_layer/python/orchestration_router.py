@@ -0,0 +1,192 @@
+"""
+Glue vs. EMR routing for one raw trip file (cab_type, year, month).
+
+Small green/fhv months are overprovisioned on EMR, large yellow months are slow on Glue.
+choose_engine() looks at the raw object size and the runtimes recorded in the pipeline
+control table, estimates runtime and cost on each engine, and returns the engine plus a
+worker count sized for the input:
+
+    decision = choose_engine(bucket, key, cab_type)
+    # {"engine": "emr", "input_bytes": ..., "workers": 6, "est_runtime_sec": ..., "est_cost_usd": ..., "reason": ...}
+
+History comes from control-table items written by the runs themselves:
+    stage="route"     details: engine, input_bytes, workers, cab_type   (log_decision below)
+    stage="transform" status=SUCCEEDED, executor glue|emr, details.duration_sec
+read through a GSI on the control table (partition key "stage", sort key "timestamp",
+projection ALL), so only these two stages of the last ROUTER_HISTORY_DAYS are read:
+
+    aws dynamodb update-table --table-name pipeline_execution_control_table \
+        --attribute-definitions AttributeName=stage,AttributeType=S AttributeName=timestamp,AttributeType=S \
+        --global-secondary-index-updates '[{"Create": {"IndexName": "stage-timestamp-index",
+            "KeySchema": [{"AttributeName": "stage", "KeyType": "HASH"}, {"AttributeName": "timestamp", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"}}}]'
+
+EMR is opt-in: the EMR job writes the test table (processed/emr/trip_data/, nyc_taxi_db.emr_trip_data)
+and the downstream stages (catalog update, Redshift COPY, notify) only run for the Glue
+state machine, so auto routing picks Glue unless ROUTER_ENABLE_EMR=true.
+ORCHESTRATION_ENGINE=glue|emr forces an engine (workers still sized); auto is the default.
+"""
+
+import math
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+from pipeline_logger import DYNAMO_TABLE, log_pipeline_stage, safe_decimal
+
+FORCED_ENGINE = os.environ.get("ORCHESTRATION_ENGINE", "auto").lower()
+ENABLE_EMR = os.environ.get("ROUTER_ENABLE_EMR", "false").lower() == "true"   # EMR in auto routing
+SIZE_THRESHOLD_MB = float(os.environ.get("GLUE_MAX_INPUT_MB", "50"))      # no-history fallback
+MAX_RUNTIME_SEC = float(os.environ.get("ROUTER_MAX_RUNTIME_SEC", "1800"))  # runtime target per month
+HISTORY_TTL_SEC = 300                                                    # warm-Lambda cache of the history
+HISTORY_DAYS = int(os.environ.get("ROUTER_HISTORY_DAYS", "90"))
+STAGE_INDEX = os.environ.get("CONTROL_TABLE_STAGE_INDEX", "stage-timestamp-index")
+
+# engine profiles: startup overhead, per-worker throughput prior, worker sizing and price
+ENGINES = {
+    "glue": {
+        "overhead_sec": 90.0,
+        "worker_mb_per_sec": 1.5,     # G.1X worker
+        "mb_per_worker": 64,
+        "min_workers": 2,
+        "max_workers": int(os.environ.get("GLUE_MAX_WORKERS", "20")),
+        "worker_hour_usd": float(os.environ.get("GLUE_DPU_HOUR_USD", "0.44")),   # 1 DPU per G.1X
+        "min_billed_sec": 60,
+    },
+    "emr": {
+        "overhead_sec": 40.0,         # step on the running cluster
+        "worker_mb_per_sec": 3.0,     # executor (1 core, 2g)
+        "mb_per_worker": 256,
+        "min_workers": 2,
+        "max_workers": int(os.environ.get("EMR_MAX_EXECUTORS", "16")),
+        "worker_hour_usd": float(os.environ.get("EMR_EXECUTOR_HOUR_USD", "0.25")),
+        "min_billed_sec": 0,
+    },
+}
+
+s3 = boto3.client("s3")
+dynamodb = boto3.resource("dynamodb")
+
+_history_cache = {"at": None, "runs": []}
+
+
+# ----------------------------------------------
+# History
+# ----------------------------------------------
+def _query_stage(table, stage, since):
+    kwargs = {
+        "IndexName": STAGE_INDEX,
+        "KeyConditionExpression": Key("stage").eq(stage) & Key("timestamp").gte(since),
+    }
+    while True:
+        page = table.query(**kwargs)
+        yield from page.get("Items", [])
+        if "LastEvaluatedKey" not in page:
+            break
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def load_history(force=False):
+    """[{engine, cab_type, input_bytes, workers, duration_sec}] for routed runs that succeeded."""
+    cached_at = _history_cache["at"]
+    if not force and cached_at is not None and time.monotonic() - cached_at < HISTORY_TTL_SEC:
+        return _history_cache["runs"]
+
+    table = dynamodb.Table(DYNAMO_TABLE)
+    since = (datetime.utcnow() - timedelta(days=HISTORY_DAYS)).isoformat()
+    routes = {item["pipeline_id"]: item.get("details") or {} for item in _query_stage(table, "route", since)}
+    durations = {}
+    for item in _query_stage(table, "transform", since):
+        details = item.get("details") or {}
+        if item.get("status") == "SUCCEEDED" and "duration_sec" in details:
+            durations[item["pipeline_id"]] = (item.get("executor"), float(details["duration_sec"]))
+
+    runs = []
+    for pipeline_id, (executor, duration) in durations.items():
+        route = routes.get(pipeline_id)
+        if not route or route.get("engine") != executor:
+            continue
+        runs.append({
+            "engine": executor,
+            "cab_type": route.get("cab_type"),
+            "input_bytes": float(route["input_bytes"]),
+            "workers": int(route["workers"]),
+            "duration_sec": duration,
+        })
+    _history_cache.update(at=time.monotonic(), runs=runs)
+    return runs
+
+
+def _worker_throughput(engine, cab_type, history):
+    """MB/s per worker from past runs (same cab type if we have any), else the prior."""
+    profile = ENGINES[engine]
+    runs = [r for r in history if r["engine"] == engine]
+    same_cab = [r for r in runs if r["cab_type"] == cab_type]
+    rates = [
+        r["input_bytes"] / 1e6 / max(r["duration_sec"] - profile["overhead_sec"], 1.0) / max(r["workers"], 1)
+        for r in (same_cab or runs)
+    ]
+    return (statistics.median(rates), len(rates)) if rates else (profile["worker_mb_per_sec"], 0)
+
+
+# ----------------------------------------------
+# Decision
+# ----------------------------------------------
+def size_workers(engine, input_bytes):
+    p = ENGINES[engine]
+    return max(p["min_workers"], min(p["max_workers"], math.ceil(input_bytes / 1e6 / p["mb_per_worker"])))
+
+
+def estimate(engine, input_bytes, cab_type, history):
+    p = ENGINES[engine]
+    workers = size_workers(engine, input_bytes)
+    mb_per_sec, samples = _worker_throughput(engine, cab_type, history)
+    runtime = p["overhead_sec"] + input_bytes / 1e6 / (mb_per_sec * workers)
+    cost = workers * p["worker_hour_usd"] * max(runtime, p["min_billed_sec"]) / 3600
+    return {"engine": engine, "workers": workers, "est_runtime_sec": round(runtime, 1),
+            "est_cost_usd": round(cost, 4), "history_runs": samples}
+
+
+def route(input_bytes, cab_type, history):
+    if FORCED_ENGINE in ENGINES:
+        return {**estimate(FORCED_ENGINE, input_bytes, cab_type, history), "reason": "forced by ORCHESTRATION_ENGINE"}
+    if not ENABLE_EMR:
+        return {**estimate("glue", input_bytes, cab_type, history), "reason": "EMR routing not enabled (ROUTER_ENABLE_EMR)"}
+
+    glue, emr = (estimate(e, input_bytes, cab_type, history) for e in ("glue", "emr"))
+    if not glue["history_runs"] and not emr["history_runs"]:
+        pick = glue if input_bytes / 1e6 <= SIZE_THRESHOLD_MB else emr
+        return {**pick, "reason": f"no history; size threshold {SIZE_THRESHOLD_MB:.0f} MB"}
+
+    in_sla = [e for e in (glue, emr) if e["est_runtime_sec"] <= MAX_RUNTIME_SEC]
+    if in_sla:
+        pick = min(in_sla, key=lambda e: (e["est_cost_usd"], e["est_runtime_sec"]))
+        return {**pick, "reason": f"cheapest within {MAX_RUNTIME_SEC:.0f}s runtime target"}
+    pick = min((glue, emr), key=lambda e: e["est_runtime_sec"])
+    return {**pick, "reason": "no engine within runtime target; fastest"}
+
+
+def choose_engine(bucket, key, cab_type):
+    input_bytes = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    decision = route(input_bytes, cab_type, load_history())
+    return {**decision, "input_bytes": input_bytes, "cab_type": cab_type}
+
+
+def log_decision(pipeline_id, decision, s3_input=None):
+    """Record the decision (stage 'route'); load_history() pairs it with the run's duration."""
+    log_pipeline_stage(
+        pipeline_id=pipeline_id,
+        stage="route",
+        pipeline_name="nyc_taxi_batch",
+        pipeline_type="batch",
+        executor="lambda",
+        status="SUCCEEDED",
+        timestamp=datetime.utcnow().isoformat(),
+        s3_input=s3_input,
+        # DynamoDB rejects Python floats
+        details={k: safe_decimal(v) if isinstance(v, float) else v for k, v in decision.items()},
+    )
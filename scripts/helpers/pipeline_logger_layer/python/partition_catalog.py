@@ -0,0 +1,233 @@
+"""
+Partition manifests and direct catalog registration (replaces MSCK REPAIR TABLE).
+
+The batch jobs list the partitions they just wrote and store them as a manifest:
+
+    s3://teo-nyc-taxi/manifests/partitions/<pipeline_id>.json
+    {"pipeline_id": ..., "database": ..., "table": ..., "table_location": ...,
+     "partitions": [{"cab_type": "yellow", "year": 2024, "month": 1, "day": 1, "location": "s3://.../day=1/"}, ...]}
+
+register_partitions() adds exactly those partitions to the Glue Data Catalog, either with
+glue:BatchCreatePartition (default) or an Athena ALTER TABLE ADD IF NOT EXISTS PARTITION,
+waiting for completion. Cost grows with the partitions written, not with the table.
+
+Partition projection (no registration at all) is the alternative; print or apply its
+table properties with:
+    python partition_catalog.py projection --database teo_nyc_taxi_db --table trip_data \
+        --location s3://teo-nyc-taxi/processed/trip_data/ --years 2019-2030 [--apply]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+import boto3
+
+MANIFEST_PREFIX = os.environ.get("PARTITION_MANIFEST_PREFIX", "s3://teo-nyc-taxi/manifests/partitions/")
+ATHENA_OUTPUT = os.environ.get("ATHENA_OUTPUT", "s3://teo-nyc-taxi/Athena/output_result/")
+PARTITION_KEYS = ("cab_type", "year", "month", "day")
+GLUE_BATCH_MAX = 100              # batch_create_partition limit
+ATHENA_PARTITIONS_PER_QUERY = 500  # keeps ALTER TABLE well under the query length limit
+
+_PARTITION_RE = re.compile(r"cab_type=([^/]+)/year=(\d+)/month=(\d+)/day=(\d+)/")
+
+s3 = boto3.client("s3")
+glue = boto3.client("glue")
+athena = boto3.client("athena")
+
+
+def _split_s3(uri):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+# ----------------------------------------------
+# Manifest
+# ----------------------------------------------
+def written_partitions(table_location, since=None, cab_type=None, year=None, month=None):
+    """Partitions under table_location holding objects modified at/after `since` (aware datetime)."""
+    table_location = table_location.rstrip("/") + "/"
+    bucket, prefix = _split_s3(table_location)
+    if cab_type is not None:
+        prefix += f"cab_type={cab_type}/"
+        if year is not None:
+            prefix += f"year={int(year)}/"
+            if month is not None:
+                prefix += f"month={int(month)}/"
+    found = set()
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if since is not None and obj["LastModified"] < since:
+                continue
+            m = _PARTITION_RE.search(obj["Key"])
+            if m:
+                found.add((m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4))))
+    return [
+        {"cab_type": c, "year": y, "month": mo, "day": d,
+         "location": f"{table_location}cab_type={c}/year={y}/month={mo}/day={d}/"}
+        for c, y, mo, d in sorted(found)
+    ]
+
+
+def manifest_uri(pipeline_id):
+    return f"{MANIFEST_PREFIX.rstrip('/')}/{pipeline_id}.json"
+
+
+def write_manifest(pipeline_id, database, table, table_location, partitions):
+    uri = manifest_uri(pipeline_id)
+    bucket, key = _split_s3(uri)
+    body = {
+        "pipeline_id": pipeline_id,
+        "database": database,
+        "table": table,
+        "table_location": table_location,
+        "partitions": partitions,
+    }
+    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(body, indent=2).encode(), ContentType="application/json")
+    print(f"🗂 Partition manifest ({len(partitions)} partition(s)) -> {uri}")
+    return uri
+
+
+def read_manifest(uri):
+    bucket, key = _split_s3(uri)
+    return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+
+# ----------------------------------------------
+# Registration
+# ----------------------------------------------
+def _register_glue(database, table, partitions):
+    sd = glue.get_table(DatabaseName=database, Name=table)["Table"]["StorageDescriptor"]
+    created = existing = 0
+    for i in range(0, len(partitions), GLUE_BATCH_MAX):
+        chunk = partitions[i:i + GLUE_BATCH_MAX]
+        resp = glue.batch_create_partition(
+            DatabaseName=database,
+            TableName=table,
+            PartitionInputList=[{
+                "Values": [str(p[k]) for k in PARTITION_KEYS],
+                "StorageDescriptor": {**sd, "Location": p["location"]},
+            } for p in chunk],
+        )
+        errors = resp.get("Errors", [])
+        already = [e for e in errors if e["ErrorDetail"]["ErrorCode"] == "AlreadyExistsException"]
+        if len(already) != len(errors):
+            raise Exception(f"batch_create_partition failed: {[e for e in errors if e not in already][:3]}")
+        created += len(chunk) - len(already)
+        existing += len(already)
+    return {"created": created, "already_existed": existing}
+
+
+def _run_athena(sql, database):
+    qid = athena.start_query_execution(
+        QueryString=sql,
+        QueryExecutionContext={"Database": database},
+        ResultConfiguration={"OutputLocation": ATHENA_OUTPUT},
+    )["QueryExecutionId"]
+    while True:
+        q = athena.get_query_execution(QueryExecutionId=qid)["QueryExecution"]
+        state = q["Status"]["State"]
+        if state == "SUCCEEDED":
+            return qid, q.get("Statistics", {}).get("EngineExecutionTimeInMillis", 0)
+        if state in ("FAILED", "CANCELLED"):
+            raise Exception(f"Athena query {qid} {state}: {q['Status'].get('StateChangeReason')}")
+        time.sleep(0.5)
+
+
+def _register_athena(database, table, partitions):
+    query_ids, engine_ms = [], 0
+    for i in range(0, len(partitions), ATHENA_PARTITIONS_PER_QUERY):
+        specs = "\n".join(
+            f"PARTITION (cab_type='{p['cab_type']}', year={p['year']}, month={p['month']}, day={p['day']}) "
+            f"LOCATION '{p['location']}'"
+            for p in partitions[i:i + ATHENA_PARTITIONS_PER_QUERY]
+        )
+        qid, ms = _run_athena(f"ALTER TABLE {database}.{table} ADD IF NOT EXISTS\n{specs}", database)
+        query_ids.append(qid)
+        engine_ms += ms
+    return {"query_ids": query_ids, "engine_ms": engine_ms}
+
+
+def register_partitions(database, table, partitions, method="glue"):
+    """Register exactly `partitions`; waits for completion. Returns counts/query ids and duration_sec."""
+    started = time.perf_counter()
+    if not partitions:
+        result = {}
+    elif method == "glue":
+        result = _register_glue(database, table, partitions)
+    elif method == "athena":
+        result = _register_athena(database, table, partitions)
+    else:
+        raise ValueError(f"Unsupported registration method: {method}")
+    return {**result, "method": method, "partitions": len(partitions),
+            "duration_sec": round(time.perf_counter() - started, 3)}
+
+
+def msck_repair(database, table):
+    """Legacy full-prefix scan, for tables without a manifest; waits for completion."""
+    started = time.perf_counter()
+    qid, engine_ms = _run_athena(f"MSCK REPAIR TABLE {database}.{table};", database)
+    return {"method": "msck", "query_ids": [qid], "engine_ms": engine_ms,
+            "duration_sec": round(time.perf_counter() - started, 3)}
+
+
+# ----------------------------------------------
+# Partition projection
+# ----------------------------------------------
+def projection_properties(location, years, cab_types=("yellow", "green", "fhv")):
+    location = location.rstrip("/") + "/"
+    return {
+        "projection.enabled": "true",
+        "projection.cab_type.type": "enum",
+        "projection.cab_type.values": ",".join(cab_types),
+        "projection.year.type": "integer",
+        "projection.year.range": f"{years[0]},{years[1]}",
+        "projection.month.type": "integer",
+        "projection.month.range": "1,12",
+        "projection.day.type": "integer",
+        "projection.day.range": "1,31",
+        "storage.location.template": location + "cab_type=${cab_type}/year=${year}/month=${month}/day=${day}/",
+    }
+
+
+def apply_projection(database, table, properties):
+    """Merge the projection properties into the table definition (Athena only; Spark/Hive ignore them)."""
+    t = glue.get_table(DatabaseName=database, Name=table)["Table"]
+    allowed = ("Name", "Description", "Owner", "Retention", "StorageDescriptor", "PartitionKeys",
+               "TableType", "Parameters")
+    table_input = {k: t[k] for k in allowed if k in t}
+    table_input["Parameters"] = {**t.get("Parameters", {}), **properties}
+    glue.update_table(DatabaseName=database, TableInput=table_input)
+
+
+def _cli():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    proj = sub.add_parser("projection", help="print (or apply) partition projection table properties")
+    proj.add_argument("--database", required=True)
+    proj.add_argument("--table", required=True)
+    proj.add_argument("--location", required=True)
+    proj.add_argument("--years", default="2019-2030", help="first-last year, e.g. 2019-2030")
+    proj.add_argument("--apply", action="store_true", help="update the Glue table instead of printing DDL")
+    reg = sub.add_parser("register", help="register the partitions of a manifest")
+    reg.add_argument("manifest")
+    reg.add_argument("--method", choices=["glue", "athena"], default="glue")
+    args = ap.parse_args()
+
+    if args.cmd == "projection":
+        props = projection_properties(args.location, args.years.split("-"))
+        if args.apply:
+            apply_projection(args.database, args.table, props)
+            print(f"Applied partition projection to {args.database}.{args.table}")
+        else:
+            body = ",\n".join(f"  '{k}'='{v}'" for k, v in props.items())
+            print(f"ALTER TABLE {args.database}.{args.table} SET TBLPROPERTIES (\n{body}\n);")
+    else:
+        m = read_manifest(args.manifest)
+        print(json.dumps(register_partitions(m["database"], m["table"], m["partitions"], args.method), indent=2))
+
+
+if __name__ == "__main__":
+    _cli()
@@ -1,16 +1,62 @@
+import atexit
 import boto3
+import functools
 import os
 import json
+import random
+import threading
+import time
 from decimal import Decimal, InvalidOperation
 from datetime import datetime
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from lambda_log import get_logger
+
 # === ENVIRONMENT VARIABLES ===
 DYNAMO_TABLE = os.environ.get("CONTROL_TABLE", "pipeline_execution_control_table")
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")  # Optional
 
-dynamodb = boto3.resource("dynamodb")
+log = get_logger("pipeline_logger")
+
+# Buffering: items are batched (batch_writer) and flushed when BATCH_SIZE are pending,
+# FLUSH_INTERVAL_SEC after the first one, on a FAILED status, on flush() and at exit.
+# PIPELINE_LOGGER_MODE=sync restores the old write-per-call behavior (raises on failure).
+LOGGER_MODE = os.environ.get("PIPELINE_LOGGER_MODE", "buffered").lower()
+BATCH_SIZE = int(os.environ.get("PIPELINE_LOGGER_BATCH_SIZE", "25"))
+FLUSH_INTERVAL_SEC = float(os.environ.get("PIPELINE_LOGGER_FLUSH_SEC", "5"))
+MAX_RETRIES = int(os.environ.get("PIPELINE_LOGGER_MAX_RETRIES", "5"))
+SPOOL_PATH = os.environ.get("PIPELINE_LOGGER_SPOOL", "/tmp/pipeline_logger_spool.jsonl")  # "" disables
+
+THROTTLE_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "InternalServerError",
+}
+
+# Per-stage performance metrics (item["metrics"]), same keys for every stage so
+# pipeline_metrics_report can compare throughput across stages, engines and months:
+METRIC_FIELDS = (
+    "duration_sec",     # wall-clock of the stage
+    "input_bytes",
+    "output_bytes",
+    "rows_in",
+    "rows_out",
+    "files_written",
+    "executor",         # {"type": glue|emr|redshift|athena|lambda, "workers", "worker_type", "dpu", ...}
+)
+
+dynamodb = boto3.resource("dynamodb", config=Config(retries={"max_attempts": 10, "mode": "adaptive"}))
 sns = boto3.client("sns")
+s3 = boto3.client("s3")
+
+_table = None
+_pending = []
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()   # one flush at a time, so writes land in call order
+_timer = None
 
 def safe_decimal(value):
     try:
@@ -18,6 +64,160 @@ def safe_decimal(value):
     except (InvalidOperation, TypeError, ValueError):
         return Decimal(0)
 
+def _dynamo_safe(value):
+    """Floats -> Decimal (DynamoDB rejects floats), None values dropped, recursively."""
+    if isinstance(value, float):
+        return safe_decimal(value)
+    if isinstance(value, dict):
+        return {k: _dynamo_safe(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_dynamo_safe(v) for v in value]
+    return value
+
+def s3_prefix_objects(s3_uri, since=None):
+    """[(s3:// uri, bytes)] under a prefix, optionally only objects modified at/after `since` (aware datetime)."""
+    bucket, _, prefix = s3_uri[len("s3://"):].partition("/")
+    return [
+        (f"s3://{bucket}/{obj['Key']}", obj["Size"])
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix)
+        for obj in page.get("Contents", [])
+        if since is None or obj["LastModified"] >= since
+    ]
+
+def s3_prefix_stats(s3_uri, since=None):
+    """(bytes, files) under an s3:// prefix, optionally only objects modified at/after `since` (aware datetime)."""
+    objects = s3_prefix_objects(s3_uri, since)
+    return sum(size for _, size in objects), len(objects)
+
+def _get_table():
+    global _table
+    if _table is None:
+        _table = dynamodb.Table(DYNAMO_TABLE)
+    return _table
+
+# === BUFFERED WRITES ===
+def _with_backoff(write):
+    """Run write() with exponential backoff on throttling; raises once retries are exhausted."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return write()
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in THROTTLE_CODES or attempt == MAX_RETRIES:
+                raise
+            delay = min(20.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.0)
+            log.warning("control table throttled", retry_in_sec=round(delay, 1), attempt=attempt + 1)
+            time.sleep(delay)
+
+def _write_batch(items):
+    def write():
+        # STARTED + SUCCEEDED of one stage in the same batch: keep the last (BatchWriteItem rejects duplicate keys)
+        with _get_table().batch_writer(overwrite_by_pkeys=["pipeline_id", "stage"]) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+    _with_backoff(write)
+
+def _write_items(items):
+    """
+    put_item per item, after BatchWriteItem rejected the whole batch (ValidationException:
+    one invalid item, e.g. an empty key or an item over 400 KB). Invalid items are logged and
+    dropped, since they would fail on every replay; returns the items left to spool.
+    """
+    table = _get_table()
+    for i, item in enumerate(items):
+        try:
+            _with_backoff(lambda: table.put_item(Item=item))
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ValidationException":
+                return items[i:]
+            log.error("control table rejected item; dropped", pipeline_id=item.get("pipeline_id"),
+                      stage=item.get("stage"), error=str(e))
+        except Exception:
+            return items[i:]
+    return []
+
+def _spool(items):
+    if not SPOOL_PATH:
+        return False
+    serializer = TypeSerializer()
+    try:
+        with open(SPOOL_PATH, "a") as f:
+            for item in items:
+                f.write(json.dumps({k: serializer.serialize(v) for k, v in item.items()}) + "\n")
+        return True
+    except OSError as e:
+        log.error("failed to spool log items", error=str(e))
+        return False
+
+def _drain_spool():
+    """Items spooled by earlier failed flushes (this process or a previous one on the host)."""
+    if not SPOOL_PATH or not os.path.exists(SPOOL_PATH):
+        return []
+    draining = f"{SPOOL_PATH}.{os.getpid()}.draining"
+    try:
+        os.replace(SPOOL_PATH, draining)   # appends after this go to a fresh spool file
+    except FileNotFoundError:
+        return []
+    deserializer = TypeDeserializer()
+    with open(draining) as f:
+        items = [{k: deserializer.deserialize(v) for k, v in json.loads(line).items()} for line in f if line.strip()]
+    os.remove(draining)
+    return items
+
+def flush():
+    """Write everything buffered (plus any spool); on failure spool instead of raising. Returns success."""
+    global _timer
+    with _flush_lock:
+        with _pending_lock:
+            items = _pending[:]
+            del _pending[:]
+            if _timer is not None:
+                _timer.cancel()
+                _timer = None
+        items = _drain_spool() + items
+        if not items:
+            return True
+        try:
+            _write_batch(items)
+        except Exception as e:
+            # only retryable failures are spooled: an invalid item would block every later flush
+            invalid = isinstance(e, ClientError) and e.response["Error"]["Code"] == "ValidationException"
+            unwritten = _write_items(items) if invalid else items
+            if unwritten:
+                spooled = _spool(unwritten)
+                log.error("failed to log to DynamoDB", error=str(e), items=len(unwritten),
+                          spooled_to=SPOOL_PATH if spooled else None)
+                return False
+        log.info("logged to control table", items=len(items))
+        if log.enabled("DEBUG"):
+            for item in items:
+                log.debug("control table item", pipeline_id=item["pipeline_id"], stage=item["stage"],
+                          status=item["status"])
+        return True
+
+def flush_on_return(handler):
+    """Lambda handler decorator: a frozen container runs neither timers nor atexit."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            flush()
+    return wrapper
+
+def _buffer(item, flush_now):
+    global _timer
+    with _pending_lock:
+        _pending.append(item)
+        flush_now = flush_now or len(_pending) >= BATCH_SIZE
+        if not flush_now and _timer is None:
+            _timer = threading.Timer(FLUSH_INTERVAL_SEC, flush)
+            _timer.daemon = True
+            _timer.start()
+    if flush_now:
+        flush()
+
+atexit.register(flush)
+
 def log_pipeline_stage(
     pipeline_id,
     stage,
@@ -30,10 +230,9 @@ def log_pipeline_stage(
     s3_input=None,
     s3_output=None,
     db_table=None,
-    details=None
+    details=None,
+    metrics=None
 ):
-    table = dynamodb.Table(DYNAMO_TABLE)
-
     item = {
         "pipeline_id": pipeline_id,
         "stage": stage,
@@ -54,14 +253,22 @@ def log_pipeline_stage(
         item["db_table"] = db_table
     if details:
         item["details"] = details
+    if metrics:
+        unknown = set(metrics) - set(METRIC_FIELDS)
+        if unknown:
+            log.warning("unknown metrics", metrics=sorted(unknown), pipeline_id=pipeline_id, stage=stage)
+        item["metrics"] = _dynamo_safe(metrics)
 
-    # Write to DynamoDB
-    try:
-        table.put_item(Item=item)
-        print(f"✅ Logged to control table: {pipeline_id} [{stage}] - {status}")
-    except ClientError as e:
-        print(f"❌ Failed to log to DynamoDB: {e}")
-        raise
+    # Write to DynamoDB (buffered; failures are flushed right away)
+    if LOGGER_MODE == "sync":
+        try:
+            _get_table().put_item(Item=item)
+            log.debug("control table item", pipeline_id=pipeline_id, stage=stage, status=status)
+        except ClientError as e:
+            log.error("failed to log to DynamoDB", error=str(e), pipeline_id=pipeline_id, stage=stage)
+            raise
+    else:
+        _buffer(item, flush_now=(status == "FAILED"))
 
     # Optional: Send SNS on failure
     if status == "FAILED" and SNS_TOPIC_ARN:
@@ -69,8 +276,51 @@ def log_pipeline_stage(
             sns.publish(
                 TopicArn=SNS_TOPIC_ARN,
                 Subject=f"[FAILED] {pipeline_id} at {stage}",
-                Message=json.dumps(item, indent=2),
+                Message=json.dumps(item, indent=2, default=str),
             )
-            print("📣 Failure notification sent via SNS.")
+            log.info("failure notification sent", pipeline_id=pipeline_id, stage=stage)
         except Exception as e:
-            print(f"❌ Failed to send SNS alert: {e}")
+            log.error("failed to send SNS alert", error=str(e), pipeline_id=pipeline_id)
+
+class StageTimer:
+    """
+    Times a stage and logs it with its metrics:
+
+        with StageTimer(pipeline_id, "msck_repair", "nyc_taxi_batch", "batch", "lambda") as t:
+            ...
+            t.metrics.update(rows_out=n, executor={"type": "athena"})
+
+    Logs STARTED on entry (log_start=False to skip), then SUCCEEDED with
+    metrics.duration_sec, or FAILED with the error (the exception propagates).
+    """
+
+    def __init__(self, pipeline_id, stage, pipeline_name, pipeline_type, executor, log_start=True, **log_kwargs):
+        self.log_args = dict(pipeline_id=pipeline_id, stage=stage, pipeline_name=pipeline_name,
+                             pipeline_type=pipeline_type, executor=executor)
+        self.log_start = log_start
+        self.log_kwargs = log_kwargs   # s3_input, s3_output, db_table, details
+        self.metrics = {}
+        self.details = dict(log_kwargs.pop("details", None) or {})
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        if self.log_start:
+            log_pipeline_stage(**self.log_args, status="STARTED", timestamp=datetime.utcnow().isoformat(),
+                               details=self.details or None, **self.log_kwargs)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics["duration_sec"] = round(time.perf_counter() - self._t0, 3)
+        details = dict(self.details)
+        if exc is not None:
+            details["error"] = str(exc)
+        log_pipeline_stage(
+            **self.log_args,
+            status="FAILED" if exc is not None else "SUCCEEDED",
+            timestamp=datetime.utcnow().isoformat(),
+            record_count=self.metrics.get("rows_out"),
+            details=_dynamo_safe(details) or None,
+            metrics=self.metrics,
+            **self.log_kwargs,
+        )
+        return False
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Throughput trends and regressions from the per-stage metrics in the pipeline control table
+(item["metrics"], written through pipeline_logger / the EMR job).
+
+For every (stage, executor, cab_type) it orders runs by the month they processed and
+compares each run's throughput (rows_out or rows_in per second, input bytes per second)
+with the median of the previous --baseline runs; a drop of more than --regression_pct
+is flagged.
+
+Example:
+  python scripts/helpers/pipeline_metrics_report.py --stage transform --cab_type yellow
+  python scripts/helpers/pipeline_metrics_report.py --since 2024-01 --regressions_only --format csv > regressions.csv
+"""
+
+import argparse
+import re
+import sys
+
+import boto3
+import pandas as pd
+from boto3.dynamodb.conditions import Attr
+
+PIPELINE_ID_RE = re.compile(r"(yellow|green|fhv)_tripdata_(\d{4})-(\d{2})")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--table", default="pipeline_execution_control_table")
+    ap.add_argument("--region", default=None)
+    ap.add_argument("--stage", nargs="+", default=None, help="only these stages (e.g. transform redshift_load)")
+    ap.add_argument("--cab_type", nargs="+", default=None)
+    ap.add_argument("--since", default=None, help="first month YYYY-MM")
+    ap.add_argument("--baseline", type=int, default=3, help="previous runs in the rolling median")
+    ap.add_argument("--regression_pct", type=float, default=25.0)
+    ap.add_argument("--regressions_only", action="store_true")
+    ap.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    return ap.parse_args()
+
+
+def load_metrics(table_name, region=None):
+    """One row per control-table item that carries metrics."""
+    table = boto3.resource("dynamodb", region_name=region).Table(table_name)
+    rows, kwargs = [], {"FilterExpression": Attr("metrics").exists()}
+    while True:
+        page = table.scan(**kwargs)
+        for item in page.get("Items", []):
+            m = item["metrics"]
+            match = PIPELINE_ID_RE.search(item["pipeline_id"])
+            executor = m.get("executor") or {}
+            rows.append({
+                "pipeline_id": item["pipeline_id"],
+                "stage": item["stage"],
+                "executor": executor.get("type", item.get("executor")),
+                "status": item.get("status"),
+                "timestamp": item.get("timestamp"),
+                "cab_type": match.group(1) if match else None,
+                "month": f"{match.group(2)}-{match.group(3)}" if match else None,
+                "workers": executor.get("workers"),
+                **{k: m.get(k) for k in ("duration_sec", "input_bytes", "output_bytes",
+                                         "rows_in", "rows_out", "files_written")},
+            })
+        if "LastEvaluatedKey" not in page:
+            break
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    for c in ("duration_sec", "input_bytes", "output_bytes", "rows_in", "rows_out", "files_written"):
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+
+def add_throughput(df, baseline, regression_pct):
+    df = df[(df["status"] == "SUCCEEDED") & (df["duration_sec"] > 0)].copy()
+    rows = df["rows_out"].where(df["rows_out"] > 0, df["rows_in"])
+    df["rows_per_sec"] = (rows / df["duration_sec"]).round(1)
+    df["mb_per_sec"] = (df["input_bytes"] / 1e6 / df["duration_sec"]).round(2)
+
+    # order by the processed month (runs of other datasets, e.g. streaming files, by time)
+    df["order"] = df["month"].fillna(df["timestamp"])
+    df = df.sort_values(["stage", "executor", "cab_type", "order"], na_position="first")
+    groups = df.groupby(["stage", "executor", "cab_type"], dropna=False)["rows_per_sec"]
+    df["baseline_rows_per_sec"] = groups.transform(
+        lambda s: s.shift(1).rolling(baseline, min_periods=1).median()).round(1)
+    df["change_pct"] = ((df["rows_per_sec"] / df["baseline_rows_per_sec"] - 1) * 100).round(1)
+    df["regression"] = df["change_pct"] < -regression_pct
+    return df.drop(columns="order")
+
+
+def main():
+    args = parse_args()
+    df = load_metrics(args.table, args.region)
+    if df.empty:
+        print("No items with metrics found.", file=sys.stderr)
+        return
+    if args.stage:
+        df = df[df["stage"].isin(args.stage)]
+    if args.cab_type:
+        df = df[df["cab_type"].isin(args.cab_type)]
+
+    report = add_throughput(df, args.baseline, args.regression_pct)
+    if args.since:
+        report = report[report["month"].isna() | (report["month"] >= args.since)]
+    if args.regressions_only:
+        report = report[report["regression"]]
+
+    cols = ["stage", "executor", "cab_type", "month", "pipeline_id", "duration_sec", "rows_in", "rows_out",
+            "input_bytes", "output_bytes", "files_written", "workers", "rows_per_sec", "mb_per_sec",
+            "baseline_rows_per_sec", "change_pct", "regression"]
+    report = report[cols]
+    if args.format == "csv":
+        report.to_csv(sys.stdout, index=False)
+    elif args.format == "json":
+        print(report.to_json(orient="records", indent=2))
+    else:
+        with pd.option_context("display.max_rows", None, "display.width", 250):
+            print(report.to_string(index=False))
+        flagged = report[report["regression"]]
+        print(f"\n{len(flagged)} regression(s) > {args.regression_pct:.0f}% vs rolling median of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,33 @@
 import boto3
 import os
+import time
+
+from lambda_log import get_logger  # pipeline logger layer
 
 redshift = boto3.client('redshift-data')
+log = get_logger("streaming_copy.redshift")
+
+
+def wait_for_statement(statement_id):
+    """Block until the statement finishes; returns describe_statement (Duration, ResultRows, ...)."""
+    while True:
+        response = redshift.describe_statement(Id=statement_id)
+        status = response["Status"]
+        if status == "FINISHED":
+            return response
+        if status in ("FAILED", "ABORTED"):
+            raise Exception(f"SQL statement {status.lower()}: {response.get('Error')}")
+        time.sleep(0.5)
 
-def run_redshift_copy(secret_arn, workgroup, database, s3_uri):
+def run_redshift_copy(secret_arn, workgroup, database, s3_uri, s3_written_at=None):
+    """COPY one Firehose parquet object into staging, then dedup-insert into the final table.
+
+    s3_written_at (the object's LastModified) is stored as s3_written_time on every row,
+    the S3 checkpoint between the transform Lambda and the Redshift insert.
+    """
     staging_table = "public.staging_taxi_streaming_trips"
     final_table = "public.taxi_streaming_trips"
+    s3_written_sql = f"'{s3_written_at:%Y-%m-%d %H:%M:%S}'::timestamp" if s3_written_at else "NULL"
 
     copy_sql = f"""
     COPY {staging_table}
@@ -18,7 +40,9 @@ def run_redshift_copy(secret_arn, workgroup, database, s3_uri):
     INSERT INTO {final_table} (
         trip_id, pickup_datetime, dropoff_datetime,
         pulocationid, dolocationid, passenger_count,
-        fare_amount, payment_type, year, month, day, hour
+        fare_amount, payment_type, year, month, day, hour,
+        event_time, lambda_received_time,
+        producer_sent_time, firehose_received_time, lambda_processed_time, s3_written_time
     )
     SELECT
         s.trip_id,
@@ -32,7 +56,13 @@ def run_redshift_copy(secret_arn, workgroup, database, s3_uri):
         EXTRACT(YEAR FROM s.pickup_datetime),
         EXTRACT(MONTH FROM s.pickup_datetime),
         EXTRACT(DAY FROM s.pickup_datetime),
-        EXTRACT(HOUR FROM s.pickup_datetime)
+        EXTRACT(HOUR FROM s.pickup_datetime),
+        s.event_time,
+        s.lambda_received_time,
+        s.producer_sent_time,
+        s.firehose_received_time,
+        s.lambda_processed_time,
+        {s3_written_sql}
     FROM {staging_table} s
     LEFT JOIN {final_table} t ON s.trip_id = t.trip_id
     WHERE t.trip_id IS NULL;
@@ -41,22 +71,31 @@ def run_redshift_copy(secret_arn, workgroup, database, s3_uri):
     """
 
     try:
-        print("🚀 Copying into staging table...")
-        redshift.execute_statement(
+        log.debug("COPY", s3_uri=s3_uri, sql=copy_sql)
+        copy = wait_for_statement(redshift.execute_statement(
             SecretArn=secret_arn,
             WorkgroupName=workgroup,
             Database=database,
             Sql=copy_sql
-        )
+        )["Id"])
 
-        print("✅ Running dedup & insert into final table...")
-        redshift.execute_statement(
+        # INSERT only after the COPY has finished (statements run independently otherwise)
+        log.debug("dedup INSERT", s3_uri=s3_uri, sql=insert_sql)
+        insert = wait_for_statement(redshift.execute_statement(
             SecretArn=secret_arn,
             WorkgroupName=workgroup,
             Database=database,
             Sql=insert_sql
-        )
+        )["Id"])
+
+        inserted = insert.get("SubStatements", [insert])[0].get("ResultRows", -1)
+        return {
+            "copy_sec": copy.get("Duration", 0) / 1e9,
+            "insert_sec": insert.get("Duration", 0) / 1e9,
+            "rows_in": copy.get("ResultRows", -1),
+            "rows_out": inserted,
+        }
 
     except Exception as e:
-        print(f"❌ Redshift COPY/INSERT failed: {e}")
+        log.error("Redshift COPY/INSERT failed", s3_uri=s3_uri, error=str(e))
         raise
@@ -1,7 +1,10 @@
 import boto3
 from datetime import datetime
 
+from lambda_log import get_logger  # pipeline logger layer
+
 ddb = boto3.client('dynamodb')
+log = get_logger("streaming_copy.tracker")
 
 def mark_pipeline_success(table_name, pipeline_id, pipeline_type, dataset_name, s3_uri):
     try:
@@ -17,6 +20,6 @@ def mark_pipeline_success(table_name, pipeline_id, pipeline_type, dataset_name,
                 'notes': {'S': 'Ingested successfully by Lambda'}
             }
         )
-        print(f"✅ Logged to DynamoDB: {pipeline_id}")
+        log.debug("marked processed", pipeline_id=pipeline_id)
     except Exception as e:
-        print(f"❌ Failed to write to DynamoDB for {pipeline_id}: {e}")
+        log.error("failed to mark processed", pipeline_id=pipeline_id, error=str(e))
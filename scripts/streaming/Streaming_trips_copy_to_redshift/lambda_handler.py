@@ -1,7 +1,10 @@
 import os
+import boto3
 from list_unprocessed_files import list_recent_files
 from dynamo_tracker import mark_pipeline_success
 from copy_to_redshift import run_redshift_copy
+from lambda_log import BatchSummary, get_logger
+from pipeline_logger import StageTimer, flush_on_return  # pipeline logger layer
 
 S3_BUCKET = os.environ['S3_BUCKET']
 S3_PREFIX = os.environ['S3_PREFIX']
@@ -13,21 +16,42 @@ DATABASE = os.environ['DATABASE_NAME']
 DATASET_NAME = "nyc_taxi_streaming"
 PIPELINE_TYPE = "streaming"
 
+s3 = boto3.client("s3")
+LOG = get_logger("streaming_copy")
 
+
+@flush_on_return
 def lambda_handler(event, context):
-    print("🚀 Lambda started")
+    log = LOG.bind(request_id=getattr(context, "aws_request_id", None))
+    summary = BatchSummary(log, "files")
 
-    new_files = list_recent_files(S3_BUCKET, S3_PREFIX, DYNAMO_TABLE)
-    print(f"🧾 Found {len(new_files)} new files to process.")
+    with summary.timed("list"):
+        new_files = list_recent_files(S3_BUCKET, S3_PREFIX, DYNAMO_TABLE)
+    log.info("new files to process", files=len(new_files))
+    rows_inserted = 0
 
     for key in new_files:
         s3_uri = f"s3://{S3_BUCKET}/{key}"
         pipeline_id = key
 
         try:
-            run_redshift_copy(SECRET_ARN, WORKGROUP, DATABASE, s3_uri)
+            # per-stage metrics in the pipeline control table (stage "streaming_load")
+            with StageTimer(pipeline_id, "streaming_load", DATASET_NAME, PIPELINE_TYPE, "lambda",
+                            log_start=False, s3_input=s3_uri, db_table="public.taxi_streaming_trips") as timer:
+                head = s3.head_object(Bucket=S3_BUCKET, Key=key)
+                with summary.timed("copy"):
+                    stats = run_redshift_copy(SECRET_ARN, WORKGROUP, DATABASE, s3_uri, s3_written_at=head["LastModified"])
+                timer.metrics.update(
+                    input_bytes=head["ContentLength"],
+                    rows_in=stats["rows_in"],
+                    rows_out=stats["rows_out"],
+                    executor={"type": "redshift", "workgroup": WORKGROUP},
+                )
+                timer.details.update(copy_sec=stats["copy_sec"], insert_sec=stats["insert_sec"])
             mark_pipeline_success(DYNAMO_TABLE, pipeline_id, PIPELINE_TYPE, DATASET_NAME, s3_uri)
+            summary.ok()
+            rows_inserted += max(stats["rows_out"], 0)
         except Exception as e:
-            print(f"❌ Failed to process file {key}: {e}")
+            summary.failed(type(e).__name__, key=key, error=str(e))
 
-    print("✅ Lambda completed")
+    summary.emit(rows_inserted=rows_inserted)
@@ -2,8 +2,11 @@ import boto3
 import os
 from datetime import datetime, timedelta
 
+from lambda_log import get_logger  # pipeline logger layer
+
 s3 = boto3.client('s3')
 ddb = boto3.client('dynamodb')
+log = get_logger("streaming_copy.list_files")
 
 def list_recent_files(bucket, prefix, table_name, lookback_minutes=5):
     """
@@ -40,5 +43,5 @@ def is_pipeline_processed(table_name, pipeline_id):
         )
         return 'Item' in response
     except Exception as e:
-        print(f"Error checking DynamoDB: {e}")
+        log.error("error checking DynamoDB", pipeline_id=pipeline_id, error=str(e))
         return False
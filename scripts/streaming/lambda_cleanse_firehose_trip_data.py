@@ -1,98 +1,138 @@
 import json
 import base64
-from datetime import datetime
+from datetime import datetime, timezone
 from collections import OrderedDict
 
+from lambda_log import BatchSummary, get_logger  # pipeline logger layer
+from trip_record_schema import VALIDATORS, validate  # same deployment package
+
+LOG = get_logger("cleanse_firehose")
+
+# Latency checkpoints carried in each record (millisecond UTC, "%Y-%m-%d %H:%M:%S.fff"):
+#   producer_sent_time      simulator, right before put_record
+#   firehose_received_time  Firehose arrival (approximateArrivalTimestamp of the record)
+#   lambda_processed_time   this transform, when the record is re-encoded
+# s3_written_time and inserted_at are added by the Redshift copy Lambda.
+CHECKPOINT_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def format_checkpoint(dt):
+    return dt.astimezone(timezone.utc).strftime(CHECKPOINT_FORMAT)[:-3] if dt else None
+
+def parse_iso_utc(value):
+    """ISO-8601 with offset (producer timestamps) -> aware datetime, or None (also for non-strings)."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def failed_record(record):
+    return {
+        "recordId": record.get("recordId", "unknown"),
+        "result": "ProcessingFailed",
+        "data": record.get("data", "")
+    }
+
+def transform_record(record, log=LOG):
+    """
+    One Firehose input record -> (output record, None) or (ProcessingFailed record, rule).
+    Rules are the trip_record_schema ones plus record.decode/empty/json and event_time.type.
+    """
+    # 🔹 Decode input
+    try:
+        decoded_data = base64.b64decode(record['data']).decode('utf-8').strip()
+    except (ValueError, UnicodeDecodeError):
+        return failed_record(record), "record.decode"
+    if not decoded_data:
+        return failed_record(record), "record.empty"
+    try:
+        raw = json.loads(decoded_data)
+    except ValueError:
+        return failed_record(record), "record.json"
+
+    # 🔹 Types, ranges and coercion in one pass (compiled per schema version)
+    trip, rule = validate(raw)
+    if rule is not None:
+        return failed_record(record), rule
+    pickup_dt = trip['pickup_datetime']
+
+    event_time_raw = raw.get('event_time')
+    if event_time_raw:
+        parsed_event_time = parse_iso_utc(event_time_raw) if isinstance(event_time_raw, str) else None
+        if parsed_event_time is None:
+            return failed_record(record), "event_time.type"
+        event_time = parsed_event_time.strftime("%Y-%m-%d %H:%M:%S")
+    else:
+        event_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    lambda_received_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+    arrival_ms = record.get("approximateArrivalTimestamp")
+    firehose_received = datetime.fromtimestamp(arrival_ms / 1000, tz=timezone.utc) if arrival_ms else None
+
+    # 🔹 Build the final payload (consistent order, typed values)
+    payload = OrderedDict()
+    payload['trip_id'] = trip['trip_id']
+    payload['pickup_datetime'] = pickup_dt.strftime("%Y-%m-%d %H:%M:%S")
+    payload['dropoff_datetime'] = trip['dropoff_datetime'].strftime("%Y-%m-%d %H:%M:%S")
+    payload['pulocationid'] = trip['pulocationid']
+    payload['dolocationid'] = trip['dolocationid']
+    payload['passenger_count'] = trip['passenger_count']
+    payload['fare_amount'] = trip['fare_amount']
+    payload['payment_type'] = trip['payment_type']
+    payload['event_time'] = event_time
+    payload['lambda_received_time'] = lambda_received_time
+    payload['producer_sent_time'] = format_checkpoint(parse_iso_utc(raw.get('producer_sent_time')))
+    payload['firehose_received_time'] = format_checkpoint(firehose_received)
+    payload['year'] = pickup_dt.year
+    payload['month'] = pickup_dt.month
+    payload['day'] = pickup_dt.day
+    payload['hour'] = pickup_dt.hour
+
+    # ⏱ last thing before re-encoding: the transform hop ends here
+    payload['lambda_processed_time'] = format_checkpoint(datetime.now(timezone.utc))
+    log.sample("record transformed", record_id=record["recordId"], payload=payload)
+
+    # 🔹 Encode for Firehose
+    encoded_data = base64.b64encode((json.dumps(payload) + "\n").encode("utf-8")).decode("utf-8")
+
+    # 🔹 Build output record
+    return {
+        "recordId": record["recordId"],
+        "result": "Ok",
+        "data": encoded_data,
+        "metadata": {
+            "partitionKeys": {
+                "year": str(payload["year"]),
+                "month": str(payload["month"]),
+                "day": str(payload["day"]),
+                "hour": str(payload["hour"])
+            }
+        }
+    }, None
+
 def lambda_handler(event, context):
     output = []
+    log = LOG.bind(request_id=getattr(context, "aws_request_id", None))
+    summary = BatchSummary(log, "records")
 
     for record in event['records']:
         try:
-            # 🔹 Decode input
-            decoded_data = base64.b64decode(record['data']).decode('utf-8').strip()
-
-            if not decoded_data:
-                raise ValueError("Empty decoded string")
-
-            raw = json.loads(decoded_data)
-
-            # 🔹 Check required fields
-            required_fields = [
-                "trip_id", "pickup_datetime", "dropoff_datetime",
-                "passenger_count", "fare_amount", "payment_type"
-            ]
-            missing_fields = [f for f in required_fields if f not in raw]
-            if missing_fields:
-                raise ValueError(f"Missing required fields: {missing_fields}")
-
-            # 🔹 Parse and format timestamps
-            pickup_dt = datetime.strptime(raw['pickup_datetime'], "%Y-%m-%d %H:%M:%S")
-            dropoff_dt = datetime.strptime(raw['dropoff_datetime'], "%Y-%m-%d %H:%M:%S")
-
-            event_time_raw = raw.get('event_time')
-            if event_time_raw:
-                try:
-                    parsed_event_time = datetime.strptime(event_time_raw, "%Y-%m-%dT%H:%M:%S.%f%z")
-                except ValueError:
-                    parsed_event_time = datetime.strptime(event_time_raw, "%Y-%m-%dT%H:%M:%S%z")
-                event_time = parsed_event_time.strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                event_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-
-            lambda_received_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-
-            # 🔹 Build the final payload (consistent order, no nulls)
-            payload = OrderedDict()
-            payload['trip_id'] = raw['trip_id']
-            payload['pickup_datetime'] = pickup_dt.strftime("%Y-%m-%d %H:%M:%S")
-            payload['dropoff_datetime'] = dropoff_dt.strftime("%Y-%m-%d %H:%M:%S")
-            payload['pulocationid'] = raw.get('PULocationID', -1)
-            payload['dolocationid'] = raw.get('DOLocationID', -1)
-            payload['passenger_count'] = raw['passenger_count']
-            payload['fare_amount'] = raw['fare_amount']
-            payload['payment_type'] = raw['payment_type']
-            payload['event_time'] = event_time
-            payload['lambda_received_time'] = lambda_received_time
-            payload['year'] = pickup_dt.year
-            payload['month'] = pickup_dt.month
-            payload['day'] = pickup_dt.day
-            payload['hour'] = pickup_dt.hour
-
-            # ✅ Log full payload before encoding
-            print("✅ Final payload before encoding:")
-            print(json.dumps(payload, indent=2))
-            print("🧾 Payload keys:", list(payload.keys()))
-
-            # 🔹 Encode for Firehose
-            encoded_data = base64.b64encode((json.dumps(payload) + "\n").encode("utf-8")).decode("utf-8")
-
-            # 🔹 Build output record
-            output_record = {
-                "recordId": record["recordId"],
-                "result": "Ok",
-                "data": encoded_data,
-                "metadata": {
-                    "partitionKeys": {
-                        "year": str(payload["year"]),
-                        "month": str(payload["month"]),
-                        "day": str(payload["day"]),
-                        "hour": str(payload["hour"])
-                    }
-                }
-            }
-
+            output_record, rule = transform_record(record, log)
         except Exception as e:
-            print(json.dumps({
-                "recordId": record.get("recordId", "unknown"),
-                "status": "error",
-                "error": str(e)
-            }))
-            output_record = {
-                "recordId": record.get("recordId", "unknown"),
-                "result": "ProcessingFailed",
-                "data": record.get("data", "")
-            }
+            # unexpected error: fail the record, never the whole batch
+            output_record, rule = failed_record(record), f"error.{type(e).__name__}"
 
+        # rejections counted per rule; the summary line keeps the first few record ids
+        if rule is None:
+            summary.ok()
+        else:
+            summary.failed(rule, record_id=record.get("recordId", "unknown"))
         output.append(output_record)
 
+    summary.emit(
+        records=len(event['records']),
+        rejections_since_start={f"v{v}": dict(val.rejections) for v, val in VALIDATORS.items() if val.rejections},
+    )
     return {"records": output}
@@ -0,0 +1,255 @@
+"""
+Replay records the cleanse Lambda rejected (Firehose error output, "processing-failed").
+
+Firehose writes each rejected record to the stream's error prefix as a JSON line
+({"rawData": <base64 original>, "errorCode", "errorMessage", "arrivalTimestamp", ...}).
+This tool:
+  1. reads every error object under --error_uri in parallel (gzip or plain),
+  2. re-runs the records through transform_record() of this checkout (the fixed
+     transform) in a process pool, grouping them by the rule that still fails,
+  3. with --submit, re-sends the records that now pass with put_record_batch
+     (500 records / 4 MiB per call, failed entries retried with backoff),
+  4. with --dead_letter_uri, writes the ones that still fail as JSON lines per rule.
+
+By default the original record is re-sent, so the deployed transform processes it like
+any new record (deploy the fix first); --payload transformed sends this checkout's
+output instead (for a stream without a transform). Replays are safe to repeat: the
+Redshift insert skips trip_ids that are already loaded.
+
+Example:
+  python scripts/streaming/replay_firehose_failures.py \
+      --error_uri s3://teo-nyc-taxi/streaming/errors/processing-failed/2025/01/ --since 2025-01-10
+  python scripts/streaming/replay_firehose_failures.py --error_uri ... --submit \
+      --dead_letter_uri s3://teo-nyc-taxi/streaming/dead_letter/ --report replay_report.json
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAYER_DIR = os.path.join(HERE, "..", "helpers", "pipeline_logger_layer", "python")
+
+FIREHOSE_STREAM_NAME = "taxi_streaming_raw_data"
+PUT_BATCH_MAX_RECORDS = 500
+PUT_BATCH_MAX_BYTES = 4 * 1024 * 1024
+PUT_MAX_ATTEMPTS = 5
+
+s3 = boto3.client("s3")
+
+
+def parse_args():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--error_uri", required=True, help="s3:// prefix of the Firehose processing-failed output")
+    ap.add_argument("--since", default=None, help="only error objects written at/after this (ISO date/time, UTC)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--chunk_size", type=int, default=2000, help="records per transform task")
+    ap.add_argument("--submit", action="store_true", help="re-send the records that now pass (default: report only)")
+    ap.add_argument("--stream", default=FIREHOSE_STREAM_NAME)
+    ap.add_argument("--payload", choices=["raw", "transformed"], default="raw")
+    ap.add_argument("--dead_letter_uri", default=None, help="s3:// prefix for records that still fail, per rule")
+    ap.add_argument("--report", default=None, help="write the summary as JSON to this path")
+    ap.add_argument("--region", default=None)
+    return ap.parse_args()
+
+
+def _split_s3(uri):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+# ----------------------------------------------
+# Read the error output
+# ----------------------------------------------
+def list_error_objects(error_uri, since=None):
+    bucket, prefix = _split_s3(error_uri)
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            if since is None or obj["LastModified"] >= since:
+                keys.append((bucket, obj["Key"]))
+    return keys
+
+
+def _json_lines(text):
+    """Error records are newline-delimited; tolerate records concatenated without one."""
+    decoder, pos, end = json.JSONDecoder(), 0, len(text)
+    while pos < end:
+        while pos < end and text[pos].isspace():
+            pos += 1
+        if pos == end:
+            break
+        obj, pos = decoder.raw_decode(text, pos)
+        yield obj
+
+
+def read_error_object(location):
+    bucket, key = location
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    return [
+        {
+            "source": f"s3://{bucket}/{key}",
+            "recordId": f"{key}:{i}",
+            "data": rec["rawData"],
+            "approximateArrivalTimestamp": rec.get("arrivalTimestamp"),
+            "error_code": rec.get("errorCode") or rec.get("lastErrorCode"),
+        }
+        for i, rec in enumerate(_json_lines(body.decode("utf-8")))
+    ]
+
+
+def load_failures(error_uri, since, workers):
+    objects = list_error_objects(error_uri, since)
+    with ThreadPoolExecutor(max_workers=max(1, min(32, workers * 4))) as pool:
+        records = [r for batch in pool.map(read_error_object, objects) for r in batch]
+    return objects, records
+
+
+# ----------------------------------------------
+# Re-run the transform
+# ----------------------------------------------
+def _init_worker():
+    # silence per-record sampling in the workers; import the transform of this checkout
+    os.environ["LOG_SAMPLE_RATE"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path[:0] = [HERE, LAYER_DIR]
+
+
+def _replay_chunk(records):
+    from lambda_cleanse_firehose_trip_data import transform_record
+    results = []
+    for record in records:
+        try:
+            output, rule = transform_record(record)
+        except Exception as e:
+            output, rule = None, f"error.{type(e).__name__}"
+        results.append((rule, output["data"] if rule is None else None))
+    return results
+
+
+def replay(records, workers, chunk_size):
+    """[(rule or None, transformed base64 data or None)] in the order of `records`."""
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return [r for chunk in pool.map(_replay_chunk, chunks) for r in chunk]
+
+
+# ----------------------------------------------
+# Re-submit
+# ----------------------------------------------
+def _batches(blobs):
+    batch, size = [], 0
+    for blob in blobs:
+        if batch and (len(batch) == PUT_BATCH_MAX_RECORDS or size + len(blob) > PUT_BATCH_MAX_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(blob)
+        size += len(blob)
+    if batch:
+        yield batch
+
+
+def _put_batch(firehose, stream, batch):
+    """put_record_batch, retrying only the failed entries; returns the number never accepted."""
+    pending = batch
+    for attempt in range(PUT_MAX_ATTEMPTS):
+        resp = firehose.put_record_batch(DeliveryStreamName=stream, Records=[{"Data": b} for b in pending])
+        if not resp.get("FailedPutCount"):
+            return 0
+        pending = [b for b, r in zip(pending, resp["RequestResponses"]) if "ErrorCode" in r]
+        time.sleep(min(10.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.0))
+    return len(pending)
+
+
+def submit(blobs, stream, workers, region=None):
+    firehose = boto3.client("firehose", region_name=region)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        failed = sum(pool.map(lambda b: _put_batch(firehose, stream, b), _batches(blobs)))
+    return len(blobs) - failed, failed
+
+
+def write_dead_letters(dead_letter_uri, by_rule):
+    """One JSON-lines object per rule: <prefix>/<rule>/<UTC timestamp>.jsonl."""
+    bucket, prefix = _split_s3(dead_letter_uri.rstrip("/") + "/")
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    written = {}
+    for rule, records in by_rule.items():
+        key = f"{prefix}{rule}/{stamp}.jsonl"
+        body = "\n".join(json.dumps({"rule": rule, "source": r["source"], "rawData": r["data"],
+                                     "arrivalTimestamp": r["approximateArrivalTimestamp"]}) for r in records)
+        s3.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+        written[rule] = f"s3://{bucket}/{key}"
+    return written
+
+
+def main():
+    args = parse_args()
+    since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc) if args.since else None
+
+    started = time.perf_counter()
+    objects, records = load_failures(args.error_uri, since, args.workers)
+    print(f"📦 {len(records):,} failed record(s) in {len(objects):,} error object(s) "
+          f"({time.perf_counter() - started:.1f}s)")
+    if not records:
+        return
+
+    started = time.perf_counter()
+    results = replay(records, args.workers, args.chunk_size)
+    print(f"🔁 Re-ran the transform on {len(records):,} record(s) ({time.perf_counter() - started:.1f}s)")
+
+    passing, still_failing = [], defaultdict(list)
+    by_error_code = defaultdict(Counter)
+    for record, (rule, data) in zip(records, results):
+        by_error_code[record["error_code"]][rule or "passes"] += 1
+        if rule is None:
+            passing.append(base64.b64decode(data if args.payload == "transformed" else record["data"]))
+        else:
+            still_failing[rule].append(record)
+
+    print(f"\n{'reason':<32}{'records':>10}")
+    print(f"{'passes now':<32}{len(passing):>10,}")
+    for rule, recs in sorted(still_failing.items(), key=lambda kv: -len(kv[1])):
+        print(f"{rule:<32}{len(recs):>10,}")
+
+    report = {
+        "error_uri": args.error_uri,
+        "objects": len(objects),
+        "records": len(records),
+        "passes": len(passing),
+        "still_failing": {rule: len(recs) for rule, recs in still_failing.items()},
+        "by_error_code": {code: dict(c) for code, c in by_error_code.items()},
+    }
+
+    if args.submit and passing:
+        started = time.perf_counter()
+        sent, failed = submit(passing, args.stream, args.workers, args.region)
+        print(f"\n🚀 Re-sent {sent:,} record(s) to {args.stream} ({failed:,} rejected by Firehose, "
+              f"{time.perf_counter() - started:.1f}s)")
+        report.update(submitted=sent, submit_failed=failed, payload=args.payload)
+    elif passing:
+        print(f"\nℹ️ Report only; pass --submit to re-send {len(passing):,} record(s) to {args.stream}")
+
+    if args.dead_letter_uri and still_failing:
+        report["dead_letter"] = write_dead_letters(args.dead_letter_uri, still_failing)
+        print(f"🪦 Dead-lettered {sum(len(r) for r in still_failing.values()):,} record(s) under {args.dead_letter_uri}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report -> {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,8 +29,8 @@ df = df.fillna({
     "passenger_count": 1,
     "fare_amount": 0,
     "payment_type": 1,
-    "pulocationid": 0,
-    "dolocationid": 0
+    "pulocationid": 264,   # taxi zone lookup "Unknown" (0 fails the cleanse Lambda's 1-265 check)
+    "dolocationid": 264
 })
 df = df.reset_index(drop=True)
 
@@ -56,6 +56,9 @@ def send_to_firehose(record):
             "event_time": datetime.now(timezone.utc).isoformat()  # ⬅️ Fixed timezone
         }
 
+        # ⏱ latency checkpoint 1/5: producer send (the others: Firehose arrival, Lambda
+        # transform, S3 object write, Redshift insert — see int_nyc__streaming_enriched)
+        firehose_record["producer_sent_time"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
         response = firehose.put_record(
             DeliveryStreamName=FIREHOSE_STREAM_NAME,
             Record={'Data': json.dumps(firehose_record) + "\n"}
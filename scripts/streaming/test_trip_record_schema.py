@@ -0,0 +1,131 @@
+"""
+Unit tests for trip_record_schema: coercion, per-field range rules, the cross-field rule
+and schema selection. Pure Python, no AWS access:
+  python -m pytest scripts/streaming/test_trip_record_schema.py -q
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from trip_record_schema import SCHEMAS, validate  # noqa: E402
+
+VALID = {
+    "trip_id": "cab_123",
+    "pickup_datetime": "2025-01-10 08:00:00",
+    "dropoff_datetime": "2025-01-10 08:20:00",
+    "PULocationID": 132,
+    "DOLocationID": 236,
+    "passenger_count": 2,
+    "fare_amount": 23.5,
+    "payment_type": 1,
+}
+
+
+def _with(**fields):
+    return {**VALID, **fields}
+
+
+def test_valid_record():
+    record, rule = validate(VALID)
+    assert rule is None
+    assert record == {
+        "trip_id": "cab_123",
+        "pickup_datetime": datetime(2025, 1, 10, 8, 0),
+        "dropoff_datetime": datetime(2025, 1, 10, 8, 20),
+        "pulocationid": 132,
+        "dolocationid": 236,
+        "passenger_count": 2,
+        "fare_amount": 23.5,
+        "payment_type": 1,
+    }
+
+
+def test_coercion():
+    record, rule = validate(_with(
+        trip_id=" 42 ",
+        pickup_datetime="2025-01-10T09:00:00+01:00",
+        dropoff_datetime="2025-01-10T08:20:00Z",
+        PULocationID="132",
+        passenger_count=2.0,
+        fare_amount="23.456",
+        payment_type="1",
+    ))
+    assert rule is None
+    assert record["trip_id"] == "42"
+    assert record["pickup_datetime"] == datetime(2025, 1, 10, 8, 0)   # offset -> naive UTC
+    assert record["dropoff_datetime"] == datetime(2025, 1, 10, 8, 20)
+    assert record["pulocationid"] == 132
+    assert record["passenger_count"] == 2
+    assert record["fare_amount"] == 23.46
+
+
+def test_lowercase_location_source_and_default():
+    raw = {k: v for k, v in VALID.items() if k not in ("PULocationID", "DOLocationID")}
+    record, rule = validate({**raw, "pulocationid": 7})
+    assert rule is None
+    assert record["pulocationid"] == 7
+    assert record["dolocationid"] == -1   # absent optional field: default, no range check
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("passenger_count", 2.5, "passenger_count.type"),
+    ("passenger_count", True, "passenger_count.type"),
+    ("fare_amount", "abc", "fare_amount.type"),
+    ("fare_amount", float("nan"), "fare_amount.type"),
+    ("pickup_datetime", 1736496000, "pickup_datetime.type"),
+    ("pickup_datetime", "yesterday", "pickup_datetime.type"),
+    ("trip_id", "   ", "trip_id.type"),
+    ("trip_id", ["cab_123"], "trip_id.type"),
+])
+def test_type_rules(field, value, expected):
+    assert validate(_with(**{field: value})) == (None, expected)
+
+
+@pytest.mark.parametrize("field", ["trip_id", "pickup_datetime", "dropoff_datetime",
+                                   "passenger_count", "fare_amount", "payment_type"])
+def test_required_rules(field):
+    raw = {k: v for k, v in VALID.items() if k != field}
+    assert validate(raw) == (None, f"{field}.required")
+    assert validate(_with(**{field: None})) == (None, f"{field}.required")
+
+
+RANGE_CASES = [
+    (f.sources[0] if f.sources else f.name, f.name, f.min, f.max, f.kind)
+    for f in SCHEMAS[1]["fields"]
+    if f.min is not None or f.max is not None
+]
+
+
+@pytest.mark.parametrize("source, name, low, high, kind", RANGE_CASES, ids=[c[1] for c in RANGE_CASES])
+def test_range_rules(source, name, low, high, kind):
+    if kind == "str":   # bounds on the length
+        assert validate(_with(**{source: "x" * high}))[1] is None
+        assert validate(_with(**{source: "x" * (high + 1)})) == (None, f"{name}.max")
+        return
+    if low is not None:
+        assert validate(_with(**{source: low}))[1] is None
+        assert validate(_with(**{source: low - 1})) == (None, f"{name}.min")
+    if high is not None:
+        assert validate(_with(**{source: high}))[1] is None
+        assert validate(_with(**{source: high + 1})) == (None, f"{name}.max")
+
+
+def test_dropoff_before_pickup():
+    assert validate(_with(dropoff_datetime="2025-01-10 07:59:59")) == (None, "dropoff_before_pickup")
+    assert validate(_with(dropoff_datetime=VALID["pickup_datetime"]))[1] is None
+
+
+def test_schema_version():
+    assert validate(_with(schema_version=1))[1] is None
+    assert validate(_with(schema_version="1"))[1] is None
+    assert validate(_with(schema_version=99)) == (None, "schema_version.unknown")
+    assert validate(_with(schema_version="v2")) == (None, "schema_version.unknown")
+
+
+def test_not_an_object():
+    assert validate([VALID]) == (None, "record.not_object")
@@ -0,0 +1,185 @@
+"""
+Schema validation and type coercion for streaming trip records (Firehose cleanse Lambda).
+
+Each schema version is a tuple of field specs, compiled once at import into one closure
+per field holding only the checks that field needs. Validating a record is then a
+single pass: presence -> coercion to the target type -> range checks, field by field,
+followed by the cross-field rules. The first failing rule rejects the record and is
+returned by name, so rejections can be counted per rule:
+
+    record, rule = validate(raw)
+    # ({"trip_id": "cab_123", "pickup_datetime": datetime(...), "fare_amount": 12.5, ...}, None)
+    # (None, "fare_amount.min") / (None, "dropoff_before_pickup") / (None, "trip_id.required")
+
+Rule names are "<field>.required|type|min|max" and the cross-field rule names below.
+A record selects its schema with "schema_version" (default DEFAULT_SCHEMA_VERSION).
+"""
+
+import math
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+
+DEFAULT_SCHEMA_VERSION = 1
+SCHEMA_VERSION_FIELD = "schema_version"
+
+# name: payload field; sources: raw keys tried in order; kind: str|int|float|datetime;
+# default: used when absent and not required (range checks don't apply to it)
+Field = namedtuple("Field", "name kind required default min max sources")
+Field.__new__.__defaults__ = (False, None, None, None, None)
+
+# Taxi zone lookup ids (264/265 are the "Unknown" zones)
+LOCATION_ID_MIN, LOCATION_ID_MAX = 1, 265
+
+SCHEMAS = {
+    1: {
+        "fields": (
+            Field("trip_id", "str", required=True, max=64),
+            Field("pickup_datetime", "datetime", required=True),
+            Field("dropoff_datetime", "datetime", required=True),
+            Field("pulocationid", "int", default=-1, min=LOCATION_ID_MIN, max=LOCATION_ID_MAX,
+                  sources=("PULocationID", "pulocationid")),
+            Field("dolocationid", "int", default=-1, min=LOCATION_ID_MIN, max=LOCATION_ID_MAX,
+                  sources=("DOLocationID", "dolocationid")),
+            Field("passenger_count", "int", required=True, min=0, max=9),
+            Field("fare_amount", "float", required=True, min=0, max=10000),
+            Field("payment_type", "int", required=True, min=0, max=6),
+        ),
+        "rules": (
+            ("dropoff_before_pickup", lambda r: r["dropoff_datetime"] >= r["pickup_datetime"]),
+        ),
+    },
+}
+
+_INVALID = object()
+
+
+# ----------------------------------------------
+# Coercion (returns _INVALID instead of raising)
+# ----------------------------------------------
+def _to_int(v):
+    if isinstance(v, bool):
+        return _INVALID
+    if isinstance(v, int):
+        return v
+    if isinstance(v, float):
+        return int(v) if v.is_integer() else _INVALID
+    if isinstance(v, str):
+        try:
+            f = float(v)
+        except ValueError:
+            return _INVALID
+        return int(f) if f.is_integer() else _INVALID
+    return _INVALID
+
+
+def _to_float(v):
+    if isinstance(v, bool):
+        return _INVALID
+    if isinstance(v, (int, float)):
+        f = float(v)
+    elif isinstance(v, str):
+        try:
+            f = float(v)
+        except ValueError:
+            return _INVALID
+    else:
+        return _INVALID
+    return round(f, 2) if math.isfinite(f) else _INVALID
+
+
+def _to_str(v):
+    if isinstance(v, bool) or not isinstance(v, (str, int)):
+        return _INVALID
+    s = str(v).strip()
+    return s if s else _INVALID
+
+
+def _to_datetime(v):
+    """'YYYY-MM-DD HH:MM:SS' (or ISO-8601 with T / offset) -> naive UTC datetime."""
+    if not isinstance(v, str):
+        return _INVALID
+    try:
+        dt = datetime.fromisoformat(v.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return _INVALID
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+COERCERS = {"int": _to_int, "float": _to_float, "str": _to_str, "datetime": _to_datetime}
+
+
+# ----------------------------------------------
+# Compilation
+# ----------------------------------------------
+def _compile_field(field):
+    name, coerce, keys = field.name, COERCERS[field.kind], field.sources or (field.name,)
+    rule_required, rule_type = f"{name}.required", f"{name}.type"
+    # str bounds apply to the length
+    measure = len if field.kind == "str" else None
+    bounds = tuple(
+        (limit, is_min, f"{name}.{'min' if is_min else 'max'}")
+        for limit, is_min in ((field.min, True), (field.max, False))
+        if limit is not None
+    )
+
+    def check(raw, out):
+        for key in keys:
+            value = raw.get(key)
+            if value is not None:
+                break
+        else:
+            if field.required:
+                return rule_required
+            out[name] = field.default
+            return None
+        value = coerce(value)
+        if value is _INVALID:
+            return rule_type
+        size = measure(value) if measure else value
+        for limit, is_min, rule in bounds:
+            if (size < limit) if is_min else (size > limit):
+                return rule
+        out[name] = value
+        return None
+
+    return check
+
+
+class CompiledSchema:
+    """Validator for one schema version; `rejections` counts failed rules since load."""
+
+    def __init__(self, version, fields, rules=()):
+        self.version = version
+        self.field_names = tuple(f.name for f in fields)
+        self._checks = tuple(_compile_field(f) for f in fields)
+        self._rules = tuple(rules)
+        self.rejections = Counter()
+
+    def __call__(self, raw):
+        out = {}
+        for check in self._checks:
+            rule = check(raw, out)
+            if rule is not None:
+                self.rejections[rule] += 1
+                return None, rule
+        for rule, ok in self._rules:
+            if not ok(out):
+                self.rejections[rule] += 1
+                return None, rule
+        return out, None
+
+
+VALIDATORS = {version: CompiledSchema(version, s["fields"], s["rules"]) for version, s in SCHEMAS.items()}
+
+
+def validate(raw):
+    """(coerced record, None) or (None, failed rule) for a decoded JSON record."""
+    if not isinstance(raw, dict):
+        return None, "record.not_object"
+    version = _to_int(raw.get(SCHEMA_VERSION_FIELD, DEFAULT_SCHEMA_VERSION))
+    validator = VALIDATORS.get(version)
+    if validator is None:
+        return None, "schema_version.unknown"
+    return validator(raw)